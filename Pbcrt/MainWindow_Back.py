@@ -1,23 +1,35 @@
 import sys
 import os
 
-import numpy as np
-import cv2
-
-from PySide6.QtCore import (QObject, QThread, QTimer, QMutex, QMutexLocker, Qt,QFile,
-                            QIODevice, QDateTime)
-from PySide6.QtCore import Signal, Slot
-from PySide6.QtNetwork import QUdpSocket, QHostAddress
-from PySide6.QtWidgets import (QMainWindow, QApplication, QMessageBox, QTableWidgetItem,
-                               QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
+# 最先导入：记录启动计时起点
+from startup_timing import startup_timer
+
+from PySide6.QtCore import QTimer, Qt
+from PySide6.QtCore import Slot
+from PySide6.QtWidgets import (QMainWindow, QApplication, QMessageBox,
+                               QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QLabel,
+                               QPushButton
                                )
 from PySide6.QtGui import QCloseEvent, QImage, QPixmap
 
 from MainWindow_ui import Ui_MainWindow
-from udp_server import UdpSender, UdpServerThread
-from TcpClient import TcpClientWorker, TcpClientThread
-from ive_image_converter import IVEImageTypeConvert, IVEImageType
-from YoloSegmentInfer import YoloSegmentInfer
+from udp_server import (UdpSender, UdpServerThread, UDP_RECV_BACKEND_SOCKET,
+                        PARTIAL_FRAME_DEADLINE_MS)
+from TcpClient import TcpClientThread, TCP_PIPELINE_DEPTH
+from stream_control import FrameStreamController, STREAM_CREDIT_WINDOW
+from frame_decoder import FrameDecoder
+from inference_worker import (InferencePool, YoloInferenceTask, INFER_WORKERS, INFER_QUEUE_SIZE,
+                              INFER_PREREADY_BACKLOG, INFER_DROP_OLDEST, INFER_MAX_BATCH, INFER_MAX_WAIT_MS,
+                              YOLO_SEGMENT_MODEL)
+from result_cache import FrameResultCache, FRAME_CACHE_THRESHOLD
+from frame_trace import (FrameTracer, MetricsServer, TRACE_WINDOW, STAGE_DISPATCH, STAGE_DELIVER, STAGE_DISPLAY,
+                         EVENT_FRAME_RECEIVED, EVENT_PARTIAL_SKIPPED)
+from diagnostics_panel import DiagnosticsPanel
+from inference_backend import BACKEND_AUTO
+from device_session import parse_device_key, device_key
+
+# torch/ultralytics/PIL 不在此导入，推理线程创建模型时才导入（create_inference_task）
+startup_timer.mark("界面模块导入")
 
 # 模型
 YOLO_MODEL_PATH = "\model\qhmu-pv-seg-v1.pt"
@@ -27,24 +39,65 @@ YOLO_CLASS_PATH = "\model\qhmu-pv-seg.yaml"
 RES_DATA_FIEL_PATH_NAME = "\cache\\table_data.csv"
 SRC_IMAGES_DIR_PATH = "\images\src\\"
 RES_IMAGES_DIR_PATH = "\images\\res\\"
+# 启动耗时报告，每次启动追加一行 JSON
+STARTUP_REPORT_PATH = "\\cache\\startup_report.jsonl"
+# 每帧各阶段耗时记录（JSON 行）
+FRAME_TRACE_PATH = "\\cache\\frame_trace.jsonl"
 
 UDP_BTN_NET_CONN_TEXT = "设备连接"
 UDP_BTN_NET_DISC_TEXT = "断开连接"
+STREAM_BTN_START_TEXT = "连续采集"
+STREAM_BTN_STOP_TEXT = "停止采集"
 CONN_ACK_TIMEOUT_MS = 3000  # 超时时间 ms
 AUDIO_ACK_TIMEOUT_MS = 4000  # 超时时间 ms
 
 DEVC_CONN_ACK = 0x0001
 DEVC_DISC_ACK = 0x0003
 
+# 以下 USER_* 配置注释中的其他可选常量定义在 udp_server、inference_worker、inference_backend、result_cache 中，
+# 切换时从对应模块导入
 # 网络连接类型选择
 NETWORK_MODE_UDP = "UDP"
 NETWORK_MODE_TCP = "TCP"
 USER_NETWORK_MODE = NETWORK_MODE_UDP
-
-#YOLO模型类型选择
-YOLO_DETECT_MODEL = "detect"
-YOLO_SEGMENT_MODEL = "segment"
+# UDP 丢包时向设备发送选择性重传请求（需设备支持带帧序号的数据包）
+USER_UDP_NACK_ENABLE = True
+# UDP 接收后端：UDP_RECV_BACKEND_QT 或 UDP_RECV_BACKEND_SOCKET（批量读取，吞吐更高）
+USER_UDP_RECV_BACKEND = UDP_RECV_BACKEND_SOCKET
+# UDP 残缺帧交付时限 ms：超时仍未收齐的帧掩盖缺失部分后交付，0 表示关闭（残缺帧直接丢弃）
+USER_UDP_PARTIAL_DEADLINE_MS = PARTIAL_FRAME_DEADLINE_MS
+# 残缺帧丢包比例超过该值时只显示不推理
+USER_PARTIAL_INFER_MAX_LOSS = 0.05
+# TCP 连接后请求设备整帧传输（设备不支持时自动保持分包传输）
+USER_TCP_BULK_MODE = True
+# TCP 每次点击“获取图像”请求的帧数，按流水线深度（TCP_PIPELINE_DEPTH）分批在途，1 为逐帧请求
+USER_TCP_IMAGE_REQUEST_COUNT = TCP_PIPELINE_DEPTH
+
+#YOLO模型类型选择（YOLO_DETECT_MODEL 或 YOLO_SEGMENT_MODEL）
 USER_YOLO_MODEl = YOLO_SEGMENT_MODEL
+# 推理后端：BACKEND_AUTO（有 CUDA 用 PyTorch，否则优先 OpenVINO、ONNX Runtime）或指定 BACKEND_TORCH/BACKEND_ONNX/BACKEND_OPENVINO
+# ONNX/OpenVINO 模型由 .pt 自动导出，按权重哈希缓存在模型目录的 export_cache 下
+# BACKEND_ONNX_INT8 为 INT8 量化模式：以保存的原图（images/src）校准，首次量化后输出与 FP32 的精度对比报告
+USER_INFER_BACKEND = BACKEND_AUTO
+# 推理线程数（每个线程加载一份模型）、待推理帧队列长度及队列满时的丢帧策略（INFER_DROP_OLDEST/INFER_DROP_NEWEST）
+USER_INFER_WORKERS = INFER_WORKERS
+USER_INFER_QUEUE_SIZE = INFER_QUEUE_SIZE
+USER_INFER_DROP_POLICY = INFER_DROP_OLDEST
+# 模型加载完成前最多保留的待推理帧数，超出的帧丢弃并显示在模型状态中
+USER_INFER_PREREADY_BACKLOG = INFER_PREREADY_BACKLOG
+# 微批量推理：每批最多帧数与凑批最长等待 ms（批量越大吞吐越高，等待越长延迟越大，批量为 1 即逐帧推理）
+USER_INFER_MAX_BATCH = INFER_MAX_BATCH
+USER_INFER_MAX_WAIT_MS = INFER_MAX_WAIT_MS
+# 近重复帧结果缓存：缓存条数（0 为关闭，静止画面可设为 FRAME_CACHE_SIZE）与相似度阈值（8x8 小块均值的最大绝对差，0~1）
+# 命中帧不经推理直接复用旧结果，默认关闭
+USER_FRAME_CACHE_SIZE = 0
+USER_FRAME_CACHE_THRESHOLD = FRAME_CACHE_THRESHOLD
+# 分块推理：原分辨率切块推理并跨块合并，提高高分辨率图像中小目标（鸟粪、热斑、细裂纹）的召回，耗时随块数增加
+USER_TILED_INFERENCE = False
+# 各阶段耗时统计：最近帧数窗口、是否逐帧写入 cache/frame_trace.jsonl、本机 Prometheus 指标端口（0 为关闭）
+USER_TRACE_WINDOW = TRACE_WINDOW
+USER_TRACE_JSONL_ENABLE = False
+USER_TRACE_METRICS_PORT = 0
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     def __init__(self):
@@ -55,18 +108,54 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.application_path = os.getcwd()
         print(f"当前工作目录:{self.application_path}")
 
-        # 加载YOLO模型
-        self.yoloModel = YoloSegmentInfer(self.application_path+YOLO_MODEL_PATH,
-                                          self.application_path+YOLO_CLASS_PATH)
+        # 推理线程池：每个推理线程在各自线程中导入推理模块、加载并预热一份YOLO模型，界面无需等待；
+        # 模型就绪前到达的帧在推理队列中等待
+        model_path = self.application_path + YOLO_MODEL_PATH
+        class_path = self.application_path + YOLO_CLASS_PATH
+        src_dir = self.application_path + SRC_IMAGES_DIR_PATH
+        res_dir = self.application_path + RES_IMAGES_DIR_PATH
+        # 每帧从首包到达到界面显示的各阶段耗时统计
+        self.frame_tracer = FrameTracer(USER_TRACE_WINDOW,
+                                        self.application_path + FRAME_TRACE_PATH if USER_TRACE_JSONL_ENABLE else None)
+        self.metrics_server = None
+        if USER_TRACE_METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(self.frame_tracer, USER_TRACE_METRICS_PORT)
+            except OSError as e:
+                print(f"[追踪] 指标端点启动失败: {e}")
+        self.diagnostics_panel = None
+        # 静止画面的近重复帧复用推理结果，各推理线程共享同一缓存
+        self.result_cache = FrameResultCache(USER_FRAME_CACHE_SIZE, USER_FRAME_CACHE_THRESHOLD) \
+            if USER_FRAME_CACHE_SIZE > 0 else None
+        self.inference_pool = InferencePool(
+            lambda: self.create_inference_task(model_path, class_path, src_dir, res_dir),
+            USER_INFER_WORKERS, USER_INFER_QUEUE_SIZE, USER_INFER_DROP_POLICY,
+            USER_INFER_MAX_BATCH, USER_INFER_MAX_WAIT_MS, USER_INFER_PREREADY_BACKLOG, self)
+        self.inference_pool.resultReady.connect(self.on_inference_result)
+        self.inference_pool.workerReady.connect(self.on_model_worker_ready)
+        self.inference_pool.workerFailed.connect(self.on_model_worker_failed)
 
         #初始化控件
         self.qButtonGetImage.setEnabled(False)
+        self.qButtonStream.setEnabled(False)
+        self.qLabelStreamStats = QLabel(self)
+        self.statusBar.addPermanentWidget(self.qLabelStreamStats)
+        self.qLabelDeviceStatus = QLabel(self)
+        self.statusBar.addWidget(self.qLabelDeviceStatus)
+        self.qLabelModelStatus = QLabel("模型加载中...", self)
+        self.statusBar.addPermanentWidget(self.qLabelModelStatus)
+        self.qButtonDiagnostics = QPushButton("诊断", self)
+        self.qButtonDiagnostics.clicked.connect(self.on_diagnostics_button_clicked)
+        self.statusBar.addPermanentWidget(self.qButtonDiagnostics)
         self.YoloResTableWidgetInit()
         if USER_NETWORK_MODE == NETWORK_MODE_UDP:
             # UDP控制成员
             self.udp_thread = None
             self.udp_worker = None
             self.udp_sender = UdpSender()
+            # 多设备：设备 IPV4 输入框可填写多个地址，以逗号分隔，可带 ":端口"
+            self.remote_devices = []
+            self.connected_devices = set()
         elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
             # TCP控制成员
             self.tcp_thread = None
@@ -80,25 +169,164 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.audio_timeout_timer.setSingleShot(True)
         self.audio_timeout_timer.timeout.connect(self.on_audio_timeout)
 
+        # 连续采集流控：网络帧先经过流控器，再进入推理
+        self.stream_controller = FrameStreamController(STREAM_CREDIT_WINDOW, self)
+        self.stream_controller.credit_sender = self.send_stream_credit
+        self.stream_controller.credit_resync = self.send_stream_resync
+        self.stream_controller.frameReady.connect(self.on_frame_received)
+        self.stream_controller.statsUpdated.connect(self.on_stream_stats_updated)
+        # 压缩帧（JPEG/H.264）解码：网络帧先解码为 BGR，原始 IVE 帧直接转发给流控
+        self.frame_decoder = FrameDecoder(parent=self)
+        # 推理在推理线程中异步完成，流控在推理结束或丢帧时才归还信用
+        self.stream_controller.deferred_done = True
+        self.inference_pool.frameFinished.connect(self.stream_controller.frame_done)
+        self.inference_pool.frameDropped.connect(self.stream_controller.frame_dropped)
+        self.frame_decoder.frameReady.connect(self.stream_controller.on_frame)
+        self.frame_decoder.frameDropped.connect(self.stream_controller.on_frame_dropped)
+
         # 绑定按钮事件
         self.qButtonUdpNetConn.clicked.connect(self.on_udp_button_clicked)
         self.qButtonGetImage.clicked.connect(self.on_image_button_clicked)
+        self.qButtonStream.clicked.connect(self.on_stream_button_clicked)
         self.qButtonDeleteTableRow.clicked.connect(self.on_yolo_table_remove_row_button_clicked)
 
+    def create_inference_task(self, model_path: str, class_path: str, src_dir: str, res_dir: str):
+        """在推理线程中调用：导入推理模块（torch/ultralytics）、加载模型并用一帧空白输入预热"""
+        from YoloSegmentInfer import YoloSegmentInfer
+        startup_timer.mark("推理模块导入")
+        task = YoloInferenceTask(lambda: YoloSegmentInfer(model_path, class_path, USER_INFER_BACKEND, src_dir,
+                                                          self.result_cache, USER_TILED_INFERENCE),
+                                 USER_YOLO_MODEl, src_dir, res_dir)
+        startup_timer.mark("模型加载")
+        task.model.warmup()
+        startup_timer.mark("模型预热")
+        return task
+
+    @Slot(int)
+    def on_model_worker_ready(self, ready_count: int):
+        pending = self.inference_pool.pending_count()
+        backlog_dropped = self.inference_pool.backlog_dropped_count
+        print(f"[YOLO] 推理线程就绪 {ready_count}/{self.inference_pool.worker_count}，待推理帧 {pending}，"
+              f"就绪前丢弃 {backlog_dropped} 帧")
+        dropped_info = f"（就绪前丢弃 {backlog_dropped} 帧）" if backlog_dropped else ""
+        self.qLabelModelStatus.setText(f"模型就绪 {ready_count}/{self.inference_pool.worker_count}{dropped_info}")
+        self.report_startup_timing()
+
+    @Slot(str)
+    def on_model_worker_failed(self, error: str):
+        if self.inference_pool.failed_count == self.inference_pool.worker_count:
+            self.qLabelModelStatus.setText("模型加载失败")
+            QMessageBox.critical(self, "模型加载失败", error)
+        self.report_startup_timing()
+
+    def report_startup_timing(self):
+        """全部推理线程加载完成（或失败）后输出启动耗时报告"""
+        pool = self.inference_pool
+        if pool.ready_count + pool.failed_count == pool.worker_count:
+            startup_timer.report(self.application_path + STARTUP_REPORT_PATH)
+
+    @Slot()
+    def on_diagnostics_button_clicked(self):
+        if self.diagnostics_panel is None:
+            self.diagnostics_panel = DiagnosticsPanel(self.frame_tracer, self)
+        self.diagnostics_panel.show()
+        self.diagnostics_panel.raise_()
+
     @Slot()
     def on_image_button_clicked(self):
-        remoteHost = self.qLineEditRemoteIpv4.text().strip()
-        remotePort = int(self.qLineEditRemotePort.text().strip())
         if USER_NETWORK_MODE == NETWORK_MODE_UDP:
-            # UDP获取图像
-            self.udp_sender.send_get_image_request(remoteHost, remotePort)
+            # UDP获取图像，向所有已连接设备发送请求
+            for ip, port in self.ActiveRemoteDevices():
+                self.udp_sender.send_get_image_request(ip, port)
         elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
-            self.tcp_worker.send_get_image_request()
+            self.tcp_worker.send_get_image_request(USER_TCP_IMAGE_REQUEST_COUNT)
 
         self.qButtonGetImage.setEnabled(False)
         self.qButtonUdpNetConn.setEnabled(False)
         self.audio_timeout_timer.start(AUDIO_ACK_TIMEOUT_MS)
 
+    @Slot()
+    def on_stream_button_clicked(self):
+        if self.qButtonStream.text() == STREAM_BTN_START_TEXT:
+            self.start_stream()
+        else:
+            self.stop_stream()
+
+    def start_stream(self):
+        if USER_NETWORK_MODE == NETWORK_MODE_UDP:
+            self.stream_controller.start([device_key(ip, port) for ip, port in self.ActiveRemoteDevices()])
+            for ip, port in self.ActiveRemoteDevices():
+                self.udp_sender.send_stream_start(ip, port, self.stream_controller.credit_window)
+        elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
+            # TCP 帧不区分设备（设备标识为 None）
+            self.stream_controller.start([None])
+            self.tcp_worker.send_stream_start(self.stream_controller.credit_window)
+        self.qButtonStream.setText(STREAM_BTN_STOP_TEXT)
+        self.qButtonGetImage.setEnabled(False)
+        self.qButtonUdpNetConn.setEnabled(False)
+
+    def stop_stream(self):
+        if not self.stream_controller.streaming:
+            return
+        self.stream_controller.stop()
+        if USER_NETWORK_MODE == NETWORK_MODE_UDP:
+            self.UserSendUdpStreamStop()
+        elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
+            if self.tcp_worker:
+                self.tcp_worker.send_stream_stop()
+        self.qButtonStream.setText(STREAM_BTN_START_TEXT)
+        self.qButtonGetImage.setEnabled(True)
+        self.qButtonUdpNetConn.setEnabled(True)
+        self.qLabelStreamStats.clear()
+
+    def send_stream_credit(self, device: str, credits: int):
+        if USER_NETWORK_MODE == NETWORK_MODE_UDP:
+            if device is None:
+                return
+            ip, port = parse_device_key(device)
+            self.udp_sender.send_stream_credit(ip, port, credits)
+        elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
+            if self.tcp_worker:
+                self.tcp_worker.send_stream_credit(credits)
+
+    def send_stream_resync(self, device: str, credits: int):
+        """重发推流开始包，设备以其参数重置信用"""
+        if USER_NETWORK_MODE == NETWORK_MODE_UDP:
+            if device is None:
+                return
+            ip, port = parse_device_key(device)
+            self.udp_sender.send_stream_start(ip, port, credits)
+        elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
+            if self.tcp_worker:
+                self.tcp_worker.send_stream_start(credits)
+
+    @Slot(float, float, int)
+    def on_stream_stats_updated(self, fps: float, latency_ms: float, dropped: int):
+        self.qLabelStreamStats.setText(f"帧率 {fps:.1f} fps | 延迟 {latency_ms:.0f} ms | 丢帧 {dropped}")
+
+    @Slot(dict)
+    def on_device_stats_updated(self, summary: dict):
+        parts = [f"{key} {info['state']} {info['fps']:.1f}fps" for key, info in summary.items()]
+        self.qLabelDeviceStatus.setText(" | ".join(parts))
+
+    def ParseRemoteDevices(self, ip_text: str, default_port: int) -> list:
+        """解析设备地址列表，如 192.168.200.200, 192.168.200.201:12022"""
+        devices = []
+        for item in ip_text.replace(';', ',').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            ip, sep, port_str = item.partition(':')
+            port = int(port_str) if sep else default_port
+            if (ip, port) not in devices:
+                devices.append((ip, port))
+        return devices
+
+    def ActiveRemoteDevices(self) -> list:
+        """已应答连接的设备，若尚无应答则返回全部配置的设备"""
+        active = [dev for dev in self.remote_devices if dev in self.connected_devices]
+        return active if active else list(self.remote_devices)
+
     @Slot()
     def on_audio_timeout(self):
         self.qButtonGetImage.setEnabled(True)
@@ -119,40 +347,50 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         try:
             port = int(port_str)
             local_port = int(local_port_str)
+            devices = self.ParseRemoteDevices(ip_str, port)
         except ValueError:
             QMessageBox.critical(self, "格式错误", f"端口号无效: {port_str,local_port_str}")
             return
 
         if btn_text == UDP_BTN_NET_CONN_TEXT:
             if USER_NETWORK_MODE == NETWORK_MODE_UDP:
-                self.start_udp_receiver(local_ip, local_port, ip_str, port)
+                self.start_udp_receiver(local_ip, local_port, devices)
             elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
                 self.start_tcp_receiver(local_ip, local_port, ip_str, port)
         elif btn_text == UDP_BTN_NET_DISC_TEXT:
             if USER_NETWORK_MODE == NETWORK_MODE_UDP:
-                self.udp_sender.send_disc_request(ip_str, port)
+                for device_ip, device_port in self.remote_devices:
+                    self.udp_sender.send_disc_request(device_ip, device_port)
             elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
                 self.tcp_worker.send_disc_request()
         self.conn_timeout_timer.start(CONN_ACK_TIMEOUT_MS)
 
-    def start_udp_receiver(self,localHost, localHostPort, remoteHost, remotePort):
-        # 启动UDP接收线程（仅启动一次）
+    def start_udp_receiver(self, localHost, localHostPort, devices: list):
+        # 启动UDP接收线程（仅启动一次），所有设备共用一个接收端口
         if self.udp_thread is None:
-            self.udp_thread = UdpServerThread(localHost, localHostPort)
+            self.remote_devices = devices
+            self.connected_devices.clear()
+            self.udp_thread = UdpServerThread(localHost, localHostPort, devices=devices,
+                                              nack_enable=USER_UDP_NACK_ENABLE, backend=USER_UDP_RECV_BACKEND,
+                                              partial_deadline_ms=USER_UDP_PARTIAL_DEADLINE_MS)
             self.udp_thread.worker_ready.connect(self.on_udp_worker_ready)
             self.udp_thread.finished.connect(lambda: print("[UDP线程] 已结束"))
             self.udp_thread.start()
             # 延迟发送连接请求，确保worker已启动
-            QTimer.singleShot(300, lambda: self.udp_sender.send_conn_request(remoteHost, remotePort))
-            print("[UDP] 已启动连接过程")
+            QTimer.singleShot(300, self.UserSendUdpConnRequest)
+            print(f"[UDP] 已启动连接过程，设备数 {len(devices)}")
         else:
             print("[UDP] 接收线程已存在")
 
     @Slot(object)
     def on_udp_worker_ready(self, worker):
         self.udp_worker = worker
-        worker.frameReceived.connect(self.on_frame_received)
-        worker.udpAckDataPackArrival.connect(self.on_ack_arrival)
+        worker.frameReceived.connect(self.frame_decoder.on_frame)
+        worker.frameDropped.connect(self.stream_controller.on_frame_dropped)
+        worker.deviceAckArrival.connect(self.on_device_ack_arrival)
+        worker.deviceStateChanged.connect(
+            lambda key, state: print(f"[UDP] 设备 {key} 状态: {state}"))
+        worker.deviceStatsUpdated.connect(self.on_device_stats_updated)
         print("[UDP] worker 信号连接完成")
 
     def start_tcp_receiver(self, localHost, localHostPort, remoteHost, remotePort):
@@ -168,51 +406,82 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     @Slot(object)
     def on_tcp_worker_ready(self, worker):
         self.tcp_worker = worker
-        worker.frameReceived.connect(self.on_frame_received)
+        worker.frameQueued.connect(self.on_tcp_frames_queued)
+        worker.frameDropped.connect(self.stream_controller.on_frame_dropped)
         worker.tcpAckDataPackArrival.connect(self.on_ack_arrival)
+        worker.connectionStateChanged.connect(self.on_tcp_connection_changed)
         # 延迟发送连接请求，确保worker已连接
-        QTimer.singleShot(500, self.tcp_worker.send_conn_request)
+        QTimer.singleShot(500, self.UserSendTcpConnRequest)
         print("[TCP] worker 信号连接完成")
 
-    @Slot(bytes, int, int, int)
-    def on_frame_received(self, data: bytes, w: int, h: int, img_type: int):
-        print(f"[UDP] 收到完整图像帧: 尺寸={w}x{h}, 类型={IVEImageTypeConvert.ive_type_to_string(img_type)}, 大小={len(data)}")
-        # 处理图像数据并推理显示
-        self.image_seg_pred(data, w, h, img_type)
-
-    def image_seg_pred(self, data: bytes, w: int, h: int, img_type: int):
-        try:
-            # === 原始图像数据转 BGR ===
-            bgr_src_img = IVEImageTypeConvert.convert(data, w, h, img_type)
-            # === 显示图像（OpenCV BGR → RGB）
-            rgb_src_img = cv2.cvtColor(bgr_src_img, cv2.COLOR_BGR2RGB)
-            # === 使用模型进行推理 ===
-            if USER_YOLO_MODEl == YOLO_SEGMENT_MODEL:
-                rgb_res_img, class_score_map = self.yoloModel.predict(rgb_src_img)
-            elif USER_YOLO_MODEl == YOLO_DETECT_MODEL:
-                rgb_res_img, class_score_map, detections = self.yoloModel.detect(rgb_src_img)
-            # === 生成时间戳文件名 ===
-            timestamp = QDateTime.currentDateTime().toString("yyyy_MM_dd_HH_mm_ss_zzz")
-            src_filename = f"img_src_{timestamp}.jpg"
-            res_filename = f"img_res_{timestamp}.jpg"
-            src_path = self.application_path + SRC_IMAGES_DIR_PATH + src_filename
-            res_path = self.application_path + RES_IMAGES_DIR_PATH + res_filename
-            # === 保存 RGB 图像（OpenCV） ===
-            os.makedirs(SRC_IMAGES_DIR_PATH, exist_ok=True)
-            os.makedirs(RES_IMAGES_DIR_PATH, exist_ok=True)
-            cv2.imwrite(src_path, rgb_src_img)
-            cv2.imwrite(res_path, rgb_res_img)
-            print(f"[保存] 原图保存: {src_path}")
-            print(f"[保存] 结果图保存: {res_path}")
-            # === 识别信息插入TableWidget ===
-            self.AppendResultToTableWidget(timestamp, class_score_map)
-            # === 打印类别及置信度 ===
-            print("[YOLO] 预测完成：")
-            for cls_name, scores in class_score_map.items():
-                print(f"类别: {cls_name}，置信度: {scores}")
+    @Slot()
+    def on_tcp_frames_queued(self):
+        # 取空接收队列，帧交给流控后由推理处理
+        worker = self.tcp_worker
+        if worker is None:
+            return
+        while True:
+            item = worker.frame_queue.get()
+            if item is None:
+                break
+            self.frame_decoder.on_frame(*item)
+
+    @Slot(bool)
+    def on_tcp_connection_changed(self, connected: bool):
+        if connected:
+            self.statusBar.showMessage("TCP 已连接", 3000)
+        else:
+            self.statusBar.showMessage("TCP 连接中断，正在重连...")
+
+    @Slot(object, int, int, int)
+    def on_frame_received(self, frame, w: int, h: int, img_type: int):
+        frame.trace.mark(STAGE_DISPATCH)
+        self.frame_tracer.count(EVENT_FRAME_RECEIVED)
+        if frame.loss_ratio > USER_PARTIAL_INFER_MAX_LOSS:
+            # 残缺帧缺失过多，掩盖后的结果不可信，跳过推理
+            self.frame_tracer.count(EVENT_PARTIAL_SKIPPED)
+            device = frame.device
+            frame.release()
+            self.stream_controller.frame_dropped(device)
+            return
+        # 交给推理线程池，帧缓冲由推理线程处理完成后归还
+        self.inference_pool.submit(frame, w, h, img_type)
+        if not self.inference_pool.is_ready():
+            self.qLabelModelStatus.setText(f"模型加载中...（待推理 {self.inference_pool.pending_count()} 帧，"
+                                           f"已丢弃 {self.inference_pool.backlog_dropped_count} 帧）")
 
-        except Exception as e:
-            print(f"[YOLO] 图像推理出错: {e}")
+    @Slot(object)
+    def on_inference_result(self, result):
+        """推理线程完成一帧：插入表格并直接显示结果图像（无需再从文件读取）"""
+        result.trace.mark(STAGE_DELIVER)
+        self.AppendResultToTableWidget(result.stamp, result.class_score_map, show_images=False)
+        self.qLabelSrcImage.setPixmap(QPixmap.fromImage(result.src_image).scaledToWidth(
+            self.qLabelSrcImage.width(), Qt.SmoothTransformation))
+        self.qLabelResImage.setPixmap(QPixmap.fromImage(result.res_image).scaledToWidth(
+            self.qLabelResImage.width(), Qt.SmoothTransformation))
+        result.trace.mark(STAGE_DISPLAY)
+        self.frame_tracer.record(result.trace, result.device)
+        # === 打印类别及置信度 ===
+        cache_info = f"，缓存命中率 {self.result_cache.hit_rate():.0%}" if self.result_cache is not None else ""
+        print(f"[YOLO] 预测完成：批量 {result.batch_size}，耗时 {result.infer_ms:.1f} ms{cache_info}")
+        for cls_name, scores in result.class_score_map.items():
+            print(f"类别: {cls_name}，置信度: {scores}")
+
+    @Slot(str, int)
+    def on_device_ack_arrival(self, device: str, ack_type: int):
+        """多设备应答汇总：首个设备连接时进入已连接状态，全部设备断开后才清理接收线程"""
+        address = parse_device_key(device)
+        if ack_type == DEVC_CONN_ACK:
+            first = not self.connected_devices
+            self.connected_devices.add(address)
+            if first:
+                self.on_ack_arrival(ack_type)
+        elif ack_type == DEVC_DISC_ACK:
+            self.connected_devices.discard(address)
+            if not self.connected_devices:
+                self.on_ack_arrival(ack_type)
+        else:
+            self.on_ack_arrival(ack_type)
 
     @Slot(int)
     def on_ack_arrival(self, ack_type: int):
@@ -226,13 +495,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.qLineEditRemotePort.setEnabled(False)
             self.qLineEditRemoteIpv4.setEnabled(False)
             self.qButtonGetImage.setEnabled(True)
+            self.qButtonStream.setEnabled(True)
         elif ack_type == DEVC_DISC_ACK:
+            self.stop_stream()
             self.qButtonUdpNetConn.setText(UDP_BTN_NET_CONN_TEXT)
             self.qLineEditLocalPort.setEnabled(True)
             self.qLineEditLocalIpv4.setEnabled(True)
             self.qLineEditRemotePort.setEnabled(True)
             self.qLineEditRemoteIpv4.setEnabled(True)
             self.qButtonGetImage.setEnabled(False)
+            self.qButtonStream.setEnabled(False)
             # 停止并清理网络线程
             if USER_NETWORK_MODE == NETWORK_MODE_UDP:
                 if self.udp_thread:
@@ -246,6 +518,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     @Slot()
     def on_conn_timeout(self):
         QMessageBox.warning(self, "连接超时", "设备未响应请求，请检查设备状态或网络连接")
+        self.stop_stream()
         self.qButtonUdpNetConn.setText(UDP_BTN_NET_CONN_TEXT)
         self.qLineEditLocalPort.setEnabled(True)
         self.qLineEditLocalIpv4.setEnabled(True)
@@ -263,16 +536,25 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.tcp_thread.stop()
                 self.tcp_thread = None
 
+    def UserSendUdpConnRequest(self):
+        for ip, port in self.remote_devices:
+            self.udp_sender.send_conn_request(ip, port)
+
     def UserSendUdpDisconnRequest(self):
         #清除UDP服务句柄
-        ip_str = self.qLineEditRemoteIpv4.text().strip()
-        port_str = self.qLineEditRemotePort.text().strip()
-        try:
-            port = int(port_str)
-        except ValueError:
-            return
         # 发送断开请求
-        self.udp_sender.send_disc_request(ip_str, port)
+        for ip, port in self.remote_devices:
+            self.udp_sender.send_disc_request(ip, port)
+        self.connected_devices.clear()
+
+    def UserSendUdpStreamStop(self):
+        for ip, port in self.ActiveRemoteDevices():
+            self.udp_sender.send_stream_stop(ip, port)
+
+    def UserSendTcpConnRequest(self):
+        self.tcp_worker.send_conn_request()
+        if USER_TCP_BULK_MODE:
+            self.tcp_worker.send_bulk_mode_request(True)
 
     def UserSendTcpDisconnRequest(self):
         ip_str = self.qLineEditRemoteIpv4.text().strip()
@@ -356,9 +638,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             row_index += 1
         print(f"[DEBUG] 成功从文件导入表格数据：{file_path}")
 
-    def AppendResultToTableWidget(self, timestamp: str, yolo_class_res_current: dict[str, list[float]]):
+    def AppendResultToTableWidget(self, timestamp: str, yolo_class_res_current: dict[str, list[float]],
+                                  show_images: bool = True):
         """
-        向表格添加一行推理结果：时间戳、类别、置信度。
+        向表格添加一行推理结果：时间戳、类别、置信度。show_images 为 True 时从文件加载并显示对应图像。
         """
         # 类别拼接
         class_list = list(yolo_class_res_current.keys())
@@ -377,7 +660,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # 自动选中新行
         self.qTableYoloRes.selectRow(new_row)
         # 显示图像
-        self.ShowImagesDataToLabel(timestamp)
+        if show_images:
+            self.ShowImagesDataToLabel(timestamp)
 
     def ExportTableWidgetToFile(self, table: QTableWidget):
         # 构造导出文件路径
@@ -527,6 +811,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         if reply == QMessageBox.StandardButton.Yes:
             print("正在退出程序...")
+            self.stop_stream()
+            self.frame_decoder.close()
+            self.inference_pool.close()
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+            self.frame_tracer.close()
             # 在此释放资源或关闭线程等
             self.ExportTableWidgetToFile(self.qTableYoloRes)
             # 停止并清理网络线程
@@ -537,7 +827,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                     self.udp_thread = None
             elif USER_NETWORK_MODE == NETWORK_MODE_TCP:
                 if self.tcp_thread:
-                    UserSendTcpDisconnRequest()
+                    self.UserSendTcpDisconnRequest()
                     self.tcp_thread.stop()
                     self.tcp_thread = None
             event.accept()
@@ -548,6 +838,9 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
 
     window = MainWindow()
+    startup_timer.mark("窗口创建")
     window.show()
+    # 事件循环开始处理后窗口才完成首次绘制
+    QTimer.singleShot(0, lambda: startup_timer.mark("窗口显示"))
 
     app.exec()
\ No newline at end of file
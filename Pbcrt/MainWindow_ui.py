@@ -19,8 +19,8 @@ from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
 from PySide6.QtWidgets import (QApplication, QFrame, QGridLayout, QGroupBox,
     QHBoxLayout, QHeaderView, QLabel, QLineEdit,
     QMainWindow, QMenu, QMenuBar, QPushButton,
-    QSizePolicy, QSpacerItem, QTableWidget, QTableWidgetItem,
-    QVBoxLayout, QWidget)
+    QSizePolicy, QSpacerItem, QStatusBar, QTableWidget,
+    QTableWidgetItem, QVBoxLayout, QWidget)
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -179,6 +179,11 @@ class Ui_MainWindow(object):
 
         self.horizontalLayout_7.addWidget(self.qButtonGetImage)
 
+        self.qButtonStream = QPushButton(self.groupBox)
+        self.qButtonStream.setObjectName(u"qButtonStream")
+
+        self.horizontalLayout_7.addWidget(self.qButtonStream)
+
 
         self.gridLayout_4.addLayout(self.horizontalLayout_7, 4, 0, 1, 1)
 
@@ -206,6 +211,9 @@ class Ui_MainWindow(object):
         self.appSettingMenu = QMenu(self.menuBar)
         self.appSettingMenu.setObjectName(u"appSettingMenu")
         MainWindow.setMenuBar(self.menuBar)
+        self.statusBar = QStatusBar(MainWindow)
+        self.statusBar.setObjectName(u"statusBar")
+        MainWindow.setStatusBar(self.statusBar)
 
         self.menuBar.addAction(self.appSettingMenu.menuAction())
         self.appSettingMenu.addAction(self.imgOutPathConfigAction)
@@ -235,6 +243,7 @@ class Ui_MainWindow(object):
         self.qButtonDeleteTableRow.setText(QCoreApplication.translate("MainWindow", u"\u5220\u9664\u8bb0\u5f55", None))
         self.qButtonUdpNetConn.setText(QCoreApplication.translate("MainWindow", u"\u8bbe\u5907\u8fde\u63a5", None))
         self.qButtonGetImage.setText(QCoreApplication.translate("MainWindow", u"\u83b7\u53d6\u56fe\u50cf", None))
+        self.qButtonStream.setText(QCoreApplication.translate("MainWindow", u"\u8fde\u7eed\u91c7\u96c6", None))
         self.appSettingMenu.setTitle(QCoreApplication.translate("MainWindow", u"\u8bbe\u7f6e", None))
     # retranslateUi
 
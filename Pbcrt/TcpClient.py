@@ -1,7 +1,14 @@
 from PySide6.QtCore import QObject, QThread, QDateTime, Signal, QMutex, QMutexLocker
+import asyncio
 import socket
 import struct
 import threading
+import time
+from collections import deque
+
+from frame_pool import FrameBufferPool
+from frame_decoder import is_compressed_type, compressed_capacity
+from frame_trace import STAGE_REASSEMBLY
 
 # === 协议常量 ===
 PACK_DATA_SIZE = 1024
@@ -17,145 +24,525 @@ HOST_CONN_ACK = 0x0000
 HOST_DISC_ACK = 0x0002
 GAIN_IMAG_ACK = 0x0004
 
+# 连续采集控制：ACK 包头 + 类型 + uint32 参数 + ACK 包尾
+STRM_STAR_ACK = 0x0008
+STRM_STOP_ACK = 0x000A
+STRM_CRED_ACK = 0x000C
+
+# 整帧传输协商：上位机发送 BULK_MODE_ACK（参数 1 开启 / 0 关闭），支持的设备回复 DEVC_BULK_ACK，
+# 此后每帧以一个带长度的整帧头 + 连续的整帧数据发送，不再切分为 1052 字节的包
+BULK_MODE_ACK = 0x000E
+DEVC_BULK_ACK = 0x000F
+BULK_PACK_HEAD = 0x5BB5
+BULK_PACK_TAIL = 0x6CC6
+# 整帧头：包头、图像类型、帧序号、宽、高、数据长度、包尾
+BULK_HEADER_STRUCT = struct.Struct('<HHIIIIH')
+
+# 包格式：图像包头部 24 字节，负载 1024 字节，包尾 2 字节，另有 2 字节对齐填充
+PACK_HEADER_STRUCT = struct.Struct('<HHIIIIHH')
+PACK_HEADER_SIZE = PACK_HEADER_STRUCT.size
+PACK_TAIL_OFFSET = PACK_HEADER_SIZE + PACK_DATA_SIZE
+HALF_WORD_STRUCT = struct.Struct('<H')
+ACK_PACK_STRUCT = struct.Struct('<HHH')
+# 重新同步时查找的包头字节（小端）
+PACK_HEAD_BYTES = HALF_WORD_STRUCT.pack(PACK_HEAD)
+ACK_PACK_HEAD_BYTES = HALF_WORD_STRUCT.pack(ACK_PACK_HEAD)
+BULK_PACK_HEAD_BYTES = HALF_WORD_STRUCT.pack(BULK_PACK_HEAD)
+
+# 接收缓冲区容量与单次 recv_into 读取上限
+TCP_RECV_BUFFER_SIZE = 1024 * 1024
+TCP_RECV_CHUNK_SIZE = 256 * 1024
+TCP_SOCKET_RCVBUF = 4 * 1024 * 1024
+
+# 断线重连退避：首次等待最小值，之后逐次翻倍直至最大值
+TCP_RECONNECT_MIN_MS = 500
+TCP_RECONNECT_MAX_MS = 8000
+TCP_CONNECT_TIMEOUT_MS = 3000
+# 同时在途的获取图像请求数，以及请求无响应多久后视为丢失
+TCP_PIPELINE_DEPTH = 3
+TCP_REQUEST_TIMEOUT_MS = 3000
+# 已接收待处理的帧队列容量，满时丢弃最旧的帧
+TCP_FRAME_QUEUE_SIZE = 4
+
 class ImageBuffer:
     def __init__(self):
-        self.data = bytearray()
+        self.lease = None
+        self.data = None
         self.width = 0
         self.height = 0
         self.type = 0
         self.packet_count = 0
         self.received_count = 0
+        self.payload_end = 0
         self.received_flags = set()
         self.last_update = QDateTime.currentDateTime()
 
+    def release(self):
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
+            self.data = None
+
+
+class BoundedFrameQueue:
+    """
+    接收线程与界面线程之间的有界帧队列，元素为 (FrameLease, w, h, img_type)。
+    队列满时丢弃最旧的帧并归还其缓冲区，保证积压与内存占用有上限；
+    丢弃的帧以其设备标识调用 on_drop，供流控归还信用。
+    """
+
+    def __init__(self, maxsize: int = TCP_FRAME_QUEUE_SIZE, on_drop=None):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.on_drop = on_drop
+        self.dropped_count = 0
+
+    def put(self, item) -> bool:
+        """放入一帧，放入前队列为空时返回 True（调用方据此通知消费者）"""
+        old = None
+        with self.lock:
+            was_empty = not self.items
+            if len(self.items) >= self.maxsize:
+                old = self.items.popleft()
+                self.dropped_count += 1
+            self.items.append(item)
+        if old is not None:
+            device = old[0].device
+            old[0].release()
+            if self.on_drop is not None:
+                self.on_drop(device)
+        return was_empty
+
+    def get(self):
+        with self.lock:
+            return self.items.popleft() if self.items else None
+
+    def clear(self):
+        with self.lock:
+            for item in self.items:
+                item[0].release()
+            self.items.clear()
+
+
+class TcpFrameProtocol(asyncio.BufferedProtocol):
+    """asyncio 接收协议：事件循环直接 recv_into 到 worker 的接收缓冲区，读入后原地解析"""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def connection_made(self, transport):
+        self.worker.on_connection_made(transport)
+
+    def get_buffer(self, sizehint: int):
+        return self.worker.get_buffer()
+
+    def buffer_updated(self, nbytes: int):
+        self.worker.on_data_received(nbytes)
+
+    def connection_lost(self, exc):
+        self.worker.on_connection_lost(exc)
+
 
 class TcpClientWorker(QObject):
-    frameReceived = Signal(bytes, int, int, int)
+    """
+    基于 asyncio 的 TCP 传输：在 TcpClientThread 的事件循环中运行，断线后按退避间隔自动重连，
+    重连后恢复连接握手、推流状态与未完成的获取图像请求。
+    获取图像请求流水线发送，最多 pipeline_depth 个同时在途。
+    完整帧放入有界队列 frame_queue，队列由空变为非空时发出 frameQueued，接收方用 frame_queue.get() 取出，
+    处理完毕后需调用 FrameLease.release() 归还缓冲池；队列满被丢弃的帧发出 frameDropped(设备标识)。
+    发送接口可在任意线程调用，实际写入在事件循环线程中执行。
+    """
+    frameQueued = Signal()
+    frameDropped = Signal(object)
     tcpAckDataPackArrival = Signal(int)
+    connectionStateChanged = Signal(bool)
     socketError = Signal(str)
 
-    def __init__(self, local_ip: str, local_port: int, remote_ip: str, remote_port: int):
+    def __init__(self, local_ip: str, local_port: int, remote_ip: str, remote_port: int,
+                 pipeline_depth: int = TCP_PIPELINE_DEPTH, queue_size: int = TCP_FRAME_QUEUE_SIZE):
         super().__init__()
         self.local_ip = local_ip
         self.local_port = local_port
         self.remote_ip = remote_ip
         self.remote_port = remote_port
-        self.client_socket = None
-        self.running = False
+        self.loop = None
+        self.connect_task = None
+        self.transport = None
+        self.disconnected = None
+        self.stop_event = None
+        self.closing = False
         self.buffer_map = {}
         self.buf_lock = QMutex()
-        self.recv_buf = bytearray()
+        self.frame_pool = FrameBufferPool()
+        self.frame_queue = BoundedFrameQueue(queue_size, self.frameDropped.emit)
+        # 接收缓冲区：[read_pos, write_pos) 为未解析数据，尾部空间不足时把剩余的不完整包搬到开头
+        self.recv_buf = bytearray(TCP_RECV_BUFFER_SIZE)
+        self.recv_view = memoryview(self.recv_buf)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.resync_count = 0
+        self.frame_count = 0
+        # 需在重连后恢复的会话状态
+        self.session_requested = False
+        self.stream_credits = None
+        # 整帧传输：bulk_requested 为界面请求（重连后重新协商），bulk_active 为设备已确认
+        self.bulk_requested = False
+        self.bulk_active = False
+        # 正在接收的整帧：(ImageBuffer, 已写入字节数)，此期间 socket 数据直接读入帧缓冲
+        self.bulk_frame = None
+        self.bulk_filled = 0
+        # 获取图像请求流水线：待发送的请求数与在途请求的发送时刻
+        self.pipeline_depth = max(1, pipeline_depth)
+        self.pending_requests = 0
+        self.in_flight = deque()
+        self.reconnect_count = 0
 
-    def start_connection(self):
-        try:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.client_socket.bind((self.local_ip, self.local_port))
-            self.client_socket.connect((self.remote_ip, self.remote_port))
-            self.running = True
-            threading.Thread(target=self.receive_loop, daemon=True).start()
+    async def run(self):
+        """连接主循环，直到 shutdown() 被调用或主动断开"""
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        watchdog = self.loop.create_task(self.request_watchdog())
+        backoff_ms = TCP_RECONNECT_MIN_MS
+        connected_once = False
+        while not self.closing:
+            self.connect_task = self.loop.create_task(self.connect())
+            try:
+                await asyncio.wait_for(self.connect_task, TCP_CONNECT_TIMEOUT_MS / 1000)
+            except asyncio.CancelledError:
+                # 连接过程中调用了 shutdown()
+                break
+            except (OSError, asyncio.TimeoutError) as e:
+                reason = str(e) or "连接超时"
+                print(f"[TCP错误] 连接失败: {reason}，{backoff_ms} ms 后重试")
+                self.socketError.emit(f"[TCP错误] 连接失败: {reason}")
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), backoff_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+                backoff_ms = min(backoff_ms * 2, TCP_RECONNECT_MAX_MS)
+                continue
+            backoff_ms = TCP_RECONNECT_MIN_MS
             print(f"[TCP] 成功连接至 {self.remote_ip}:{self.remote_port}")
-        except Exception as e:
-            self.socketError.emit(f"[TCP错误] 连接失败: {e}")
+            self.connectionStateChanged.emit(True)
+            if connected_once:
+                self.reconnect_count += 1
+                print(f"[TCP] 第 {self.reconnect_count} 次重连成功，恢复会话")
+            self.restore_session()
+            connected_once = True
+            await self.disconnected.wait()
+            self.connectionStateChanged.emit(False)
+        watchdog.cancel()
+        self.frame_queue.clear()
+        print("[TCP] 连接已断开")
 
-    def receive_loop(self):
+    async def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            while self.running:
-                data = self.client_socket.recv(2048)
-                if not data:
-                    break
-                self.recv_buf.extend(data)
-                self.process_buffer()
-        except Exception as e:
-            self.socketError.emit(f"[TCP错误] 接收失败: {e}")
-        finally:
-            self.stop_connection()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TCP_SOCKET_RCVBUF)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.bind((self.local_ip, self.local_port))
+            sock.setblocking(False)
+            await self.loop.sock_connect(sock, (self.remote_ip, self.remote_port))
+        except BaseException:
+            sock.close()
+            raise
+        self.disconnected = asyncio.Event()
+        await self.loop.create_connection(lambda: TcpFrameProtocol(self), sock=sock)
+
+    def on_connection_made(self, transport):
+        self.transport = transport
+        self.read_pos = self.write_pos = 0
+        self.bulk_active = False
+
+    def on_connection_lost(self, exc):
+        self.transport = None
+        if exc is not None and not self.closing:
+            print(f"[TCP错误] 连接中断: {exc}")
+            self.socketError.emit(f"[TCP错误] 接收失败: {exc}")
+        # 未收完的帧无法在新连接上继续，归还缓冲区；在途请求重连后重新发送
+        with QMutexLocker(self.buf_lock):
+            for buf in self.buffer_map.values():
+                buf.release()
+            self.buffer_map.clear()
+        if self.bulk_frame is not None:
+            self.bulk_frame.release()
+            self.bulk_frame = None
+        self.pending_requests += len(self.in_flight)
+        self.in_flight.clear()
+        self.disconnected.set()
+
+    def restore_session(self):
+        """
+        建立连接后恢复握手与推流，未完成的获取图像请求重新进入流水线。
+        首次连接时若界面已先发出连接请求（当时尚未连上），也在这里补发。
+        """
+        if self.session_requested:
+            self._write(self._make_ack_packet(HOST_CONN_ACK))
+        if self.bulk_requested:
+            self._write(self._make_param_ack_packet(BULK_MODE_ACK, 1))
+        if self.stream_credits is not None:
+            self._write(self._make_param_ack_packet(STRM_STAR_ACK, self.stream_credits))
+        self.pump_requests()
+
+    def get_buffer(self) -> memoryview:
+        if self.bulk_frame is not None:
+            # 整帧数据直接读入帧缓冲，不经过接收缓冲区
+            return self.bulk_frame.data[self.bulk_filled:]
+        if len(self.recv_buf) - self.write_pos < TCP_RECV_CHUNK_SIZE:
+            self.compact_buffer()
+        return self.recv_view[self.write_pos:self.write_pos + TCP_RECV_CHUNK_SIZE]
+
+    def on_data_received(self, nbytes: int):
+        if self.bulk_frame is not None:
+            self.bulk_filled += nbytes
+            if self.bulk_filled == len(self.bulk_frame.data):
+                buf, self.bulk_frame = self.bulk_frame, None
+                self.on_frame_complete(buf)
+            return
+        self.write_pos += nbytes
+        self.process_buffer()
+
+    def compact_buffer(self):
+        """把未解析的剩余数据移到缓冲区开头，剩余数据不足一个包，搬移量为常数"""
+        remaining = self.write_pos - self.read_pos
+        if remaining:
+            self.recv_buf[:remaining] = self.recv_view[self.read_pos:self.write_pos]
+        self.read_pos = 0
+        self.write_pos = remaining
+
+    def resync(self):
+        """包头或包尾校验失败：跳过当前字节，查找下一个图像包头或应答包头"""
+        self.resync_count += 1
+        start = self.read_pos + 1
+        candidates = [pos for pos in (self.recv_buf.find(head_bytes, start, self.write_pos)
+                                      for head_bytes in (PACK_HEAD_BYTES, ACK_PACK_HEAD_BYTES, BULK_PACK_HEAD_BYTES))
+                      if pos >= 0]
+        # 找不到包头时保留最后一个字节，它可能是下一个包头的前半部分
+        self.read_pos = min(candidates) if candidates else max(start, self.write_pos - 1)
 
     def process_buffer(self):
-        print(f"[TCP] Recv data length: {len(self.recv_buf)}")
-        while len(self.recv_buf) >= 6:
-            if self.recv_buf[:2] == struct.pack('<H', ACK_PACK_HEAD) and self.recv_buf[4:6] == struct.pack('<H', ACK_PACK_TAIL):
-                # 处理 ACK 包
-                if len(self.recv_buf) >= 6:
-                    _, ack_type, _ = struct.unpack('<HHH', self.recv_buf[:6])
-                    self.tcpAckDataPackArrival.emit(ack_type)
-                    self.recv_buf = self.recv_buf[6:]
+        """在接收缓冲区内原地切分数据包，负载通过 memoryview 直接拷贝到帧缓冲"""
+        view = self.recv_view
+        with QMutexLocker(self.buf_lock):
+            while self.write_pos - self.read_pos >= ACK_PACK_STRUCT.size:
+                pos = self.read_pos
+                head, = HALF_WORD_STRUCT.unpack_from(view, pos)
+                if head == ACK_PACK_HEAD:
+                    _, ack_type, tail = ACK_PACK_STRUCT.unpack_from(view, pos)
+                    if tail != ACK_PACK_TAIL:
+                        self.resync()
+                        continue
+                    self.read_pos = pos + ACK_PACK_STRUCT.size
+                    if ack_type == DEVC_BULK_ACK:
+                        self.bulk_active = True
+                        print("[TCP] 设备已切换为整帧传输")
+                    else:
+                        self.tcpAckDataPackArrival.emit(ack_type)
+                elif head == BULK_PACK_HEAD:
+                    if self.write_pos - pos < BULK_HEADER_STRUCT.size:
+                        break
+                    if not self.start_bulk_frame(pos):
+                        self.resync()
+                        continue
+                    if self.bulk_frame is not None:
+                        # 接收缓冲区中的数据已全部拷入帧缓冲，剩余部分直接读入帧缓冲
+                        break
+                elif head == PACK_HEAD:
+                    if self.write_pos - pos < UDP_PACKET_SIZE:
+                        break
+                    tail, = HALF_WORD_STRUCT.unpack_from(view, pos + PACK_TAIL_OFFSET)
+                    if tail != PACK_TAIL:
+                        print(f"[TCP] 图像包尾校验失败, tail: {tail:04X}，重新同步")
+                        self.resync()
+                        continue
+                    self.read_pos = pos + UDP_PACKET_SIZE
+                    self.process_packet(view[pos:pos + UDP_PACKET_SIZE])
                 else:
-                    break
-            elif len(self.recv_buf) >= UDP_PACKET_SIZE:
-                pkt = self.recv_buf[:UDP_PACKET_SIZE]
-                self.recv_buf = self.recv_buf[UDP_PACKET_SIZE:]
-                self.process_packet(pkt)
-            else:
-                break
+                    self.resync()
+            if self.read_pos == self.write_pos:
+                self.read_pos = self.write_pos = 0
+
+    def start_bulk_frame(self, pos: int) -> bool:
+        """解析整帧头并分配帧缓冲，接收缓冲区中已有的数据先拷入，调用方需持有 buf_lock"""
+        _, img_type, frame_seq, w, h, length, tail = BULK_HEADER_STRUCT.unpack_from(self.recv_view, pos)
+        if tail != BULK_PACK_TAIL or length == 0:
+            print(f"[TCP] 整帧头校验失败, tail: {tail:04X}，重新同步")
+            return False
+        if is_compressed_type(img_type):
+            lease = self.frame_pool.acquire_size(compressed_capacity(length))
+            lease.truncate(length)
+        else:
+            lease = self.frame_pool.acquire(w, h, img_type)
+            if length != len(lease):
+                print(f"[TCP] 整帧长度 {length} 与图像尺寸不符，重新同步")
+                lease.release()
+                return False
+        buf = ImageBuffer()
+        buf.lease = lease
+        buf.data = lease.data
+        buf.width = w
+        buf.height = h
+        buf.type = img_type
+        start = pos + BULK_HEADER_STRUCT.size
+        available = min(self.write_pos - start, length)
+        buf.data = buf.data[:length]
+        buf.data[:available] = self.recv_view[start:start + available]
+        self.read_pos = start + available
+        if available == length:
+            self.on_frame_complete(buf)
+        else:
+            self.bulk_frame = buf
+            self.bulk_filled = available
+        return True
 
-    def process_packet(self, data: bytes):
+    def process_packet(self, packet: memoryview):
+        """处理一个完整图像包，调用方需持有 buf_lock"""
         try:
-            unpacked = struct.unpack('<HHIIIIHH{}sH2x'.format(PACK_DATA_SIZE), data)
-            head, frame_len, index, count, w, h, img_type, valid_len, payload, tail = unpacked
-            if head != PACK_HEAD or tail != PACK_TAIL:
-                print(f"[TCP] 图像包头尾校验失败,head: {head:04X}, end: {tail:04X}")
-                return
-            print(f"[TCP] Recv image data index:{index} count:{count}");
+            head, frame_len, index, count, w, h, img_type, valid_len = PACK_HEADER_STRUCT.unpack_from(packet)
             image_id = (w << 32) | count
-            with QMutexLocker(self.buf_lock):
-                if image_id not in self.buffer_map:
-                    buf = ImageBuffer()
-                    buf.data = bytearray(w * h * 3 // 2)
-                    buf.width = w
-                    buf.height = h
-                    buf.type = img_type
-                    buf.packet_count = count
-                    self.buffer_map[image_id] = buf
-                buf = self.buffer_map[image_id]
-                offset = index * PACK_DATA_SIZE
-                if index < count and offset + valid_len <= len(buf.data) and index not in buf.received_flags:
-                    buf.data[offset:offset + valid_len] = payload[:valid_len]
-                    buf.received_flags.add(index)
-                    buf.received_count += 1
-                    if buf.received_count == buf.packet_count:
-                        print("[TCP] 图像接收完成")
-                        self.frameReceived.emit(bytes(buf.data), buf.width, buf.height, buf.type)
-                        del self.buffer_map[image_id]
+            if image_id not in self.buffer_map:
+                buf = ImageBuffer()
+                if is_compressed_type(img_type):
+                    buf.lease = self.frame_pool.acquire_size(compressed_capacity(count * PACK_DATA_SIZE))
+                else:
+                    buf.lease = self.frame_pool.acquire(w, h, img_type)
+                buf.data = buf.lease.data
+                buf.width = w
+                buf.height = h
+                buf.type = img_type
+                buf.packet_count = count
+                self.buffer_map[image_id] = buf
+            buf = self.buffer_map[image_id]
+            offset = index * PACK_DATA_SIZE
+            if (index < count and valid_len <= PACK_DATA_SIZE and offset + valid_len <= len(buf.data)
+                    and index not in buf.received_flags):
+                buf.data[offset:offset + valid_len] = packet[PACK_HEADER_SIZE:PACK_HEADER_SIZE + valid_len]
+                buf.received_flags.add(index)
+                buf.received_count += 1
+                buf.payload_end = max(buf.payload_end, offset + valid_len)
+                if buf.received_count == buf.packet_count:
+                    del self.buffer_map[image_id]
+                    if is_compressed_type(buf.type):
+                        buf.lease.truncate(buf.payload_end)
+                    self.on_frame_complete(buf)
         except Exception as e:
             self.socketError.emit(f"[TCP] 图像包处理失败: {e}")
 
-    def send(self, data: bytes):
+    def on_frame_complete(self, buf: ImageBuffer):
+        self.frame_count += 1
+        buf.lease.trace.mark(STAGE_REASSEMBLY)
+        if self.frame_queue.put((buf.lease, buf.width, buf.height, buf.type)):
+            self.frameQueued.emit()
+        # 推流中的帧由信用驱动，不是获取图像请求的应答，不结束在途请求；
+        # 未推流时一帧到达即结束一个在途请求（无在途请求时为设备主动发送的帧），补发流水线中的下一个请求
+        if self.stream_credits is None and self.in_flight:
+            self.in_flight.popleft()
+            self.pump_requests()
+
+    def pump_requests(self):
+        """在事件循环线程中调用：在途请求不足流水线深度时继续发送"""
+        while self.pending_requests > 0 and len(self.in_flight) < self.pipeline_depth and self.transport:
+            self.pending_requests -= 1
+            self.in_flight.append(time.monotonic())
+            self._write(self._make_ack_packet(GAIN_IMAG_ACK))
+
+    async def request_watchdog(self):
+        """超时未响应的请求视为丢失，让出流水线位置"""
+        while True:
+            await asyncio.sleep(TCP_REQUEST_TIMEOUT_MS / 2000)
+            now = time.monotonic()
+            expired = 0
+            while self.in_flight and (now - self.in_flight[0]) * 1000 > TCP_REQUEST_TIMEOUT_MS:
+                self.in_flight.popleft()
+                expired += 1
+            if expired:
+                print(f"[TCP] {expired} 个获取图像请求超时")
+                self.pump_requests()
+
+    def _write(self, data: bytes):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(data)
+
+    def call_in_loop(self, callback, *args):
+        """把操作投递到事件循环线程执行，事件循环未运行时直接丢弃"""
+        loop = self.loop
         try:
-            if self.client_socket:
-                self.client_socket.sendall(data)
-        except Exception as e:
-            self.socketError.emit(f"[TCP错误] 发送失败: {e}")
+            if loop is None:
+                raise RuntimeError("event loop not started")
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            print("[TCP] 事件循环未运行，忽略发送")
+
+    def send(self, data: bytes):
+        self.call_in_loop(self._write, data)
 
     def _make_ack_packet(self, ack_type: int) -> bytes:
         """构造一个ACK应答数据包"""
         return struct.pack('<HHH', ACK_PACK_HEAD, ack_type, ACK_PACK_TAIL)
 
     def send_conn_request(self):
-        """发送连接请求ACK"""
+        """发送连接请求ACK，重连后自动重发"""
         print("[TCP] 发送连接请求 ACK")
+        self.session_requested = True
         self.send(self._make_ack_packet(HOST_CONN_ACK))
 
     def send_disc_request(self):
-        """发送断开请求ACK"""
+        """发送断开请求ACK，此后连接断开不再重连"""
         print("[TCP] 发送断开请求 ACK")
+        self.session_requested = False
+        self.stream_credits = None
+        self.closing = True
         self.send(self._make_ack_packet(HOST_DISC_ACK))
 
-    def send_get_image_request(self):
-        """发送获取图像请求ACK"""
-        print("[TCP] 发送获取图像请求 ACK")
-        self.send(self._make_ack_packet(GAIN_IMAG_ACK))
+    def send_bulk_mode_request(self, enable: bool = True):
+        """请求设备切换为整帧传输，重连后自动重新协商；设备不支持时保持分包传输"""
+        print(f"[TCP] 发送整帧传输请求: {'开启' if enable else '关闭'}")
+        self.bulk_requested = enable
+        self.send(self._make_param_ack_packet(BULK_MODE_ACK, 1 if enable else 0))
 
-    def stop_connection(self):
-        self.running = False
-        if self.client_socket:
-            try:
-                self.client_socket.close()
-            except:
-                pass
-            self.client_socket = None
-        self.buffer_map.clear()
-        print("[TCP] 连接已断开")
+    def send_get_image_request(self, count: int = 1):
+        """请求 count 帧图像，按流水线深度分批发送"""
+        print(f"[TCP] 请求获取图像 {count} 帧")
+        self.call_in_loop(self._queue_requests, count)
+
+    def _queue_requests(self, count: int):
+        self.pending_requests += count
+        self.pump_requests()
+
+    def _make_param_ack_packet(self, ack_type: int, value: int) -> bytes:
+        """构造带 uint32 参数的控制包"""
+        return struct.pack('<HHIH', ACK_PACK_HEAD, ack_type, value, ACK_PACK_TAIL)
+
+    def send_stream_start(self, credits: int):
+        """发送开始推流请求，重连后按同一信用窗口重新开始"""
+        print(f"[TCP] 发送开始推流请求, 信用窗口={credits}")
+        self.stream_credits = credits
+        self.send(self._make_param_ack_packet(STRM_STAR_ACK, credits))
+
+    def send_stream_stop(self):
+        """发送停止推流请求"""
+        print("[TCP] 发送停止推流请求")
+        self.stream_credits = None
+        self.send(self._make_param_ack_packet(STRM_STOP_ACK, 0))
+
+    def send_stream_credit(self, credits: int):
+        """归还推流信用"""
+        self.send(self._make_param_ack_packet(STRM_CRED_ACK, credits))
+
+    def shutdown(self):
+        """可在任意线程调用：停止重连并关闭连接，run() 随之返回"""
+        self.closing = True
+        self.call_in_loop(self._shutdown)
+
+    def _shutdown(self):
+        self.stop_event.set()
+        if self.connect_task is not None and not self.connect_task.done():
+            self.connect_task.cancel()
+        if self.transport is not None:
+            # close() 会先发出已缓冲的数据（如断开请求）
+            self.transport.close()
 
 
 class TcpClientThread(QThread):
@@ -173,12 +560,11 @@ class TcpClientThread(QThread):
         self.worker = TcpClientWorker(self.local_ip, self.local_port, self.remote_ip, self.remote_port)
         self.worker.moveToThread(self)
         self.worker_ready.emit(self.worker)
-        self.worker.start_connection()
-        self.exec()
+        # 本线程的事件循环由 asyncio 驱动
+        asyncio.run(self.worker.run())
 
     def stop(self):
         if self.worker:
-            self.worker.stop_connection()
-        self.quit()
+            self.worker.shutdown()
         self.wait()
         print("[TCP] 客户端线程停止")
@@ -3,23 +3,39 @@ import torch
 import cv2
 import yaml
 import random
-from ultralytics import YOLO
-from PIL import Image, ImageDraw, ImageFont
+
+from frame_preprocess import FramePreprocessor, PreparedFrame, MODEL_INPUT_SIZE, LETTERBOX_PAD_VALUE
+from inference_backend import create_backend, BACKEND_AUTO
+from label_renderer import LabelRenderer
+from tiled_inference import TiledInference
+
+# 分割掩码叠加：掩码区域按类别颜色 × MASK_OVERLAY_ALPHA 加亮
+MASK_OVERLAY_ALPHA = 0.5
 
 
 class YoloSegmentInfer:
-    def __init__(self, model_path: str, yaml_path: str = None):
+    def __init__(self, model_path: str, yaml_path: str = None, backend: str = BACKEND_AUTO,
+                 calibration_dir: str = None, result_cache=None, tiled: bool = False):
 
         print(f"Pytorch model path: {model_path}")
         print(f"Pytorch yaml path: {yaml_path}")
 
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f"yolo run location: {self.device}")
-        self.model = YOLO(model_path)  # 使用ultralytics自动加载
-        self.model.to(self.device)
+        self.backend = create_backend(model_path, backend, calibration_dir=calibration_dir)
+        # 近重复帧结果缓存（FrameResultCache），为 None 时每帧都推理
+        self.result_cache = result_cache
+        # 分块推理（高分辨率小目标），为 None 时整图推理
+        self.tiler = TiledInference(self) if tiled else None
+        self.device = self.backend.device
+        print(f"yolo run location: {self.device}, backend: {self.backend.name}")
         self.class_names = []
         self.class_colors = []
-        self.font = ImageFont.truetype("simhei.ttf", 20)
+        # 掩码叠加：类别标签图（0 为背景，类别 c 为 c+1）与 标签 → 叠加颜色 的查找表
+        self.label_map = None
+        self.overlay_lut = np.zeros((256, 3), dtype=np.uint8)
+        # 中文标签绘制（字形缓存），字体在首次绘制或加载类别时加载
+        self.label_renderer = LabelRenderer()
+        # 本地 BGR 图像输入时使用的预处理器，界面出图由调用方传入已预处理的 PreparedFrame
+        self.preprocessor = FramePreprocessor(square=self.square_input)
 
         if yaml_path:
             self.load_classes(yaml_path)
@@ -78,29 +94,89 @@ class YoloSegmentInfer:
                 (240, 130, 20)  # 其他异常
             ]
 
+        self.overlay_lut.fill(0)
+        for cls_id in range(min(len(self.class_names), 255)):
+            color = self.class_colors[cls_id % len(self.class_colors)]
+            self.overlay_lut[cls_id + 1] = np.round(np.array(color) * MASK_OVERLAY_ALPHA)
+
+        self.label_renderer.preload(self.class_names)
+
         print(f"[YOLO] 加载类别成功: {self.class_names}")
 
     def draw_chinese(self, image_np, text, position, color):
-        """使用 PIL 在 OpenCV 图像上绘制中文"""
-        image_pil = Image.fromarray(cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(image_pil)
-        draw.text(position, text, font=self.font, fill=color[::-1])  # BGR → RGB
-        return cv2.cvtColor(np.array(image_pil), cv2.COLOR_RGB2BGR)
-
-    def predict(self, image_np: np.ndarray):
-        results = self.model(image_np,
-                             conf=0.25,
-                             iou=0.45,
-                             verbose=False)[0]
-
-        boxes = results.boxes.data.cpu().numpy()
-        masks = results.masks.data.cpu().numpy() if results.masks is not None else None
-
-        annotated = image_np.copy()
+        """在 OpenCV 图像上原地绘制中文（缓存的字形图块，只混合标签区域），返回该图像"""
+        self.label_renderer.draw(image_np, text, position, color)
+        return image_np
+
+    def infer(self, frame):
+        """
+        对预处理后的帧推理，frame 为 PreparedFrame 或 BGR 图像。
+        张量已完成 letterbox 与归一化，ultralytics 不再重复预处理；返回的框与掩码位于张量坐标系。
+        """
+        if not isinstance(frame, PreparedFrame):
+            frame = self.preprocessor.prepare_image(frame)
+        return frame, self.infer_batch(frame.tensor)[0]
+
+    def infer_batch(self, batch: np.ndarray) -> list:
+        """
+        批量推理：batch 为 FramePreprocessor.prepare_batch 得到的 Nx3xHxW 张量，一次前向计算，
+        返回按帧拆分的结果列表，逐帧交给 render_segment/render_detect 绘制。
+        启用结果缓存时，与缓存帧近似的帧直接复用缓存结果，只有未命中的帧送入模型。
+        """
+        if self.result_cache is None:
+            return list(self.backend(torch.from_numpy(batch), conf=0.25, iou=0.45))
+        shape = batch.shape[1:]
+        signatures = [self.result_cache.signature(tensor) for tensor in batch]
+        results = [self.result_cache.lookup(shape, signature) for signature in signatures]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            miss_batch = batch if len(misses) == len(batch) else np.ascontiguousarray(batch[misses])
+            for i, result in zip(misses, self.backend(torch.from_numpy(miss_batch), conf=0.25, iou=0.45)):
+                results[i] = result
+                self.result_cache.store(shape, signatures[i], result)
+        return results
+
+    def warmup(self):
+        """以一帧填充色输入做一次推理（不经结果缓存），完成算子初始化与内存分配，避免首帧额外耗时"""
+        batch = np.full((1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), LETTERBOX_PAD_VALUE / 255.0, dtype=np.float32)
+        self.backend(torch.from_numpy(batch), conf=0.25, iou=0.45)
+
+    @property
+    def square_input(self) -> bool:
+        """当前后端是否要求正方形输入，调用方创建 FramePreprocessor 时使用"""
+        return self.backend.square_input
+
+    def predict(self, frame):
+        """
+        输入为 PreparedFrame（或 BGR 图像），返回：
+            - 叠加分割掩码、边框和中文标签后的原分辨率 BGR 图像 annotated
+            - 每个类别对应的所有置信度列表组成的字典
+        """
+        frame, results = self.infer(frame)
+        return self.render_segment(frame, results)
+
+    def predict_tiled(self, frame: PreparedFrame):
+        """分块推理的 predict，返回值同 predict"""
+        boxes, masks = self.tiler.infer(frame, with_masks=True)
+        return self.draw_segments(frame, boxes, masks)
+
+    def render_segment(self, frame: PreparedFrame, results):
+        """将一帧的分割结果映射回原图并绘制，返回值同 predict"""
+        boxes = frame.scale_boxes(results.boxes.data.cpu().numpy())
+        masks = None
+        if results.masks is not None:
+            mask_data = results.masks.data.cpu().numpy()
+            masks = [frame.scale_mask_region(mask_data[i], box) for i, box in enumerate(boxes)]
+        return self.draw_segments(frame, boxes, masks)
+
+    def draw_segments(self, frame: PreparedFrame, boxes: np.ndarray, masks: list):
+        """boxes 为原图坐标 (N, 6)，masks 为对应的框内掩码区域 (x0, y0, bool 数组) 列表"""
+        annotated = frame.bgr.copy()
         class_score_map = {}
 
         if masks is not None:
-            for i, box in enumerate(boxes):
+            self.overlay_masks(annotated, boxes, masks)
+            for box in boxes:
                 x1, y1, x2, y2, conf, cls_id = box
                 cls_id = int(cls_id)
                 conf = float(conf)
@@ -110,13 +186,7 @@ class YoloSegmentInfer:
                 name = self.class_names[cls_id]
                 class_score_map.setdefault(name, []).append(conf)
 
-                mask = masks[i].astype(bool)
                 color = self.class_colors[cls_id % len(self.class_colors)]
-                color_img = np.zeros_like(annotated, dtype=np.uint8)
-                color_img[:, :] = color
-                blended = cv2.addWeighted(annotated, 1.0, color_img, 0.5, 0)
-                annotated[mask] = blended[mask]
-
                 cv2.rectangle(annotated, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
                 label = f"{name} {conf:.2f}"
                 annotated = self.draw_chinese(annotated, label, (int(x1), int(y1) - 25), color)
@@ -126,20 +196,52 @@ class YoloSegmentInfer:
 
         return annotated, class_score_map
 
-    def detect(self, image_np: np.ndarray):
+    def overlay_masks(self, annotated: np.ndarray, boxes: np.ndarray, masks: list):
         """
-        输入为 BGR 图像，返回：
+        一次性叠加全部掩码：先将各掩码写入类别标签图（置信度高的后写，重叠处以其为准），
+        再逐个掩码框对标签图查表加亮并清零该框，每个像素只加亮一次，耗时取决于掩码面积而非检测数量。
+        """
+        height, width = annotated.shape[:2]
+        if self.label_map is None or self.label_map.shape != (height, width):
+            self.label_map = np.zeros((height, width), dtype=np.uint8)
+        labels = self.label_map
+        regions = []
+        for i in np.argsort(boxes[:, 4], kind="stable"):
+            cls_id = int(boxes[i, 5])
+            mask_x, mask_y, mask = masks[i]
+            if cls_id >= min(len(self.class_names), 255) or mask.size == 0:
+                continue
+            labels[mask_y:mask_y + mask.shape[0], mask_x:mask_x + mask.shape[1]][mask] = cls_id + 1
+            regions.append((mask_x, mask_y, mask_x + mask.shape[1], mask_y + mask.shape[0]))
+        for x0, y0, x1, y1 in regions:
+            roi = annotated[y0:y1, x0:x1]
+            label_roi = labels[y0:y1, x0:x1]
+            cv2.add(roi, self.overlay_lut[label_roi], dst=roi)
+            # 清零后重叠的框不再重复加亮，标签图也保持全零供下一帧复用
+            label_roi.fill(0)
+
+    def detect(self, frame):
+        """
+        输入为 PreparedFrame（或 BGR 图像），返回：
             - 绘制边框和中文标签后的图像 annotated
             - 每个类别对应的所有置信度列表组成的字典，如：{'破损': [0.91, 0.85], '鸟粪': [0.78]}
             - 检测框信息列表，每项格式为 (cls_name, conf, (x1, y1, x2, y2))
         """
-        results = self.model(image_np,
-                             conf=0.25,
-                             iou=0.45,
-                             verbose=False)[0]
+        frame, results = self.infer(frame)
+        return self.render_detect(frame, results)
 
-        boxes = results.boxes.data.cpu().numpy()
-        annotated = image_np.copy()
+    def detect_tiled(self, frame: PreparedFrame):
+        """分块推理的 detect，返回值同 detect"""
+        boxes, _ = self.tiler.infer(frame, with_masks=False)
+        return self.draw_detections(frame, boxes)
+
+    def render_detect(self, frame: PreparedFrame, results):
+        """将一帧的检测结果映射回原图并绘制，返回值同 detect"""
+        return self.draw_detections(frame, frame.scale_boxes(results.boxes.data.cpu().numpy()))
+
+    def draw_detections(self, frame: PreparedFrame, boxes: np.ndarray):
+        """boxes 为原图坐标 (N, 6)"""
+        annotated = frame.bgr.copy()
         class_score_map = {}
         detections = []
 
@@ -166,4 +268,3 @@ class YoloSegmentInfer:
             class_score_map["未检测到目标"] = [0.0]
 
         return annotated, class_score_map, detections
-
@@ -0,0 +1,595 @@
+# device_emulator.py
+# 设备模拟器与压测工具：按 Hi3516 端协议模拟 UDP/TCP 应答、图像发送、连续推流与选择性重传，
+# 可注入丢包、重复、乱序与延迟，用于无硬件时调试上位机及测试接收吞吐
+import argparse
+import glob
+import heapq
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from ive_image_converter import IVEImageType, IVEImageTypeConvert
+from frame_decoder import PAYLOAD_TYPE_JPEG, PAYLOAD_TYPE_H264, av
+from udp_server import (PACK_HEAD, PACK_TAIL, PACK_DATA_SIZE, ACK_PACK_HEAD, ACK_PACK_TAIL,
+                        HOST_CONN_ACK, HOST_DISC_ACK, GAIN_IMAG_ACK,
+                        STRM_STAR_ACK, STRM_STOP_ACK, STRM_CRED_ACK, PARAM_ACK_STRUCT,
+                        PACK_HEADER_STRUCT, ACK_PACK_STRUCT, parse_nack_packet)
+from TcpClient import (UDP_PACKET_SIZE as TCP_PACKET_SIZE, BULK_MODE_ACK, DEVC_BULK_ACK,
+                       BULK_PACK_HEAD, BULK_PACK_TAIL, BULK_HEADER_STRUCT)
+
+DEVC_CONN_ACK = 0x0001
+DEVC_DISC_ACK = 0x0003
+
+# 设备端缓存的已发送帧数量，用于响应重传请求
+SENT_FRAME_CACHE = 8
+# 压测统计输出周期
+EMULATOR_STATS_INTERVAL_S = 1.0
+# 读取真实图像时支持的扩展名
+IMAGE_FILE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# 压缩负载编码参数
+JPEG_QUALITY = 85
+H264_BITRATE = 4_000_000
+
+
+class NetworkImpairment:
+    """
+    链路损伤注入：按概率丢包、重复、乱序（与下一个包交换顺序），并附加固定延迟与抖动。
+    所有数据包经 process() 处理后通过 send 回调发出；有延迟时由独立线程按到期时间发送。
+    """
+
+    def __init__(self, send, loss: float = 0.0, duplicate: float = 0.0, reorder: float = 0.0,
+                 delay_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = None):
+        self.send = send
+        self.loss = loss
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.random = random.Random(seed)
+        self.held = None
+        # 图像包、重传包与应答来自不同线程，乱序暂存需加锁
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.duplicated = 0
+        self.reordered = 0
+        # 延迟发送队列：(到期时间, 序号, 数据包)
+        self.delay_queue = []
+        self.delay_seq = 0
+        self.delay_cond = threading.Condition()
+        self.delay_thread = None
+
+    def process(self, packet: bytes, lossy: bool = True):
+        """lossy 为 False 时只施加延迟（用于应答等控制包）"""
+        with self.lock:
+            self._process(packet, lossy)
+
+    def _process(self, packet: bytes, lossy: bool):
+        if lossy and self.loss > 0 and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        copies = 1
+        if lossy and self.duplicate > 0 and self.random.random() < self.duplicate:
+            self.duplicated += 1
+            copies = 2
+        for _ in range(copies):
+            if lossy and self.reorder > 0 and self.held is None and self.random.random() < self.reorder:
+                # 暂存当前包，等下一个包发出后再发
+                self.held = packet
+                self.reordered += 1
+                continue
+            self._deliver(packet)
+            if self.held is not None:
+                held, self.held = self.held, None
+                self._deliver(held)
+
+    def flush(self):
+        """发出暂存的乱序包，一帧发送结束时调用"""
+        with self.lock:
+            if self.held is not None:
+                held, self.held = self.held, None
+                self._deliver(held)
+
+    def _deliver(self, packet: bytes):
+        if self.delay_ms <= 0 and self.jitter_ms <= 0:
+            self.send(packet)
+            return
+        delay = self.delay_ms + (self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms > 0 else 0.0)
+        due = time.monotonic() + max(0.0, delay) / 1000
+        with self.delay_cond:
+            heapq.heappush(self.delay_queue, (due, self.delay_seq, packet))
+            self.delay_seq += 1
+            if self.delay_thread is None:
+                self.delay_thread = threading.Thread(target=self.delay_loop, daemon=True)
+                self.delay_thread.start()
+            self.delay_cond.notify()
+
+    def delay_loop(self):
+        while True:
+            with self.delay_cond:
+                while not self.delay_queue:
+                    self.delay_cond.wait()
+                due, _, packet = self.delay_queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.delay_cond.wait(wait)
+                    continue
+                heapq.heappop(self.delay_queue)
+            try:
+                self.send(packet)
+            except OSError:
+                pass
+
+
+class FrameSource:
+    """
+    帧数据源：给定图像文件或目录时循环发送真实图像，否则生成随帧序号移动的合成测试图。
+    图像统一缩放到目标分辨率并编码为指定 IVE 类型或压缩负载（JPEG/H.264）；
+    真实图像只编码一次，H.264 帧间有参考关系，每帧都需经过编码器。
+    """
+
+    def __init__(self, width: int, height: int, img_type: int, image_path: str = None):
+        self.width = width
+        self.height = height
+        self.img_type = img_type
+        self.frames = []
+        self.images = []
+        self.encoder = None
+        if img_type == PAYLOAD_TYPE_H264:
+            if av is None:
+                raise RuntimeError("H.264 负载需要安装 PyAV")
+            self.encoder = av.CodecContext.create('libx264', 'w')
+            self.encoder.width = width
+            self.encoder.height = height
+            self.encoder.pix_fmt = 'yuv420p'
+            self.encoder.bit_rate = H264_BITRATE
+            self.encoder.options = {'tune': 'zerolatency', 'preset': 'ultrafast'}
+        if image_path:
+            if os.path.isdir(image_path):
+                paths = sorted(p for p in glob.glob(os.path.join(image_path, '*'))
+                               if p.lower().endswith(IMAGE_FILE_EXTENSIONS))
+            else:
+                paths = [image_path]
+            for path in paths:
+                bgr = cv2.imread(path)
+                if bgr is None:
+                    print(f"[模拟设备] 无法读取图像: {path}")
+                    continue
+                bgr = cv2.resize(bgr, (width, height), interpolation=cv2.INTER_AREA)
+                self.images.append(bgr)
+                if self.encoder is None:
+                    self.frames.append(self.encode(bgr))
+            print(f"[模拟设备] 已加载 {len(self.frames)} 张图像")
+        if not self.images:
+            # 合成图：水平/垂直渐变叠加色块，逐帧平移
+            x = np.linspace(0, 255, width, dtype=np.float32)
+            y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+            self.base = np.dstack([np.broadcast_to(x, (height, width)),
+                                   np.broadcast_to(y, (height, width)),
+                                   np.broadcast_to((x + y) / 2, (height, width))]).astype(np.uint8)
+            self.base[height // 4:height // 2, width // 4:width // 2] = (40, 200, 240)
+
+    def encode(self, bgr: np.ndarray) -> bytes:
+        if self.img_type == PAYLOAD_TYPE_JPEG:
+            ok, data = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            return data.tobytes()
+        if self.img_type == PAYLOAD_TYPE_H264:
+            frame = av.VideoFrame.from_ndarray(bgr, format='bgr24').reformat(format='yuv420p')
+            return b''.join(bytes(packet) for packet in self.encoder.encode(frame))
+        return IVEImageTypeConvert.from_bgr(bgr, self.img_type)
+
+    def frame(self, frame_seq: int) -> bytes:
+        if self.frames:
+            return self.frames[frame_seq % len(self.frames)]
+        if self.images:
+            return self.encode(self.images[frame_seq % len(self.images)])
+        return self.encode(np.roll(self.base, (frame_seq * 8) % self.width, axis=1))
+
+
+class DeviceEmulatorBase:
+    """
+    设备端公共逻辑：应答握手、单帧/连续推流（信用窗口背压）、选择性重传与吞吐统计。
+    子类实现 transmit() 发送数据包并负责接收控制包后调用 handle_command()。
+    """
+    transport = ""
+
+    def __init__(self, width: int = 640, height: int = 480, img_type: int = IVEImageType.YUV420SP,
+                 fps: float = 25.0, sequenced: bool = True, image_path: str = None,
+                 loss_rate: float = 0.0, duplicate_rate: float = 0.0, reorder_rate: float = 0.0,
+                 delay_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = None):
+        self.width = width
+        self.height = height
+        self.img_type = img_type
+        self.sequenced = sequenced
+        self.source = FrameSource(width, height, img_type, image_path)
+        self.impairment = NetworkImpairment(self.transmit, loss_rate, duplicate_rate, reorder_rate,
+                                            delay_ms, jitter_ms, seed)
+        self.running = False
+        self.frame_seq = 0
+        self.sent_frames = OrderedDict()
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.resent_packets = 0
+        # 连续推流状态，credits 为 None 表示不限信用（压测）
+        self.fps = fps
+        self.credits = 0
+        self.streaming = False
+        self.max_frames = 0
+        self.send_lock = threading.Lock()
+        self.credit_cond = threading.Condition()
+
+    @property
+    def dropped_packets(self) -> int:
+        return self.impairment.dropped
+
+    def transmit(self, packet: bytes):
+        raise NotImplementedError
+
+    def stop(self):
+        self.running = False
+        with self.credit_cond:
+            self.streaming = False
+            self.credit_cond.notify_all()
+
+    def handle_command(self, data: bytes):
+        """处理上位机发来的控制包：6 字节应答、10 字节参数包或重传请求"""
+        if len(data) == ACK_PACK_STRUCT.size:
+            head, ack_type, tail = ACK_PACK_STRUCT.unpack(data)
+            if head != ACK_PACK_HEAD or tail != ACK_PACK_TAIL:
+                return
+            if ack_type == HOST_CONN_ACK:
+                self.send_ack(DEVC_CONN_ACK)
+            elif ack_type == HOST_DISC_ACK:
+                self.stop_stream()
+                self.send_ack(DEVC_DISC_ACK)
+            elif ack_type == GAIN_IMAG_ACK:
+                self.send_frame()
+        elif len(data) == PARAM_ACK_STRUCT.size:
+            head, ack_type, value, tail = PARAM_ACK_STRUCT.unpack(data)
+            if head != ACK_PACK_HEAD or tail != ACK_PACK_TAIL:
+                return
+            if ack_type == STRM_STAR_ACK:
+                self.start_stream(value)
+            elif ack_type == STRM_CRED_ACK:
+                with self.credit_cond:
+                    if self.credits is not None:
+                        self.credits += value
+                    self.credit_cond.notify_all()
+            elif ack_type == STRM_STOP_ACK:
+                self.stop_stream()
+            else:
+                self.handle_param(ack_type, value)
+        else:
+            nack = parse_nack_packet(data)
+            if nack is not None:
+                self.resend(*nack)
+
+    def handle_param(self, ack_type: int, value: int):
+        """子类扩展的参数控制包"""
+        pass
+
+    def send_ack(self, ack_type: int):
+        self.impairment.process(ACK_PACK_STRUCT.pack(ACK_PACK_HEAD, ack_type, ACK_PACK_TAIL), lossy=False)
+
+    def start_stream(self, credits, max_frames: int = 0):
+        """credits 为 None 时不等待信用，按帧率持续发送；max_frames 为 0 表示不限帧数"""
+        with self.credit_cond:
+            self.credits = credits
+            self.max_frames = max_frames
+            if self.streaming:
+                return
+            self.streaming = True
+        window = "不限" if credits is None else credits
+        print(f"[模拟设备] 开始推流 {self.fps} fps, 信用窗口={window}")
+        threading.Thread(target=self.stream_loop, daemon=True).start()
+
+    def stop_stream(self):
+        with self.credit_cond:
+            if not self.streaming:
+                return
+            self.streaming = False
+            self.credit_cond.notify_all()
+        print("[模拟设备] 停止推流")
+
+    def stream_loop(self):
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_time = time.monotonic()
+        sent = 0
+        while True:
+            with self.credit_cond:
+                # 没有信用时等待上位机归还，实现背压
+                while self.streaming and self.credits is not None and self.credits <= 0:
+                    self.credit_cond.wait(0.5)
+                if not self.streaming:
+                    return
+                if self.credits is not None:
+                    self.credits -= 1
+            self.send_frame()
+            sent += 1
+            if self.max_frames and sent >= self.max_frames:
+                self.stop_stream()
+                return
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def make_packet(self, frame_seq: int, frame: bytes, index: int, count: int) -> bytes:
+        chunk = frame[index * PACK_DATA_SIZE:(index + 1) * PACK_DATA_SIZE]
+        return (PACK_HEADER_STRUCT.pack(PACK_HEAD, 0, index, count, self.width, self.height,
+                                        self.img_type, len(chunk))
+                + chunk.ljust(PACK_DATA_SIZE, b'\0') + struct.pack('<H', PACK_TAIL))
+
+    def send_frame(self):
+        with self.send_lock:
+            self._send_frame()
+
+    def _send_frame(self):
+        frame_seq = self.frame_seq
+        frame = self.source.frame(frame_seq)
+        self.frame_seq = (self.frame_seq + 1) & 0xFFFFFFFF
+        self.sent_frames[frame_seq] = frame
+        while len(self.sent_frames) > SENT_FRAME_CACHE:
+            self.sent_frames.popitem(last=False)
+
+        self.transmit_frame(frame_seq, frame)
+        self.sent_bytes += len(frame)
+
+    def transmit_frame(self, frame_seq: int, frame: bytes):
+        count = (len(frame) + PACK_DATA_SIZE - 1) // PACK_DATA_SIZE
+        for index in range(count):
+            self.impairment.process(self.make_packet(frame_seq, frame, index, count))
+        self.impairment.flush()
+        self.sent_packets += count
+
+    def resend(self, frame_seq: int, missing: list):
+        with self.send_lock:
+            frame = self.sent_frames.get(frame_seq)
+            if frame is None:
+                print(f"[模拟设备] 重传请求的帧 seq={frame_seq} 已不在缓存中")
+                return
+            count = (len(frame) + PACK_DATA_SIZE - 1) // PACK_DATA_SIZE
+            resent = 0
+            for index in missing:
+                if index < count:
+                    self.impairment.process(self.make_packet(frame_seq, frame, index, count), lossy=False)
+                    resent += 1
+            self.resent_packets += resent
+        print(f"[模拟设备] 重传帧 seq={frame_seq} 的 {resent} 个包")
+
+    def stats_loop(self):
+        """周期输出发送帧率、包速率与带宽"""
+        last_time = time.monotonic()
+        last_frames, last_packets, last_bytes = self.frame_seq, self.sent_packets, self.sent_bytes
+        while self.running:
+            time.sleep(EMULATOR_STATS_INTERVAL_S)
+            now = time.monotonic()
+            elapsed = now - last_time
+            frames, packets, sent_bytes = self.frame_seq, self.sent_packets, self.sent_bytes
+            print(f"[模拟设备] {self.transport} {(frames - last_frames) / elapsed:.1f} fps, "
+                  f"{(packets - last_packets) / elapsed:.0f} pps, "
+                  f"{(sent_bytes - last_bytes) / elapsed / 1e6:.1f} MB/s, "
+                  f"丢弃 {self.impairment.dropped}, 重复 {self.impairment.duplicated}, "
+                  f"乱序 {self.impairment.reordered}, 重传 {self.resent_packets}")
+            last_time, last_frames, last_packets, last_bytes = now, frames, packets, sent_bytes
+
+
+class UdpDeviceEmulator(DeviceEmulatorBase):
+    """UDP 设备：1050 字节图像包，sequenced 时追加 uint32 帧序号（1054 字节）并支持重传"""
+    transport = "UDP"
+
+    def __init__(self, listen_ip: str, listen_port: int, host_ip: str, host_port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.listen_addr = (listen_ip, listen_port)
+        self.host_addr = (host_ip, host_port)
+        self.sock = None
+
+    def start(self, stats: bool = False):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        self.sock.bind(self.listen_addr)
+        self.sock.settimeout(0.2)
+        self.running = True
+        threading.Thread(target=self.receive_loop, daemon=True).start()
+        if stats:
+            threading.Thread(target=self.stats_loop, daemon=True).start()
+        print(f"[模拟设备] UDP 监听 {self.listen_addr[0]}:{self.listen_addr[1]}，上位机 {self.host_addr[0]}:{self.host_addr[1]}")
+
+    def stop(self):
+        super().stop()
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def transmit(self, packet: bytes):
+        sock = self.sock
+        if sock is not None:
+            sock.sendto(packet, self.host_addr)
+
+    def make_packet(self, frame_seq: int, frame: bytes, index: int, count: int) -> bytes:
+        packet = super().make_packet(frame_seq, frame, index, count)
+        if self.sequenced:
+            packet += struct.pack('<I', frame_seq)
+        return packet
+
+    def receive_loop(self):
+        while self.running:
+            try:
+                data, _ = self.sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except (OSError, AttributeError):
+                break
+            self.handle_command(data)
+
+
+class TcpDeviceEmulator(DeviceEmulatorBase):
+    """
+    TCP 设备：作为服务端等待上位机连接，图像包为 1050 字节包后补 2 字节对齐（1052 字节），不带帧序号。
+    上位机协商整帧传输后，每帧改为整帧头 + 整帧数据一次发送。控制包在字节流中按包头包尾切分。
+    """
+    transport = "TCP"
+
+    def __init__(self, listen_ip: str, listen_port: int, **kwargs):
+        kwargs['sequenced'] = False
+        super().__init__(**kwargs)
+        self.listen_addr = (listen_ip, listen_port)
+        self.server = None
+        self.conn = None
+        self.on_connected = None
+        # 应答与图像包可能来自不同线程，整包写入需串行化，避免字节流交错
+        self.transmit_lock = threading.Lock()
+        self.bulk = False
+
+    def start(self, stats: bool = False):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.listen_addr)
+        self.server.listen(1)
+        self.server.settimeout(0.2)
+        self.running = True
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        if stats:
+            threading.Thread(target=self.stats_loop, daemon=True).start()
+        print(f"[模拟设备] TCP 监听 {self.listen_addr[0]}:{self.listen_addr[1]}")
+
+    def stop(self):
+        super().stop()
+        for sock in (self.conn, self.server):
+            if sock:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+        self.conn = None
+        self.server = None
+
+    def transmit(self, packet: bytes):
+        conn = self.conn
+        if conn is not None:
+            with self.transmit_lock:
+                conn.sendall(packet)
+
+    def make_packet(self, frame_seq: int, frame: bytes, index: int, count: int) -> bytes:
+        return super().make_packet(frame_seq, frame, index, count).ljust(TCP_PACKET_SIZE, b'\0')
+
+    def handle_param(self, ack_type: int, value: int):
+        if ack_type == BULK_MODE_ACK:
+            self.bulk = bool(value)
+            print(f"[模拟设备] 整帧传输: {'开启' if self.bulk else '关闭'}")
+            if self.bulk:
+                self.send_ack(DEVC_BULK_ACK)
+
+    def transmit_frame(self, frame_seq: int, frame: bytes):
+        if not self.bulk:
+            super().transmit_frame(frame_seq, frame)
+            return
+        header = BULK_HEADER_STRUCT.pack(BULK_PACK_HEAD, self.img_type, frame_seq, self.width, self.height,
+                                         len(frame), BULK_PACK_TAIL)
+        self.impairment.process(header + frame)
+        self.sent_packets += 1
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                conn, addr = self.server.accept()
+            except socket.timeout:
+                continue
+            except (OSError, AttributeError):
+                break
+            print(f"[模拟设备] 上位机已连接 {addr[0]}:{addr[1]}")
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.conn = conn
+            if self.on_connected is not None:
+                self.on_connected()
+            self.receive_loop(conn)
+            self.stop_stream()
+            self.bulk = False
+            self.conn = None
+            conn.close()
+            print("[模拟设备] 上位机已断开")
+
+    def receive_loop(self, conn: socket.socket):
+        buffer = bytearray()
+        conn.settimeout(0.2)
+        while self.running:
+            try:
+                data = conn.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not data:
+                break
+            buffer.extend(data)
+            while len(buffer) >= ACK_PACK_STRUCT.size:
+                head, = struct.unpack_from('<H', buffer)
+                if head != ACK_PACK_HEAD:
+                    # 丢弃到下一个可能的包头
+                    del buffer[0]
+                    continue
+                tail, = struct.unpack_from('<H', buffer, ACK_PACK_STRUCT.size - 2)
+                if tail == ACK_PACK_TAIL:
+                    size = ACK_PACK_STRUCT.size
+                elif len(buffer) >= PARAM_ACK_STRUCT.size:
+                    size = PARAM_ACK_STRUCT.size
+                else:
+                    break
+                self.handle_command(bytes(buffer[:size]))
+                del buffer[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hi3516 设备模拟器 / 接收压测工具")
+    parser.add_argument('--transport', choices=('udp', 'tcp'), default='udp', help='传输协议 (默认: udp)')
+    parser.add_argument('--listen-ip', type=str, default='127.0.0.1', help='模拟设备监听地址')
+    parser.add_argument('--listen-port', type=int, default=12020, help='模拟设备监听端口 (默认: 12020)')
+    parser.add_argument('--host-ip', type=str, default='127.0.0.1', help='上位机接收地址 (仅 UDP)')
+    parser.add_argument('--host-port', type=int, default=12021, help='上位机接收端口 (仅 UDP, 默认: 12021)')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--type', type=int, default=IVEImageType.YUV420SP,
+                        help=f'IVE 图像类型编号，或压缩负载 {PAYLOAD_TYPE_JPEG}=JPEG、{PAYLOAD_TYPE_H264}=H.264')
+    parser.add_argument('--image', type=str, default=None, help='发送真实图像：图像文件或目录，缺省为合成图')
+    parser.add_argument('--fps', type=float, default=25.0, help='连续推流帧率 (默认: 25, 0 为不限速)')
+    parser.add_argument('--legacy', action='store_true', help='UDP 使用不带帧序号的旧协议包')
+    parser.add_argument('--loss', type=float, default=0.0, help='首次发送时的随机丢包率')
+    parser.add_argument('--dup', type=float, default=0.0, help='数据包重复概率')
+    parser.add_argument('--reorder', type=float, default=0.0, help='数据包乱序概率')
+    parser.add_argument('--delay', type=float, default=0.0, help='附加延迟 ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟抖动 ms')
+    parser.add_argument('--seed', type=int, default=None, help='损伤注入随机种子')
+    parser.add_argument('--load', action='store_true', help='压测模式：不等待握手，立即以不限信用持续推流')
+    parser.add_argument('--frames', type=int, default=0, help='压测模式发送帧数，0 为不限')
+    parser.add_argument('--stats', action='store_true', help='每秒输出发送统计')
+    args = parser.parse_args()
+
+    options = dict(width=args.width, height=args.height, img_type=args.type, fps=args.fps,
+                   image_path=args.image, loss_rate=args.loss, duplicate_rate=args.dup,
+                   reorder_rate=args.reorder, delay_ms=args.delay, jitter_ms=args.jitter, seed=args.seed)
+    if args.transport == 'tcp':
+        device = TcpDeviceEmulator(args.listen_ip, args.listen_port, **options)
+        if args.load:
+            device.on_connected = lambda: device.start_stream(None, args.frames)
+    else:
+        device = UdpDeviceEmulator(args.listen_ip, args.listen_port, args.host_ip, args.host_port,
+                                   sequenced=not args.legacy, **options)
+    device.start(stats=args.stats or args.load)
+    if args.load and args.transport == 'udp':
+        device.start_stream(None, args.frames)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        device.stop()
+
+
+if __name__ == '__main__':
+    main()
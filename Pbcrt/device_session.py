@@ -0,0 +1,132 @@
+import time
+
+from frame_pool import FrameBufferPool
+from frame_reassembly import ReassemblyWindow, REASSEMBLY_WINDOW_FRAMES, REASSEMBLY_TIMEOUT_MS
+
+# 设备应答类型（与设备端协议一致）
+DEVC_CONN_ACK = 0x0001
+DEVC_DISC_ACK = 0x0003
+
+# 设备连接状态
+DEVICE_STATE_DISCONNECTED = "未连接"
+DEVICE_STATE_CONNECTING = "连接中"
+DEVICE_STATE_CONNECTED = "已连接"
+DEVICE_STATE_RECEIVING = "接收中"
+DEVICE_STATE_TIMEOUT = "无响应"
+
+# 连接请求无应答、接收中断多久后判定设备无响应
+DEVICE_CONN_TIMEOUT_MS = 3000
+DEVICE_IDLE_TIMEOUT_MS = 5000
+
+
+def device_key(ip: str, port: int) -> str:
+    return f"{ip}:{port}"
+
+
+def parse_device_key(key: str):
+    ip, _, port = key.rpartition(":")
+    return ip, int(port)
+
+
+class DeviceStats:
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.frames = 0
+        self.expired = 0
+        self.evicted = 0
+        self.nacks = 0
+        self.acks = 0
+        self.bad_packets = 0
+        self.partial = 0
+        # 上次统计时的帧数，用于计算帧率
+        self.last_frames = 0
+        self.fps = 0.0
+
+
+class DeviceSession:
+    """
+    单个设备的接收会话：独立的重组窗口、统计信息与连接状态机。
+    control_addr 为设备控制端口 (ip, port)，重传请求发往该地址；未登记的设备使用数据源地址。
+    """
+
+    def __init__(self, key: str, control_addr: tuple, frame_pool: FrameBufferPool,
+                 window_frames: int = REASSEMBLY_WINDOW_FRAMES, frame_timeout_ms: int = REASSEMBLY_TIMEOUT_MS,
+                 registered: bool = False):
+        self.key = key
+        self.control_addr = control_addr
+        self.registered = registered
+        self.reassembly = ReassemblyWindow(frame_pool, window_frames, frame_timeout_ms)
+        self.stats = DeviceStats()
+        self.state = DEVICE_STATE_CONNECTING if registered else DEVICE_STATE_RECEIVING
+        self.state_since = time.monotonic()
+        self.last_activity = self.state_since
+        # 最近交付帧的租约（已 pin，不拷贝），用于掩盖下一帧的缺失区域（仅在残缺帧交付模式下维护）
+        self.last_lease = None
+
+    def set_state(self, state: str) -> bool:
+        """切换状态，状态发生变化时返回 True"""
+        if state == self.state:
+            return False
+        self.state = state
+        self.state_since = time.monotonic()
+        return True
+
+    def on_packet(self, size: int) -> bool:
+        self.stats.packets += 1
+        self.stats.bytes += size
+        self.last_activity = time.monotonic()
+        if self.state in (DEVICE_STATE_CONNECTED, DEVICE_STATE_TIMEOUT):
+            return self.set_state(DEVICE_STATE_RECEIVING)
+        return False
+
+    def on_ack(self, ack_type: int) -> bool:
+        self.last_activity = time.monotonic()
+        if ack_type == DEVC_CONN_ACK:
+            return self.set_state(DEVICE_STATE_CONNECTED)
+        elif ack_type == DEVC_DISC_ACK:
+            return self.set_state(DEVICE_STATE_DISCONNECTED)
+        return False
+
+    def check_timeout(self, now: float) -> bool:
+        """连接中无应答或接收中断时转入无响应状态"""
+        if self.state == DEVICE_STATE_CONNECTING and (now - self.state_since) * 1000 > DEVICE_CONN_TIMEOUT_MS:
+            return self.set_state(DEVICE_STATE_TIMEOUT)
+        if self.state == DEVICE_STATE_RECEIVING and (now - self.last_activity) * 1000 > DEVICE_IDLE_TIMEOUT_MS:
+            return self.set_state(DEVICE_STATE_CONNECTED)
+        return False
+
+    def remember_frame(self, lease):
+        """保留即将交付的帧缓冲区，替换并归还上一帧；掩盖时只拷贝缺失的区间"""
+        lease.pin()
+        if self.last_lease is not None:
+            self.last_lease.unpin()
+        self.last_lease = lease
+
+    def last_frame(self):
+        """最近交付帧的数据（bytearray），没有时返回 None"""
+        return self.last_lease.buffer if self.last_lease is not None else None
+
+    def forget_frame(self):
+        if self.last_lease is not None:
+            self.last_lease.unpin()
+            self.last_lease = None
+
+    def update_rate(self, interval_s: float):
+        self.stats.fps = (self.stats.frames - self.stats.last_frames) / interval_s if interval_s > 0 else 0.0
+        self.stats.last_frames = self.stats.frames
+
+    def summary(self) -> dict:
+        return {
+            "state": self.state,
+            "fps": self.stats.fps,
+            "frames": self.stats.frames,
+            "packets": self.stats.packets,
+            "bytes": self.stats.bytes,
+            "expired": self.stats.expired,
+            "evicted": self.stats.evicted,
+            "nacks": self.stats.nacks,
+            "partial": self.stats.partial,
+            "ambiguous": self.reassembly.ambiguous_packet_count,
+            "in_flight": len(self.reassembly.frames),
+        }
@@ -0,0 +1,79 @@
+from PySide6.QtCore import QTimer, Qt
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                               QAbstractItemView)
+
+from frame_trace import (FrameTracer, TRACE_STAGES, TRACE_QUANTILES, STAGE_REASSEMBLY, STAGE_DECODE, STAGE_DISPATCH,
+                         STAGE_QUEUE, STAGE_PREPROCESS, STAGE_INFER, STAGE_CONVERT, STAGE_RENDER, STAGE_SAVE,
+                         STAGE_QIMAGE, STAGE_DELIVER, STAGE_DISPLAY, STAGE_TOTAL, EVENT_FRAME_RECEIVED,
+                         EVENT_PARTIAL_SKIPPED)
+
+# 诊断面板刷新间隔 ms
+DIAGNOSTICS_REFRESH_MS = 1000
+
+# 阶段名称（界面显示）
+STAGE_TITLES = {
+    STAGE_REASSEMBLY: "接收重组",
+    STAGE_DECODE: "解码",
+    STAGE_DISPATCH: "分发",
+    STAGE_QUEUE: "推理排队",
+    STAGE_PREPROCESS: "预处理",
+    STAGE_INFER: "推理",
+    STAGE_CONVERT: "图像转换",
+    STAGE_RENDER: "结果绘制",
+    STAGE_SAVE: "图像保存",
+    STAGE_QIMAGE: "显示图像生成",
+    STAGE_DELIVER: "结果回传",
+    STAGE_DISPLAY: "界面更新",
+    STAGE_TOTAL: "端到端",
+}
+
+
+class DiagnosticsPanel(QWidget):
+    """各处理阶段耗时的统计窗口（最近若干帧的 p50/p95/p99），显示期间定时刷新"""
+
+    def __init__(self, tracer: FrameTracer, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.tracer = tracer
+        self.setWindowTitle("诊断：各阶段耗时")
+        self.resize(560, 420)
+        self.qLabelSummary = QLabel(self)
+        self.qTableStages = QTableWidget(len(TRACE_STAGES), 2 + len(TRACE_QUANTILES), self)
+        self.qTableStages.setHorizontalHeaderLabels(["样本数", "平均 ms"] + [f"p{q} ms" for q in TRACE_QUANTILES])
+        self.qTableStages.setVerticalHeaderLabels([STAGE_TITLES.get(stage, stage) for stage in TRACE_STAGES])
+        self.qTableStages.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.qTableStages.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        for row in range(len(TRACE_STAGES)):
+            for column in range(self.qTableStages.columnCount()):
+                item = QTableWidgetItem("-")
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.qTableStages.setItem(row, column, item)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.qLabelSummary)
+        layout.addWidget(self.qTableStages)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start(DIAGNOSTICS_REFRESH_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        stats = self.tracer.snapshot()
+        total = stats.get("total")
+        events = self.tracer.event_counts()
+        self.qLabelSummary.setText(f"已完成 {total['count'] if total else 0} 帧，统计最近 {self.tracer.window} 帧 | "
+                                   f"收到 {events.get(EVENT_FRAME_RECEIVED, 0)} 帧，"
+                                   f"残缺帧跳过推理 {events.get(EVENT_PARTIAL_SKIPPED, 0)} 帧")
+        for row, stage in enumerate(TRACE_STAGES):
+            info = stats.get(stage)
+            values = ["-"] * self.qTableStages.columnCount()
+            if info:
+                values = [str(min(info["count"], self.tracer.window)), f"{info['mean']:.1f}"] + \
+                         [f"{info[f'p{q}']:.1f}" for q in TRACE_QUANTILES]
+            for column, text in enumerate(values):
+                self.qTableStages.item(row, column).setText(text)
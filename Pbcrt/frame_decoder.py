@@ -0,0 +1,240 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PySide6.QtCore import QObject, Signal, Slot
+
+from frame_pool import FrameBufferPool
+from frame_trace import STAGE_DECODE
+from ive_image_converter import IVEImageType
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# 压缩负载类型，与 IVE 图像类型共用包头中的 img_type 字段，取值避开 IVEImageType
+PAYLOAD_TYPE_JPEG = 0x0100
+PAYLOAD_TYPE_H264 = 0x0101  # H.264 裸码流（Annex B），每包负载为一帧的 NAL 单元
+
+# 解码线程数，以及等待解码的帧上限（JPEG 为全部设备合计，H.264 为每个设备，超过时丢弃新到的帧）
+DECODE_WORKERS = 2
+DECODE_MAX_PENDING = 4
+# H.264 NAL 类型，以及判断帧类型时扫描的访问单元开头字节数（SPS/PPS/SEI 之后即为图像 NAL）
+H264_NAL_SLICE = 1
+H264_NAL_IDR = 5
+H264_HEADER_SCAN_BYTES = 4096
+# 已送入解码器但尚未输出图像的 H.264 帧最多保留数，更早的帧视为无输出并丢弃（归还信用）；
+# 需小于推流信用窗口，否则解码器缓冲的帧会占满信用
+H264_MAX_DELAY_FRAMES = 2
+# 压缩帧长度不固定，缓冲区按该粒度向上取整，避免缓冲池按每种长度各缓存一份
+COMPRESSED_BUFFER_ALIGN = 64 * 1024
+
+
+def is_compressed_type(img_type: int) -> bool:
+    return img_type in (PAYLOAD_TYPE_JPEG, PAYLOAD_TYPE_H264)
+
+
+def compressed_capacity(size: int) -> int:
+    """压缩帧缓冲区容量：不小于 size，按 COMPRESSED_BUFFER_ALIGN 取整"""
+    return (size + COMPRESSED_BUFFER_ALIGN - 1) // COMPRESSED_BUFFER_ALIGN * COMPRESSED_BUFFER_ALIGN
+
+
+def payload_type_to_string(img_type: int) -> str:
+    return {PAYLOAD_TYPE_JPEG: "JPEG", PAYLOAD_TYPE_H264: "H264"}.get(img_type, "UNKNOWN")
+
+
+def h264_frame_info(data) -> tuple:
+    """扫描 Annex B 访问单元开头的 NAL 头，返回 (是否 IDR 帧, 是否参考帧)；未找到图像 NAL 时按非 IDR 参考帧处理"""
+    head = bytes(data[:H264_HEADER_SCAN_BYTES])
+    pos = head.find(b"\x00\x00\x01")
+    while 0 <= pos < len(head) - 3:
+        header = head[pos + 3]
+        nal_type = header & 0x1F
+        if nal_type in (H264_NAL_SLICE, H264_NAL_IDR):
+            return nal_type == H264_NAL_IDR, (header >> 5) & 0x03 != 0
+        pos = head.find(b"\x00\x00\x01", pos + 3)
+    return False, True
+
+
+class H264StreamDecoder:
+    """
+    单路 H.264 码流解码器（依赖 PyAV），帧间有参考关系，同一设备的帧必须按序送入。
+    每次送入一个完整访问单元（不经码流解析器缓存），并以递增的 pts 标记，输出图像按 pts 对应到其输入帧的附带信息。
+    """
+
+    def __init__(self):
+        self.codec = av.CodecContext.create('h264', 'r')
+        self.next_pts = 0
+        self.inputs = {}  # pts -> 尚未输出图像的输入帧信息
+
+    def decode(self, data, info) -> list:
+        """返回 [(输入帧信息, BGR 图像)]，解码器缓冲参考帧时可能为空或包含之前送入的帧"""
+        packet = av.Packet(bytes(data))
+        packet.pts = self.next_pts
+        self.next_pts += 1
+        images = [(frame.pts, frame.to_ndarray(format='bgr24')) for frame in self.codec.decode(packet)]
+        self.inputs[packet.pts] = info
+        return [(self.inputs.pop(pts), image) for pts, image in images if pts in self.inputs]
+
+    def take_stale(self, max_delay: int) -> list:
+        """取出超过 max_delay 帧仍无输出的输入帧信息（从最早的开始）"""
+        stale = []
+        while len(self.inputs) > max_delay:
+            stale.append(self.inputs.pop(min(self.inputs)))
+        return stale
+
+
+class FrameDecoder(QObject):
+    """
+    压缩帧解码：位于接收端与流控之间。
+    原始 IVE 帧直接转发；JPEG 帧在线程池中并行解码，H.264 帧按设备在各自的单线程中顺序解码。
+    H.264 每个设备同样最多积压 max_pending 帧：有积压时丢弃非参考帧，积压满时丢弃后续帧直到下一个 IDR 帧，
+    保证丢帧后解码不引用缺失的帧。
+    解码结果写入 U8C3_PACKAGE（BGR）帧缓冲后以同样的 (FrameLease, w, h, img_type) 形式发出，
+    后续仍走 IVEImageTypeConvert → 推理流程。租约保留原帧的设备标识与首包时间戳。
+    因积压丢弃或解码失败的帧通过 frameDropped(设备标识) 通知流控归还信用。
+    """
+    frameReady = Signal(object, int, int, int)
+    frameDropped = Signal(object)
+
+    def __init__(self, workers: int = DECODE_WORKERS, max_pending: int = DECODE_MAX_PENDING, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        self.max_pending = max_pending
+        self.frame_pool = FrameBufferPool()
+        self.lock = threading.Lock()
+        self.pending = 0
+        # H.264：每个设备一个解码器与一个顺序执行的线程，以及积压帧数与等待 IDR 帧的设备
+        self.h264_decoders = {}
+        self.h264_executors = {}
+        self.h264_pending = {}
+        self.h264_wait_idr = set()
+        # 每个设备最近发出帧的时间戳，并行解码乱序完成时丢弃过期帧
+        self.last_timestamps = {}
+        self.decoded_count = 0
+        self.dropped_count = 0
+
+    @Slot(object, int, int, int)
+    def on_frame(self, frame, w: int, h: int, img_type: int):
+        if img_type == PAYLOAD_TYPE_JPEG:
+            with self.lock:
+                accept = self.pending < self.max_pending
+                if accept:
+                    self.pending += 1
+            if not accept:
+                self.drop(frame)
+                return
+            self.executor.submit(self.decode_jpeg, frame)
+        elif img_type == PAYLOAD_TYPE_H264:
+            if av is None:
+                self.drop(frame, "未安装 PyAV，无法解码 H.264")
+                return
+            if not self.admit_h264(frame):
+                self.drop(frame)
+                return
+            executor = self.h264_executors.get(frame.device)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="h264")
+                self.h264_executors[frame.device] = executor
+            executor.submit(self.decode_h264, frame)
+        else:
+            self.frameReady.emit(frame, w, h, img_type)
+
+    def admit_h264(self, frame) -> bool:
+        """判断 H.264 帧是否送入解码，接受时计入积压"""
+        device = frame.device
+        is_idr, is_reference = h264_frame_info(frame.view)
+        with self.lock:
+            pending = self.h264_pending.get(device, 0)
+            if pending >= self.max_pending:
+                # 积压已满：之后的帧可能引用被丢弃的帧，一直丢弃到下一个 IDR 帧
+                self.h264_wait_idr.add(device)
+                return False
+            if device in self.h264_wait_idr and not is_idr:
+                return False
+            if pending > 0 and not is_reference:
+                return False
+            self.h264_wait_idr.discard(device)
+            self.h264_pending[device] = pending + 1
+        return True
+
+    def drop(self, frame, reason: str = None):
+        """丢弃帧并通知流控；积压丢帧只计数，reason 不为空（解码出错等）时打印"""
+        if reason is not None:
+            print(f"[解码] 丢弃帧: {reason}")
+        device = frame.device
+        frame.release()
+        with self.lock:
+            self.dropped_count += 1
+        self.frameDropped.emit(device)
+
+    def decode_jpeg(self, frame):
+        try:
+            image = cv2.imdecode(np.frombuffer(frame.view, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                self.drop(frame, "JPEG 解码失败")
+                return
+            device, timestamp, trace = frame.device, frame.timestamp, frame.trace
+            frame.release()
+            self.publish(device, timestamp, trace, image)
+        except Exception as e:
+            self.drop(frame, f"JPEG 解码出错: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def decode_h264(self, frame):
+        """在设备的解码线程中调用：每个输出图像以其输入帧的时间戳与追踪发出，长时间无输出的输入帧按丢帧处理"""
+        device = frame.device
+        try:
+            decoder = self.h264_decoders.get(device)
+            if decoder is None:
+                decoder = H264StreamDecoder()
+                self.h264_decoders[device] = decoder
+            outputs = decoder.decode(frame.view, (frame.timestamp, frame.trace))
+        except Exception as e:
+            self.drop(frame, f"H.264 解码出错: {e}")
+            return
+        finally:
+            with self.lock:
+                self.h264_pending[device] -= 1
+        frame.release()
+        for (timestamp, trace), image in outputs:
+            self.publish(device, timestamp, trace, image)
+        for _ in decoder.take_stale(H264_MAX_DELAY_FRAMES):
+            with self.lock:
+                self.dropped_count += 1
+            self.frameDropped.emit(device)
+
+    def publish(self, device, timestamp: float, trace, image: np.ndarray):
+        """在解码线程中调用：拷贝到 BGR 帧缓冲并发出"""
+        height, width = image.shape[:2]
+        with self.lock:
+            if timestamp < self.last_timestamps.get(device, 0.0):
+                self.dropped_count += 1
+                stale = True
+            else:
+                self.last_timestamps[device] = timestamp
+                self.decoded_count += 1
+                stale = False
+        if stale:
+            self.frameDropped.emit(device)
+            return
+        lease = self.frame_pool.acquire(width, height, IVEImageType.U8C3_PACKAGE)
+        np.frombuffer(lease.data, dtype=np.uint8).reshape(height, width, 3)[:] = image
+        lease.device = device
+        lease.timestamp = timestamp
+        lease.trace = trace
+        trace.mark(STAGE_DECODE)
+        self.frameReady.emit(lease, width, height, IVEImageType.U8C3_PACKAGE)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for executor in self.h264_executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.h264_executors.clear()
+        self.h264_decoders.clear()
+        self.h264_wait_idr.clear()
+        self.last_timestamps.clear()
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from PySide6.QtCore import QMutex, QMutexLocker
+
+from ive_image_converter import IVEImageTypeConvert
+from frame_trace import FrameTrace
+
+# 每种帧尺寸最多缓存的空闲缓冲区数量
+FRAME_POOL_MAX_FREE = 4
+
+# 保留（pin）状态与释放状态的切换锁，下游线程 release 与接收线程 unpin 可能同时发生
+_pin_lock = threading.Lock()
+
+
+class FrameLease:
+    """
+    帧缓冲租约：持有缓冲池中的一块 bytearray。
+    接收线程通过 data 写入，下游通过只读的 view 读取，使用完毕后必须调用 release() 归还。
+    接收端可用 pin() 保留缓冲区内容（下游 release 后不归还），不再需要时调用 unpin()。
+    """
+    __slots__ = ("pool", "buffer", "data", "view", "size", "timestamp", "device", "loss_ratio", "trace",
+                 "_released", "_pinned")
+
+    def __init__(self, pool, buffer: bytearray):
+        self.pool = pool
+        # 租约创建时刻（即该帧首包到达时刻），用于统计端到端延迟
+        self.timestamp = time.monotonic()
+        # 帧来源设备标识，由接收端填写
+        self.device = None
+        # 丢包比例：完整帧为 0，超时交付的残缺帧为缺失包数/总包数（缺失部分已做掩盖）
+        self.loss_ratio = 0.0
+        # 各处理阶段计时，解码后的帧沿用原压缩帧的追踪
+        self.trace = FrameTrace()
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.data = memoryview(buffer)
+        self.view = self.data.toreadonly()
+        self._released = False
+        self._pinned = False
+
+    def __len__(self):
+        return self.size
+
+    def truncate(self, size: int):
+        """压缩帧的实际长度小于缓冲区容量，下游只读取前 size 字节"""
+        self.size = size
+        self.view = self.data[:size].toreadonly()
+
+    def release(self):
+        """归还缓冲区，重复调用无副作用；被保留时推迟到 unpin() 归还"""
+        with _pin_lock:
+            if self._released:
+                return
+            self._released = True
+            if self._pinned:
+                return
+        self._put_back()
+
+    def pin(self):
+        """接收端保留缓冲区内容，须在交给下游之前调用"""
+        self._pinned = True
+
+    def unpin(self):
+        with _pin_lock:
+            if not self._pinned:
+                return
+            self._pinned = False
+            if not self._released:
+                return
+        self._put_back()
+
+    def _put_back(self):
+        # 下游可能仍持有基于 view 的 ndarray，这里只断开引用而不释放 memoryview
+        self.pool.put_back(self.buffer)
+        self.buffer = None
+        self.data = None
+        self.view = None
+
+
+class FrameBufferPool:
+    """按帧字节数复用的帧缓冲池，稳态下每帧不再分配新的 bytearray"""
+
+    def __init__(self, max_free: int = FRAME_POOL_MAX_FREE):
+        self.max_free = max_free
+        self.free_map = {}
+        self.lock = QMutex()
+        self.alloc_count = 0
+
+    def preallocate(self, width: int, height: int, img_type: int, count: int = 2):
+        """按 IVE 类型预先分配指定数量的帧缓冲"""
+        size = IVEImageTypeConvert.frame_size(width, height, img_type)
+        with QMutexLocker(self.lock):
+            free_list = self.free_map.setdefault(size, [])
+            while len(free_list) < min(count, self.max_free):
+                free_list.append(bytearray(size))
+                self.alloc_count += 1
+
+    def acquire(self, width: int, height: int, img_type: int) -> FrameLease:
+        return self.acquire_size(IVEImageTypeConvert.frame_size(width, height, img_type))
+
+    def acquire_size(self, size: int) -> FrameLease:
+        """按字节数获取缓冲区，用于长度不由图像尺寸决定的压缩帧"""
+        with QMutexLocker(self.lock):
+            free_list = self.free_map.get(size)
+            if free_list:
+                buffer = free_list.pop()
+            else:
+                buffer = bytearray(size)
+                self.alloc_count += 1
+        return FrameLease(self, buffer)
+
+    def put_back(self, buffer: bytearray):
+        with QMutexLocker(self.lock):
+            free_list = self.free_map.setdefault(len(buffer), [])
+            if len(free_list) < self.max_free:
+                free_list.append(buffer)
+
+    def clear(self):
+        with QMutexLocker(self.lock):
+            self.free_map.clear()
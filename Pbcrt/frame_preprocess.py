@@ -0,0 +1,228 @@
+import cv2
+import numpy as np
+
+from ive_image_converter import IVEImageType, IVEImageTypeConvert, IVEFrameConverter, YUV_CHROMA_VU_ORDER
+
+# 模型输入：长边缩放到 MODEL_INPUT_SIZE，短边按 MODEL_STRIDE 取整后居中填充（与 ultralytics LetterBox 一致）
+MODEL_INPUT_SIZE = 640
+MODEL_STRIDE = 32
+LETTERBOX_PAD_VALUE = 114
+
+
+class PreparedFrame:
+    """
+    预处理结果：模型输入张量（1x3xHxW，RGB，float32，0~1）及 letterbox 几何参数。
+    原分辨率 BGR 图像只在首次访问 bgr 时才由原始数据转换得到，
+    因此必须在原始帧缓冲归还前访问；张量与 BGR 均为复用缓冲，下一帧预处理时会被覆盖。
+    """
+
+    def __init__(self, data, width: int, height: int, img_type: int, tensor: np.ndarray,
+                 ratio: float, pad_left: int, pad_top: int, resized_w: int, resized_h: int,
+                 converter: IVEFrameConverter):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.img_type = img_type
+        self.tensor = tensor
+        self.ratio = ratio
+        self.pad_left = pad_left
+        self.pad_top = pad_top
+        self.resized_w = resized_w
+        self.resized_h = resized_h
+        self.converter = converter
+        self._bgr = None
+
+    @property
+    def bgr(self) -> np.ndarray:
+        if self._bgr is None:
+            self._bgr = self.converter.convert(self.data, self.width, self.height, self.img_type)
+        return self._bgr
+
+    def scale_boxes(self, boxes: np.ndarray) -> np.ndarray:
+        """将张量坐标系下的 (x1, y1, x2, y2, ...) 映射回原图坐标，返回新数组（推理结果可能被缓存复用，不能原地修改）"""
+        boxes = boxes.astype(np.float32, copy=True)
+        boxes[:, [0, 2]] -= self.pad_left
+        boxes[:, [1, 3]] -= self.pad_top
+        boxes[:, :4] /= self.ratio
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, self.width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, self.height)
+        return boxes
+
+    def scale_mask_region(self, mask: np.ndarray, box) -> tuple:
+        """
+        将张量尺寸的掩码中对应 box（原图坐标）的部分缩放回原图，
+        返回 (x0, y0, bool 数组)，只处理框内区域，不生成整幅原图大小的掩码。
+        """
+        x0 = min(max(int(np.floor(box[0])), 0), self.width)
+        y0 = min(max(int(np.floor(box[1])), 0), self.height)
+        x1 = min(max(int(np.ceil(box[2])), x0), self.width)
+        y1 = min(max(int(np.ceil(box[3])), y0), self.height)
+        if x1 == x0 or y1 == y0:
+            return x0, y0, np.zeros((y1 - y0, x1 - x0), dtype=bool)
+        # 原图区域在张量中的对应范围，至少保留一个像素
+        tx0 = int(x0 * self.ratio) + self.pad_left
+        ty0 = int(y0 * self.ratio) + self.pad_top
+        tx1 = max(int(np.ceil(x1 * self.ratio)) + self.pad_left, tx0 + 1)
+        ty1 = max(int(np.ceil(y1 * self.ratio)) + self.pad_top, ty0 + 1)
+        crop = mask[ty0:ty1, tx0:tx1]
+        return x0, y0, cv2.resize(crop, (x1 - x0, y1 - y0), interpolation=cv2.INTER_LINEAR) > 0.5
+
+
+class FramePreprocessor:
+    """
+    原始 IVE 数据 → 模型输入张量的融合预处理：
+    YUV 类型先在各平面上直接缩放到 letterbox 尺寸，再在小图上一次完成 YUV → RGB，
+    写入复用的 letterbox 画布后归一化为 CHW 张量，全程不生成原分辨率的 BGR/RGB 图像。
+    画布、张量及中间平面按 (类型, 宽, 高) 缓存，稳定出图时不分配内存。
+    """
+
+    def __init__(self, converter: IVEFrameConverter = None, input_size: int = MODEL_INPUT_SIZE,
+                 stride: int = MODEL_STRIDE, square: bool = False):
+        self.converter = converter if converter is not None else IVEFrameConverter()
+        self.input_size = input_size
+        self.stride = stride
+        # 静态输入尺寸的导出模型（ONNX/OpenVINO）需要填充为 input_size x input_size
+        self.square = square
+        self.buffers = {}
+        # 批量张量按 (张量高, 张量宽) 缓存，容量不足时扩大
+        self.batch_buffers = {}
+
+    def letterbox_geometry(self, width: int, height: int):
+        """返回 (缩放比例, 缩放后宽, 缩放后高, 左填充, 上填充, 张量宽, 张量高)"""
+        ratio = min(self.input_size / width, self.input_size / height)
+        # 取偶数，保证 420 色度平面尺寸为整数
+        resized_w = max(2, int(round(width * ratio)) // 2 * 2)
+        resized_h = max(2, int(round(height * ratio)) // 2 * 2)
+        if self.square:
+            tensor_w = tensor_h = self.input_size
+        else:
+            tensor_w = (resized_w + self.stride - 1) // self.stride * self.stride
+            tensor_h = (resized_h + self.stride - 1) // self.stride * self.stride
+        pad_left = (tensor_w - resized_w) // 2
+        pad_top = (tensor_h - resized_h) // 2
+        return ratio, resized_w, resized_h, pad_left, pad_top, tensor_w, tensor_h
+
+    def get_buffers(self, width: int, height: int, img_type: int):
+        key = (img_type, width, height)
+        buffers = self.buffers.get(key)
+        if buffers is None:
+            geometry = self.letterbox_geometry(width, height)
+            _, resized_w, resized_h, pad_left, pad_top, tensor_w, tensor_h = geometry
+            canvas = np.full((tensor_h, tensor_w, 3), LETTERBOX_PAD_VALUE, dtype=np.uint8)
+            tensor = np.empty((1, 3, tensor_h, tensor_w), dtype=np.float32)
+            # 缩放后的小图：YUV 类型为 I420/NV12 排布，U8C3_PLANAR 为三个平面，其余为 3 通道或灰度
+            if img_type in (IVEImageType.YUV420SP, IVEImageType.YUV420P,
+                            IVEImageType.YUV422SP, IVEImageType.YUV422P):
+                small = np.empty((resized_h * 3 // 2, resized_w), dtype=np.uint8)
+            elif img_type in (IVEImageType.U8C1, IVEImageType.S8C1):
+                small = np.empty((resized_h, resized_w), dtype=np.uint8)
+            elif img_type == IVEImageType.U8C3_PLANAR:
+                small = np.empty((3, resized_h, resized_w), dtype=np.uint8)
+            else:
+                small = np.empty((resized_h, resized_w, 3), dtype=np.uint8)
+            buffers = (geometry, canvas, tensor, small)
+            self.buffers[key] = buffers
+        return buffers
+
+    def prepare(self, data, width: int, height: int, img_type: int, out: np.ndarray = None) -> PreparedFrame:
+        """out 为 (1, 3, 张量高, 张量宽) 的输出张量（如批量张量的一段），缺省时使用按类型与尺寸缓存的张量"""
+        geometry, canvas, tensor, small = self.get_buffers(width, height, img_type)
+        ratio, resized_w, resized_h, pad_left, pad_top, _, _ = geometry
+        if out is not None:
+            tensor = out
+        region = canvas[pad_top:pad_top + resized_h, pad_left:pad_left + resized_w]
+        self.resize_to_rgb(data, width, height, img_type, resized_w, resized_h, small, region)
+        # HWC uint8 → CHW float32 归一化，一次遍历写入复用张量
+        np.multiply(canvas.transpose(2, 0, 1), np.float32(1.0 / 255.0), out=tensor[0])
+        return PreparedFrame(data, width, height, img_type, tensor, ratio, pad_left, pad_top,
+                             resized_w, resized_h, self.converter)
+
+    def prepare_batch(self, items: list) -> list:
+        """
+        批量预处理：items 为 [(data, 宽, 高, 类型), ...]，按张量尺寸分组后写入各组的批量张量。
+        返回 [(批量张量 Nx3xHxW, [PreparedFrame, ...], [items 中的下标, ...]), ...]。
+        同组帧的 BGR 共用转换缓冲，需逐帧用完 bgr 后再访问下一帧。
+        """
+        groups = {}
+        for index, (_, width, height, _) in enumerate(items):
+            _, _, _, _, _, tensor_w, tensor_h = self.letterbox_geometry(width, height)
+            groups.setdefault((tensor_h, tensor_w), []).append(index)
+        batches = []
+        for (tensor_h, tensor_w), indices in groups.items():
+            buffer = self.batch_buffers.get((tensor_h, tensor_w))
+            if buffer is None or buffer.shape[0] < len(indices):
+                buffer = np.empty((len(indices), 3, tensor_h, tensor_w), dtype=np.float32)
+                self.batch_buffers[(tensor_h, tensor_w)] = buffer
+            batch = buffer[:len(indices)]
+            frames = [self.prepare(*items[index], out=batch[i:i + 1]) for i, index in enumerate(indices)]
+            batches.append((batch, frames, indices))
+        return batches
+
+    def prepare_image(self, bgr: np.ndarray) -> PreparedFrame:
+        """已有 BGR 图像（如本地图片）的预处理"""
+        height, width = bgr.shape[:2]
+        frame = self.prepare(np.ascontiguousarray(bgr), width, height, IVEImageType.U8C3_PACKAGE)
+        frame._bgr = bgr
+        return frame
+
+    def resize_to_rgb(self, data, width: int, height: int, img_type: int,
+                      resized_w: int, resized_h: int, small: np.ndarray, region: np.ndarray):
+        """按类型缩放到 (resized_w, resized_h) 并以 RGB 写入画布的有效区域 region"""
+        size = (resized_w, resized_h)
+        chroma_size = (resized_w // 2, resized_h // 2)
+        array = np.frombuffer(data, dtype=np.uint8)
+        pixels = width * height
+        expected = IVEImageTypeConvert.frame_size(width, height, img_type)
+        if array.size < expected:
+            raise ValueError(f"{IVEImageTypeConvert.ive_type_to_string(img_type)} 数据不足")
+
+        if img_type in (IVEImageType.YUV420SP, IVEImageType.YUV422SP):
+            # 半平面：Y 与交错色度分别缩放，拼成小尺寸 NV12/NV21
+            chroma_h = height // 2 if img_type == IVEImageType.YUV420SP else height
+            cv2.resize(array[:pixels].reshape((height, width)), size,
+                       dst=small[:resized_h], interpolation=cv2.INTER_LINEAR)
+            uv = array[pixels:expected].reshape((chroma_h, width // 2, 2))
+            cv2.resize(uv, chroma_size, dst=small[resized_h:].reshape((resized_h // 2, resized_w // 2, 2)),
+                       interpolation=cv2.INTER_LINEAR)
+            code = cv2.COLOR_YUV2RGB_NV21 if YUV_CHROMA_VU_ORDER else cv2.COLOR_YUV2RGB_NV12
+            cv2.cvtColor(small, code, dst=region)
+
+        elif img_type in (IVEImageType.YUV420P, IVEImageType.YUV422P):
+            # 平面：三个平面分别缩放，拼成小尺寸 I420/YV12
+            chroma_h = height // 2 if img_type == IVEImageType.YUV420P else height
+            chroma_pixels = chroma_h * (width // 2)
+            cv2.resize(array[:pixels].reshape((height, width)), size,
+                       dst=small[:resized_h], interpolation=cv2.INTER_LINEAR)
+            small_chroma = small[resized_h:].reshape((2, resized_h // 2, resized_w // 2))
+            for i in range(2):
+                plane = array[pixels + i * chroma_pixels:pixels + (i + 1) * chroma_pixels]
+                cv2.resize(plane.reshape((chroma_h, width // 2)), chroma_size,
+                           dst=small_chroma[i], interpolation=cv2.INTER_LINEAR)
+            code = cv2.COLOR_YUV2RGB_YV12 if YUV_CHROMA_VU_ORDER else cv2.COLOR_YUV2RGB_I420
+            cv2.cvtColor(small, code, dst=region)
+
+        elif img_type in (IVEImageType.U8C1, IVEImageType.S8C1):
+            cv2.resize(array[:pixels].reshape((height, width)), size, dst=small, interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(small, cv2.COLOR_GRAY2RGB, dst=region)
+
+        elif img_type == IVEImageType.U8C3_PACKAGE:
+            cv2.resize(array[:expected].reshape((height, width, 3)), size, dst=small,
+                       interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=region)
+
+        elif img_type == IVEImageType.U8C3_PLANAR:
+            # 平面排布依次为 R、G、B
+            planes = array[:expected].reshape((3, height, width))
+            for i in range(3):
+                cv2.resize(planes[i], size, dst=small[i], interpolation=cv2.INTER_LINEAR)
+            cv2.merge((small[0], small[1], small[2]), region)
+
+        else:
+            # 其他类型没有可直接缩放的 8 位平面，先转换为原分辨率 BGR
+            bgr = self.converter.convert(data, width, height, img_type)
+            cv2.resize(bgr, size, dst=small, interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=region)
+
+    def clear(self):
+        self.buffers.clear()
+        self.batch_buffers.clear()
@@ -0,0 +1,260 @@
+import time
+from collections import OrderedDict, deque
+
+from frame_pool import FrameBufferPool, FrameLease
+from frame_decoder import is_compressed_type, compressed_capacity
+
+PACK_DATA_SIZE = 1024
+
+# 默认同时重组的帧数与单帧超时时间
+REASSEMBLY_WINDOW_FRAMES = 4
+REASSEMBLY_TIMEOUT_MS = 3000
+# 残缺帧掩盖时，没有上一帧可参考的缺失区域填充值（灰色）
+CONCEAL_FILL_VALUE = 0x80
+
+
+class ImageBuffer:
+    def __init__(self, lease: FrameLease, frame_id=None, w=0, h=0, img_type=0, packet_count=0):
+        self.lease = lease
+        self.data = lease.data
+        self.frame_id = frame_id
+        self.width = w
+        self.height = h
+        self.type = img_type
+        self.packet_count = packet_count
+        # 已接收包位图，每个 bit 对应一个包序号
+        self.received_bits = bytearray((packet_count + 7) >> 3)
+        self.received_count = 0
+        # 已写入数据的末尾位置，压缩帧据此确定实际长度
+        self.payload_end = 0
+        self.last_update = time.monotonic()
+        self.opened = self.last_update
+        # 选择性重传状态
+        self.nack_count = 0
+        self.last_nack = 0.0
+
+    def has_packet(self, index: int) -> bool:
+        return bool(self.received_bits[index >> 3] & (1 << (index & 7)))
+
+    def mark_packet(self, index: int):
+        self.received_bits[index >> 3] |= 1 << (index & 7)
+        self.received_count += 1
+
+    def is_complete(self) -> bool:
+        return self.received_count == self.packet_count
+
+    def missing_packets(self) -> list:
+        return [i for i in range(self.packet_count) if not self.has_packet(i)]
+
+    def loss_ratio(self) -> float:
+        return 1.0 - self.received_count / self.packet_count if self.packet_count else 0.0
+
+    def conceal(self, previous=None):
+        """
+        掩盖缺失的包：从同一设备上一帧的相同字节区间（即相同行）拷贝，
+        没有尺寸一致的上一帧时填充灰色。连续缺失的包合并为一次拷贝。
+        """
+        if previous is not None and len(previous) != len(self.data):
+            previous = None
+        size = len(self.data)
+        index = 0
+        while index < self.packet_count:
+            if self.has_packet(index):
+                index += 1
+                continue
+            start = index
+            while index < self.packet_count and not self.has_packet(index):
+                index += 1
+            begin = min(start * PACK_DATA_SIZE, size)
+            end = min(index * PACK_DATA_SIZE, size)
+            if previous is not None:
+                self.data[begin:end] = previous[begin:end]
+            else:
+                self.data[begin:end] = bytes([CONCEAL_FILL_VALUE]) * (end - begin)
+
+    def missing_bitmap(self):
+        """
+        返回 (base_index, bitmap)：bitmap 第 i 位为 1 表示包 base_index + i 缺失。
+        base_index 按 8 对齐，只覆盖首个到最后一个缺失包所在的字节。
+        """
+        bits = self.received_bits
+        lo = 0
+        while lo < len(bits) and bits[lo] == 0xFF:
+            lo += 1
+        if lo == len(bits):
+            return 0, b""
+        hi = len(bits)
+        tail_bits = self.packet_count & 7
+        while hi > lo:
+            last_full = 0xFF if (hi < len(bits) or tail_bits == 0) else (1 << tail_bits) - 1
+            if bits[hi - 1] != last_full:
+                break
+            hi -= 1
+        bitmap = bytearray(b ^ 0xFF for b in bits[lo:hi])
+        if hi == len(bits) and tail_bits:
+            bitmap[-1] &= (1 << tail_bits) - 1
+        return lo << 3, bytes(bitmap)
+
+    def release(self):
+        """未完成的帧丢弃时归还缓冲区"""
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
+            self.data = None
+
+
+class ReassemblyWindow:
+    """
+    多帧并行重组窗口。
+    同时保留最多 max_frames 个未完成帧，容忍帧间乱序；窗口满时淘汰最早打开的帧，超时帧由 expire() 清理。
+    被淘汰的帧记入 dropped，由调用方通过 take_dropped() 取出并通知流控（每帧都占用一个推流信用）。
+    帧以 frame_id 区分：带序号的数据包直接使用设备帧序号，旧协议数据包按几何参数加代数生成。
+    乱序容忍只适用于带序号的数据包，旧协议同几何参数同时只重组一帧。
+    """
+
+    def __init__(self, frame_pool: FrameBufferPool, max_frames: int = REASSEMBLY_WINDOW_FRAMES,
+                 timeout_ms: int = REASSEMBLY_TIMEOUT_MS):
+        self.frame_pool = frame_pool
+        self.max_frames = max(1, max_frames)
+        self.timeout_ms = timeout_ms
+        self.frames = OrderedDict()
+        # 最近已完成/已淘汰的帧，迟到或重复的包不会重新打开这些帧
+        self.closed_ids = deque(maxlen=self.max_frames * 4)
+        self.closed_set = set()
+        # 旧协议帧的 (代数, 归属不明的包序号)，key 为 (w, h, img_type, count)
+        self.legacy_generation = {}
+        # 已丢弃（缓冲已归还）但尚未被调用方取走的帧
+        self.dropped = []
+        self.completed_count = 0
+        self.evicted_count = 0
+        self.late_packet_count = 0
+        self.ambiguous_packet_count = 0
+        self.partial_count = 0
+
+    def legacy_frame_id(self, index: int, count: int, w: int, h: int, img_type: int):
+        """
+        旧协议没有帧序号：同几何参数的帧中某个包序号重复出现时视为新的一帧，返回 frame_id。
+        同几何参数同时只重组一帧：新一帧开始时上一帧若未收齐即丢弃（记入 dropped）。
+        上一帧缺失的包之后仍可能迟到，无法判断属于哪一帧，因此新一帧中这些序号的包一律丢弃（返回 None），
+        该帧只能经残缺帧掩盖交付或超时，不会混入上一帧的数据。
+        """
+        key = (w, h, img_type, count)
+        generation, ambiguous = self.legacy_generation.get(key, (0, frozenset()))
+        frame_id = key + (generation,)
+        buf = self.frames.get(frame_id)
+        if (buf is not None and buf.has_packet(index)) or frame_id in self.closed_set:
+            ambiguous = frozenset()
+            if buf is not None:
+                ambiguous = frozenset(buf.missing_packets())
+                del self.frames[frame_id]
+                self._drop(frame_id, buf)
+            generation += 1
+            self.legacy_generation[key] = (generation, ambiguous)
+            frame_id = key + (generation,)
+        if index in ambiguous:
+            self.ambiguous_packet_count += 1
+            return None
+        return frame_id
+
+    def _close(self, frame_id):
+        if len(self.closed_ids) == self.closed_ids.maxlen:
+            self.closed_set.discard(self.closed_ids[0])
+        self.closed_ids.append(frame_id)
+        self.closed_set.add(frame_id)
+
+    def take_dropped(self) -> list:
+        """取出并清空已丢弃帧列表（ImageBuffer，缓冲区已归还）"""
+        dropped = self.dropped
+        self.dropped = []
+        return dropped
+
+    def _drop(self, frame_id, buf: ImageBuffer):
+        """丢弃已移出窗口的未完成帧，只计入 evicted_count（随设备统计定期输出），不逐帧打印"""
+        buf.release()
+        self._close(frame_id)
+        self.evicted_count += 1
+        self.dropped.append(buf)
+
+    def _open(self, frame_id, count: int, w: int, h: int, img_type: int) -> ImageBuffer:
+        while len(self.frames) >= self.max_frames:
+            self._drop(*self.frames.popitem(last=False))
+        if is_compressed_type(img_type):
+            lease = self.frame_pool.acquire_size(compressed_capacity(count * PACK_DATA_SIZE))
+        else:
+            lease = self.frame_pool.acquire(w, h, img_type)
+        buf = ImageBuffer(lease, frame_id, w, h, img_type, count)
+        self.frames[frame_id] = buf
+        return buf
+
+    def add_packet(self, frame_id, index: int, count: int, w: int, h: int, img_type: int,
+                   payload, valid_len: int):
+        """
+        写入一个数据包，帧完整时返回对应 ImageBuffer（已移出窗口，租约归调用方），否则返回 None。
+        payload 为数据包负载区（memoryview/bytes），只拷贝前 valid_len 字节。
+        """
+        if frame_id in self.closed_set:
+            self.late_packet_count += 1
+            return None
+        buf = self.frames.get(frame_id)
+        if buf is None:
+            if count == 0:
+                return None
+            buf = self._open(frame_id, count, w, h, img_type)
+
+        offset = index * PACK_DATA_SIZE
+        if index < buf.packet_count and valid_len <= PACK_DATA_SIZE and offset + valid_len <= len(buf.data):
+            if not buf.has_packet(index):
+                buf.data[offset:offset + valid_len] = payload[:valid_len]
+                buf.mark_packet(index)
+                buf.payload_end = max(buf.payload_end, offset + valid_len)
+                buf.last_update = time.monotonic()
+
+        if buf.is_complete():
+            del self.frames[frame_id]
+            self._close(frame_id)
+            self.completed_count += 1
+            if is_compressed_type(buf.type):
+                buf.lease.truncate(buf.payload_end)
+            return buf
+        return None
+
+    def expire(self, now: float = None) -> list:
+        """移除超时未完成的帧，返回被移除的 ImageBuffer 列表（缓冲区已归还）"""
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        for frame_id in list(self.frames.keys()):
+            buf = self.frames[frame_id]
+            if (now - buf.last_update) * 1000 > self.timeout_ms:
+                del self.frames[frame_id]
+                self._close(frame_id)
+                buf.release()
+                expired.append(buf)
+        return expired
+
+    def take_partial(self, deadline_ms: int, max_loss: float, now: float = None) -> list:
+        """
+        取出打开时间超过 deadline_ms 且丢包比例不超过 max_loss 的未完成帧（已移出窗口，租约归调用方），
+        丢包过多的帧及无法掩盖的压缩帧仍留在窗口中等待重传或超时。
+        """
+        if now is None:
+            now = time.monotonic()
+        partial = []
+        for frame_id in list(self.frames.keys()):
+            buf = self.frames[frame_id]
+            if (now - buf.opened) * 1000 < deadline_ms or buf.loss_ratio() > max_loss or is_compressed_type(buf.type):
+                continue
+            del self.frames[frame_id]
+            self._close(frame_id)
+            self.partial_count += 1
+            partial.append(buf)
+        return partial
+
+    def clear(self):
+        for buf in self.frames.values():
+            buf.release()
+        self.frames.clear()
+        self.dropped.clear()
+        self.closed_ids.clear()
+        self.closed_set.clear()
+        self.legacy_generation.clear()
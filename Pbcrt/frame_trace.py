@@ -0,0 +1,175 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# 帧处理阶段，按流水线顺序；每个阶段记录 (开始, 结束) 时刻（time.perf_counter），首包到达为整帧起点
+STAGE_REASSEMBLY = "reassembly"  # 首包到达 → 收齐（UDP/TCP 重组）
+STAGE_DECODE = "decode"  # JPEG/H.264 解码（含解码排队）
+STAGE_DISPATCH = "dispatch"  # 解码/流控 → 界面线程交给推理线程池
+STAGE_QUEUE = "queue"  # 推理队列等待（含凑批）
+STAGE_PREPROCESS = "preprocess"  # 原始数据 → 模型输入张量
+STAGE_INFER = "infer"  # 批量推理（含结果缓存查找）
+STAGE_CONVERT = "convert"  # 原始数据 → 原分辨率 BGR（IVE 转换）
+STAGE_RENDER = "render"  # 掩码、边框与标签绘制（分块推理时含推理）
+STAGE_SAVE = "save"  # 原图与结果图 cv2.imwrite
+STAGE_QIMAGE = "qimage"  # 生成界面显示用的 QImage
+STAGE_DELIVER = "deliver"  # 结果信号排队到界面线程
+STAGE_DISPLAY = "display"  # 表格与图像更新
+STAGE_TOTAL = "total"  # 首包到达 → 显示完成
+TRACE_STAGES = (STAGE_REASSEMBLY, STAGE_DECODE, STAGE_DISPATCH, STAGE_QUEUE, STAGE_PREPROCESS, STAGE_INFER,
+                STAGE_CONVERT, STAGE_RENDER, STAGE_SAVE, STAGE_QIMAGE, STAGE_DELIVER, STAGE_DISPLAY, STAGE_TOTAL)
+
+# 逐帧事件计数（不逐帧打印日志）
+EVENT_FRAME_RECEIVED = "frame_received"  # 帧到达界面线程
+EVENT_PARTIAL_SKIPPED = "partial_skipped"  # 残缺帧丢包过多，跳过推理
+
+# 每个阶段保留最近 TRACE_WINDOW 帧的耗时用于分位数统计
+TRACE_WINDOW = 1000
+TRACE_QUANTILES = (50, 95, 99)
+TRACE_METRICS_HOST = "127.0.0.1"
+TRACE_METRIC_NAME = "pbcrt_frame_stage_latency_ms"
+TRACE_EVENT_METRIC_NAME = "pbcrt_frame_events_total"
+
+_trace_ids = itertools.count(1)
+
+
+class FrameTrace:
+    """
+    单帧的阶段计时，随帧缓冲租约（FrameLease）与推理结果在线程间传递，同一时刻只由持有该帧的线程写入。
+    每次 mark 只记录一个时间戳，开销可忽略。
+    """
+    __slots__ = ("trace_id", "start", "last", "spans")
+
+    def __init__(self):
+        self.trace_id = next(_trace_ids)
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.spans = []  # [(阶段, 开始, 结束)]
+
+    def mark(self, stage: str, start: float = None):
+        """记录阶段结束；start 为空时以上一阶段结束时刻为开始（即包含其间的等待）"""
+        now = time.perf_counter()
+        self.spans.append((stage, self.last if start is None else start, now))
+        self.last = now
+
+    def durations(self) -> list:
+        """[(阶段, ms)]，末尾为整帧耗时"""
+        items = [(stage, (end - start) * 1000) for stage, start, end in self.spans]
+        items.append((STAGE_TOTAL, (self.last - self.start) * 1000))
+        return items
+
+
+class FrameTracer:
+    """
+    汇总完成帧的阶段耗时：每个阶段保留滚动窗口内的样本计算 p50/p95/p99，另累计总次数与总耗时。
+    可选将每帧耗时以 JSON 行写入文件。record 在界面线程调用，snapshot 也可由指标服务线程调用。
+    """
+
+    def __init__(self, window: int = TRACE_WINDOW, jsonl_path: str = None):
+        self.window = window
+        self.samples = {stage: deque(maxlen=window) for stage in TRACE_STAGES}
+        self.counts = dict.fromkeys(TRACE_STAGES, 0)
+        self.sums = dict.fromkeys(TRACE_STAGES, 0.0)
+        self.events = {}
+        self.lock = threading.Lock()
+        self.jsonl = None
+        if jsonl_path:
+            try:
+                os.makedirs(os.path.dirname(jsonl_path), exist_ok=True)
+                self.jsonl = open(jsonl_path, "a", encoding="utf-8")
+            except OSError as e:
+                print(f"[追踪] 无法打开追踪记录文件: {e}")
+
+    def record(self, trace: FrameTrace, device=None):
+        durations = trace.durations()
+        with self.lock:
+            for stage, ms in durations:
+                samples = self.samples.get(stage)
+                if samples is None:
+                    continue
+                samples.append(ms)
+                self.counts[stage] += 1
+                self.sums[stage] += ms
+        if self.jsonl is not None:
+            record = {"id": trace.trace_id, "device": str(device) if device is not None else None,
+                      "stages": {stage: round(ms, 3) for stage, ms in durations}}
+            self.jsonl.write(json.dumps(record) + "\n")
+
+    def count(self, event: str, n: int = 1):
+        """累计逐帧事件次数"""
+        with self.lock:
+            self.events[event] = self.events.get(event, 0) + n
+
+    def event_counts(self) -> dict:
+        with self.lock:
+            return dict(self.events)
+
+    def snapshot(self) -> dict:
+        """{阶段: {"count", "mean", "p50", "p95", "p99"}}，窗口内无样本的阶段不列出"""
+        with self.lock:
+            windows = {stage: np.fromiter(samples, dtype=np.float64, count=len(samples))
+                       for stage, samples in self.samples.items() if samples}
+            counts = dict(self.counts)
+            sums = dict(self.sums)
+        stats = {}
+        for stage, values in windows.items():
+            quantiles = np.percentile(values, TRACE_QUANTILES)
+            stats[stage] = {"count": counts[stage], "sum": sums[stage], "mean": float(values.mean()),
+                            **{f"p{q}": float(v) for q, v in zip(TRACE_QUANTILES, quantiles)}}
+        return stats
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式（summary）：分位数为最近窗口，_sum/_count 为启动以来累计"""
+        lines = [f"# HELP {TRACE_METRIC_NAME} Frame pipeline stage latency in milliseconds "
+                 f"(quantiles over the last {self.window} frames)",
+                 f"# TYPE {TRACE_METRIC_NAME} summary"]
+        for stage, info in self.snapshot().items():
+            for q in TRACE_QUANTILES:
+                lines.append(f'{TRACE_METRIC_NAME}{{stage="{stage}",quantile="{q / 100:g}"}} {info[f"p{q}"]:.3f}')
+            lines.append(f'{TRACE_METRIC_NAME}_sum{{stage="{stage}"}} {info["sum"]:.3f}')
+            lines.append(f'{TRACE_METRIC_NAME}_count{{stage="{stage}"}} {info["count"]}')
+        lines.append(f"# HELP {TRACE_EVENT_METRIC_NAME} Per-frame event counts")
+        lines.append(f"# TYPE {TRACE_EVENT_METRIC_NAME} counter")
+        for event, count in sorted(self.event_counts().items()):
+            lines.append(f'{TRACE_EVENT_METRIC_NAME}{{event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self.jsonl is not None:
+            self.jsonl.close()
+            self.jsonl = None
+
+
+class MetricsServer:
+    """本机 HTTP 指标端点：GET /metrics 返回 FrameTracer 的 Prometheus 文本，在后台线程中运行"""
+
+    def __init__(self, tracer: FrameTracer, port: int, host: str = TRACE_METRICS_HOST):
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+        print(f"[追踪] 指标端点: http://{host}:{self.server.server_address[1]}/metrics")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,310 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from frame_preprocess import MODEL_INPUT_SIZE
+from model_quantization import (split_images, quantize_onnx_int8, compare_models, print_report, write_report,
+                                INT8_MANIFEST_SUFFIX, read_manifest, make_manifest, write_manifest, manifest_images)
+
+# torch 与 ultralytics 导入耗时数秒，在推理线程加载模型时才导入（见各 load），界面线程导入本模块只取得后端常量
+
+# 推理后端
+BACKEND_AUTO = "auto"
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+BACKEND_ONNX_INT8 = "onnx_int8"
+
+# 导出模型的缓存目录（位于 .pt 所在目录下），按权重哈希区分，权重更新后自动重新导出
+EXPORT_CACHE_DIR_NAME = "export_cache"
+WEIGHT_HASH_CHUNK_SIZE = 1024 * 1024
+# 导出/量化互斥：锁文件超过该时间未释放视为持锁进程已异常退出
+EXPORT_LOCK_STALE_S = 1800
+EXPORT_LOCK_POLL_S = 0.5
+
+# 多个推理线程同时加载模型时只由一个线程导出，其余线程等待后直接使用导出结果（INT8 量化内嵌 FP32 导出，需可重入）
+_export_lock = threading.RLock()
+
+
+def weight_hash(model_path: str) -> str:
+    """权重文件内容的 SHA-256 前 16 位"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(WEIGHT_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+@contextmanager
+def export_lock(artifact: str):
+    """
+    导出产物的互斥锁：进程内为线程锁，进程间（同时运行多个程序实例）为产物旁的 .lock 文件。
+    持锁后调用方需再次检查产物是否已存在。
+    """
+    with _export_lock:
+        os.makedirs(os.path.dirname(artifact), exist_ok=True)
+        lock_path = artifact + ".lock"
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    stale = time.time() - os.path.getmtime(lock_path) > EXPORT_LOCK_STALE_S
+                except OSError:
+                    continue
+                if stale:
+                    print(f"[YOLO] 清除失效的导出锁: {lock_path}")
+                    try:
+                        os.remove(lock_path)
+                    except OSError:
+                        pass
+                    continue
+                time.sleep(EXPORT_LOCK_POLL_S)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+
+class YoloBackend:
+    """
+    推理后端基类：由 .pt 权重得到可执行的 ultralytics YOLO 模型。
+    各后端经 ultralytics 加载，预测结果（Results）结构与 PyTorch 完全一致，
+    YoloSegmentInfer 的 predict/detect 后处理无需区分后端。
+    """
+    name = BACKEND_TORCH
+    # 导出格式、导出产物后缀（ultralytics 按后缀识别模型格式）与运行时依赖的模块名
+    export_format = None
+    artifact_suffix = None
+    runtime_module = None
+    # 导出模型的输入固定为 input_size x input_size（批量维度动态），预处理需填充为正方形
+    square_input = False
+
+    def __init__(self, model_path: str, input_size: int = MODEL_INPUT_SIZE, calibration_dir: str = None):
+        self.model_path = model_path
+        self.input_size = input_size
+        self.device = 'cpu'
+        self.model = None
+
+    @classmethod
+    def available(cls) -> bool:
+        return cls.runtime_module is None or importlib.util.find_spec(cls.runtime_module) is not None
+
+    def load(self):
+        import torch
+        from ultralytics import YOLO
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model = YOLO(self.model_path)  # 使用ultralytics自动加载
+        self.model.to(self.device)
+
+    def __call__(self, tensor: "torch.Tensor", conf: float, iou: float):
+        return self.model(tensor, conf=conf, iou=iou, verbose=False)
+
+    def artifact_path(self) -> str:
+        """导出产物在缓存中的路径：<模型名>-<权重哈希>-<输入尺寸>-dyn<后缀>（dyn 表示动态批量）"""
+        stem = os.path.splitext(os.path.basename(self.model_path))[0]
+        cache_dir = os.path.join(os.path.dirname(self.model_path), EXPORT_CACHE_DIR_NAME)
+        return os.path.join(cache_dir, f"{stem}-{weight_hash(self.model_path)}-{self.input_size}-dyn{self.artifact_suffix}")
+
+
+class ExportedYoloBackend(YoloBackend):
+    """由 .pt 自动导出并缓存的 CPU 推理后端"""
+    square_input = True
+
+    def load(self):
+        from ultralytics import YOLO
+        self.device = 'cpu'
+        task = None
+        artifact = self.artifact_path()
+        if not os.path.exists(artifact):
+            with export_lock(artifact):
+                if not os.path.exists(artifact):
+                    task = self.export(artifact)
+        if task is None:
+            print(f"[YOLO] 使用已缓存的 {self.name} 模型: {artifact}")
+        # 已缓存时任务类型由导出时写入的元数据得到
+        self.model = YOLO(artifact, task=task)
+
+    def export(self, artifact: str) -> str:
+        """
+        在缓存目录下的临时目录中导出（ultralytics 将产物写在权重旁，故先复制权重），完成后整体改名到 artifact，
+        其他线程或进程不会看到导出一半的产物。需持有 export_lock，返回模型任务类型。
+        """
+        from ultralytics import YOLO
+        print(f"[YOLO] 导出 {self.name} 模型: {artifact}")
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(artifact)) as work_dir:
+            source_path = os.path.join(work_dir, os.path.basename(self.model_path))
+            shutil.copyfile(self.model_path, source_path)
+            source = YOLO(source_path)
+            # 动态输入，以便批量推理时一次送入多帧
+            exported = source.export(format=self.export_format, imgsz=self.input_size, dynamic=True, verbose=False)
+            os.replace(str(exported), artifact)
+            return source.task
+
+
+class OnnxYoloBackend(ExportedYoloBackend):
+    name = BACKEND_ONNX
+    export_format = "onnx"
+    artifact_suffix = ".onnx"
+    runtime_module = "onnxruntime"
+
+
+class OpenVinoYoloBackend(ExportedYoloBackend):
+    name = BACKEND_OPENVINO
+    export_format = "openvino"
+    artifact_suffix = "_openvino_model"
+    runtime_module = "openvino"
+
+
+class OnnxInt8YoloBackend(OnnxYoloBackend):
+    """
+    ONNX Runtime INT8：在 FP32 ONNX 模型基础上，以 calibration_dir 中保存的原图做训练后静态量化。
+    量化模型按权重哈希与校准集哈希缓存；首次量化时的校准集与留出集冻结在模型旁的校准清单中，
+    之后原图目录增长也复用同一模型，force 为 True 时忽略清单重新切分，量化完成后清除被取代的旧模型与报告。
+    量化完成后在留出图像上与 FP32 对比，报告写在模型旁的 .report.json。
+    """
+    name = BACKEND_ONNX_INT8
+
+    def __init__(self, model_path: str, input_size: int = MODEL_INPUT_SIZE, calibration_dir: str = None,
+                 force: bool = False):
+        super().__init__(model_path, input_size)
+        self.calibration_dir = calibration_dir
+        self.force = force
+        self.manifest = None
+        self.calibration, self.holdout = [], []
+        self.fp32 = OnnxYoloBackend(model_path, input_size)
+
+    def manifest_path(self) -> str:
+        fp32_path = self.fp32.artifact_path()
+        return fp32_path[:-len(self.artifact_suffix)] + INT8_MANIFEST_SUFFIX
+
+    def freeze_calibration(self):
+        """按校准清单确定校准集与留出集，没有清单（或 force）时按当前图像目录切分，清单在量化完成后写入"""
+        manifest = None if self.force else read_manifest(self.manifest_path())
+        if manifest is None:
+            self.calibration, self.holdout = split_images(self.calibration_dir) if self.calibration_dir else ([], [])
+            manifest = make_manifest(self.calibration, self.holdout)
+        else:
+            self.calibration, self.holdout = manifest_images(manifest, self.calibration_dir)
+        self.manifest = manifest
+
+    def artifact_path(self) -> str:
+        if self.manifest is None:
+            self.freeze_calibration()
+        fp32_path = self.fp32.artifact_path()
+        return fp32_path[:-len(self.artifact_suffix)] + f"-int8-{self.manifest['hash']}{self.artifact_suffix}"
+
+    def report_path(self) -> str:
+        return self.artifact_path() + ".report.json"
+
+    def load(self):
+        from ultralytics import YOLO
+        self.device = 'cpu'
+        artifact = self.artifact_path()
+        if not os.path.exists(artifact):
+            # 以校准清单加锁：同时启动的线程或进程只有一个量化，其余等待后按其写入的清单使用同一模型
+            with export_lock(self.manifest_path()):
+                if not self.force:
+                    self.freeze_calibration()
+                    artifact = self.artifact_path()
+                if not os.path.exists(artifact):
+                    self.fp32.load()
+                    # 量化到临时目录后改名，其他线程或进程不会加载到写了一半的模型
+                    with tempfile.TemporaryDirectory(dir=os.path.dirname(artifact)) as work_dir:
+                        quantized = os.path.join(work_dir, os.path.basename(artifact))
+                        quantize_onnx_int8(self.fp32.artifact_path(), quantized, self.calibration, self.input_size)
+                        os.replace(quantized, artifact)
+                    write_manifest(self.manifest, self.manifest_path())
+                    self.remove_superseded(artifact)
+                    self.model = YOLO(artifact)
+                    self.evaluate()
+                    return
+        if not os.path.exists(self.manifest_path()):
+            # 本次切分与已缓存模型的校准集一致，补写清单冻结下来
+            write_manifest(self.manifest, self.manifest_path())
+        print(f"[YOLO] 使用已缓存的 {self.name} 模型: {artifact}")
+        self.model = YOLO(artifact)
+
+    def remove_superseded(self, artifact: str):
+        """删除同一权重下按其他校准集量化的旧模型及其精度报告"""
+        cache_dir = os.path.dirname(artifact)
+        prefix = self.fp32.artifact_path()[:-len(self.artifact_suffix)] + "-int8-"
+        keep = {artifact, artifact + ".report.json"}
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if path.startswith(prefix) and path not in keep and not name.endswith(".lock") and os.path.isfile(path):
+                print(f"[量化] 删除被取代的量化模型: {path}")
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"[量化] 删除失败: {e}")
+
+    def evaluate(self) -> dict:
+        """在留出图像上对比 INT8 与 FP32，打印并保存报告"""
+        if not self.holdout:
+            print("[量化] 没有留出图像，跳过精度对比")
+            return {}
+        if self.fp32.model is None:
+            self.fp32.load()
+        report = compare_models(self.fp32.model, self.model, self.holdout, self.input_size)
+        print_report(report)
+        write_report(report, self.report_path())
+        return report
+
+
+BACKENDS = {
+    BACKEND_TORCH: YoloBackend,
+    BACKEND_ONNX: OnnxYoloBackend,
+    BACKEND_OPENVINO: OpenVinoYoloBackend,
+    BACKEND_ONNX_INT8: OnnxInt8YoloBackend,
+}
+
+# 指定后端不可用时的回退顺序
+BACKEND_FALLBACKS = {
+    BACKEND_ONNX_INT8: [BACKEND_ONNX, BACKEND_TORCH],
+}
+
+
+def create_backend(model_path: str, backend: str = BACKEND_AUTO, input_size: int = MODEL_INPUT_SIZE,
+                   calibration_dir: str = None) -> YoloBackend:
+    """
+    创建并加载推理后端。BACKEND_AUTO 在有 CUDA 时使用 PyTorch，否则依次尝试 OpenVINO、ONNX Runtime；
+    指定的后端缺少运行时或导出失败时按 BACKEND_FALLBACKS 回退（默认回退到 PyTorch）。
+    calibration_dir 为 INT8 量化的校准图像目录。
+    """
+    if backend == BACKEND_AUTO:
+        import torch
+        if torch.cuda.is_available():
+            candidates = [BACKEND_TORCH]
+        else:
+            candidates = [BACKEND_OPENVINO, BACKEND_ONNX, BACKEND_TORCH]
+    else:
+        candidates = [backend] + BACKEND_FALLBACKS.get(backend, [BACKEND_TORCH] if backend != BACKEND_TORCH else [])
+
+    for name in candidates:
+        backend_class = BACKENDS.get(name)
+        if backend_class is None:
+            print(f"[YOLO] 未知的推理后端: {name}")
+            continue
+        if not backend_class.available():
+            print(f"[YOLO] 未安装 {backend_class.runtime_module}，跳过 {name} 后端")
+            continue
+        instance = backend_class(model_path, input_size, calibration_dir)
+        try:
+            instance.load()
+        except Exception as e:
+            if name == BACKEND_TORCH:
+                raise
+            print(f"[YOLO] {name} 后端加载失败，回退: {e}")
+            continue
+        return instance
+    raise RuntimeError("没有可用的推理后端")
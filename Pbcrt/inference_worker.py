@@ -0,0 +1,301 @@
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+from PySide6.QtCore import QObject, QDateTime, Signal
+
+from ive_image_converter import IVEImageTypeConvert, IVEFrameConverter
+from frame_preprocess import FramePreprocessor
+from frame_trace import (STAGE_QUEUE, STAGE_PREPROCESS, STAGE_INFER, STAGE_CONVERT, STAGE_RENDER, STAGE_SAVE,
+                         STAGE_QIMAGE)
+
+# 推理线程数：每个线程持有独立的模型实例，推理期间 PyTorch/ONNX Runtime/OpenVINO 均释放 GIL
+INFER_WORKERS = 2
+# 等待推理的帧上限
+INFER_QUEUE_SIZE = 4
+# 模型加载完成前的待推理帧上限：加载期间无线程取帧，按 INFER_QUEUE_SIZE 只能保留最后几帧，
+# 加载完成前单独放宽，超出时同样按丢帧策略丢弃并计入 backlog_dropped_count
+INFER_PREREADY_BACKLOG = 32
+# 微批量：推理线程取到第一帧后最多再等待 INFER_MAX_WAIT_MS 凑齐 INFER_MAX_BATCH 帧，一次前向计算
+# 批量越大吞吐越高，等待越长单帧延迟越大；INFER_MAX_BATCH 为 1 时逐帧推理
+INFER_MAX_BATCH = 4
+INFER_MAX_WAIT_MS = 10
+# 队列满时的丢帧策略：丢弃最旧的帧（实时显示优先）或丢弃新到的帧（保留先到的帧）
+INFER_DROP_OLDEST = "drop_oldest"
+INFER_DROP_NEWEST = "drop_newest"
+
+# 推理模型类型
+YOLO_DETECT_MODEL = "detect"
+YOLO_SEGMENT_MODEL = "segment"
+
+
+class InferenceResult:
+    """一帧的推理结果，由推理线程生成后经信号交给界面线程"""
+
+    def __init__(self, device, timestamp: float, stamp: str, src_image, res_image,
+                 class_score_map: dict, detections: list = None):
+        self.device = device
+        self.timestamp = timestamp  # 帧首包到达时间（time.monotonic）
+        self.stamp = stamp  # 结果图像文件名中的时间戳
+        self.src_image = src_image  # QImage
+        self.res_image = res_image  # QImage
+        self.class_score_map = class_score_map
+        self.detections = detections
+        self.infer_ms = 0.0  # 所在批量的处理耗时
+        self.batch_size = 1
+        self.trace = None  # FrameTrace，界面更新后汇总
+
+
+class YoloInferenceTask:
+    """
+    单个推理线程的工作内容：预处理 → 推理 → 保存原图与结果图 → 生成界面显示用的 QImage。
+    每个线程一份，模型、转换缓冲与预处理缓冲均不跨线程共享。
+    """
+
+    def __init__(self, model_factory, model_type: str, src_dir: str, res_dir: str):
+        self.model = model_factory()
+        self.model_type = model_type
+        self.src_dir = src_dir
+        self.res_dir = res_dir
+        self.converter = IVEFrameConverter()
+        self.preprocessor = FramePreprocessor(self.converter, square=self.model.square_input)
+
+    def process_batch(self, jobs: list) -> list:
+        """
+        jobs 为 [(FrameLease, w, h, img_type), ...]，按张量尺寸分组批量推理后逐帧绘制与保存，
+        返回与 jobs 一一对应的 InferenceResult 列表（出错的帧为 None）。
+        """
+        results = [None] * len(jobs)
+        if self.model.tiler is not None:
+            # 分块推理：每帧的各个块自成一批
+            for index, (frame, w, h, img_type) in enumerate(jobs):
+                try:
+                    start = time.perf_counter()
+                    prepared = self.preprocessor.prepare(frame.view, w, h, img_type)
+                    frame.trace.mark(STAGE_PREPROCESS, start)
+                    results[index] = self.finish(frame, prepared, None)
+                except Exception as e:
+                    print(f"[YOLO] 图像推理出错: {e}")
+            return results
+        items = [(frame.view, w, h, img_type) for frame, w, h, img_type in jobs]
+        # === 原始图像数据直接预处理为模型输入张量，原分辨率 BGR 仅在绘制与保存时生成 ===
+        start = time.perf_counter()
+        batches = self.preprocessor.prepare_batch(items)
+        for frame, _, _, _ in jobs:
+            frame.trace.mark(STAGE_PREPROCESS, start)
+        for batch, prepared_frames, indices in batches:
+            # === 使用模型进行批量推理 ===
+            start = time.perf_counter()
+            try:
+                batch_results = self.model.infer_batch(batch)
+            except Exception as e:
+                print(f"[YOLO] 图像推理出错: {e}")
+                continue
+            for index in indices:
+                jobs[index][0].trace.mark(STAGE_INFER, start)
+            # 同组帧共用 BGR 转换缓冲，逐帧完成绘制与保存后再处理下一帧
+            for prepared, frame_results, index in zip(prepared_frames, batch_results, indices):
+                try:
+                    results[index] = self.finish(jobs[index][0], prepared, frame_results)
+                except Exception as e:
+                    print(f"[YOLO] 结果处理出错: {e}")
+        return results
+
+    def finish(self, frame, prepared, frame_results) -> InferenceResult:
+        """frame_results 为 None 时对该帧做分块推理"""
+        trace = frame.trace
+        start = time.perf_counter()
+        # 原分辨率 BGR 在首次访问时转换，单独计时
+        bgr_src_img = prepared.bgr
+        trace.mark(STAGE_CONVERT, start)
+        detections = None
+        if self.model_type == YOLO_DETECT_MODEL:
+            if frame_results is None:
+                bgr_res_img, class_score_map, detections = self.model.detect_tiled(prepared)
+            else:
+                bgr_res_img, class_score_map, detections = self.model.render_detect(prepared, frame_results)
+        else:
+            if frame_results is None:
+                bgr_res_img, class_score_map = self.model.predict_tiled(prepared)
+            else:
+                bgr_res_img, class_score_map = self.model.render_segment(prepared, frame_results)
+        trace.mark(STAGE_RENDER)
+        # === 生成时间戳文件名并保存 BGR 图像（OpenCV） ===
+        stamp = QDateTime.currentDateTime().toString("yyyy_MM_dd_HH_mm_ss_zzz")
+        src_path = self.src_dir + f"img_src_{stamp}.jpg"
+        res_path = self.res_dir + f"img_res_{stamp}.jpg"
+        os.makedirs(self.src_dir, exist_ok=True)
+        os.makedirs(self.res_dir, exist_ok=True)
+        # 逐帧保存，只在失败时打印
+        if not cv2.imwrite(src_path, bgr_src_img):
+            print(f"[保存] 原图保存失败: {src_path}")
+        if not cv2.imwrite(res_path, bgr_res_img):
+            print(f"[保存] 结果图保存失败: {res_path}")
+        trace.mark(STAGE_SAVE)
+        # to_qimage 拷贝数据，原帧缓冲可在返回后归还
+        result = InferenceResult(frame.device, frame.timestamp, stamp,
+                                 IVEImageTypeConvert.to_qimage(bgr_src_img),
+                                 IVEImageTypeConvert.to_qimage(bgr_res_img),
+                                 class_score_map, detections)
+        trace.mark(STAGE_QIMAGE)
+        result.trace = trace
+        return result
+
+
+class InferencePool(QObject):
+    """
+    界面线程之外的推理阶段：N 个推理线程共享一个有界队列，每个线程按微批量取帧推理。
+    帧以缓冲池租约（FrameLease）的形式入队，推理线程直接读取接收线程写入的共享缓冲，不做拷贝，
+    处理完成或被丢弃后归还。结果通过 resultReady 信号回到界面线程；
+    每帧最终必定发出 frameFinished(设备, 时间戳) 或 frameDropped(设备) 之一，供流控归还信用。
+    模型在各推理线程中加载，加载完成前到达的帧在队列中等待（上限为 backlog_size）；每个线程加载完成发出 workerReady(已就绪线程数)，
+    加载失败发出 workerFailed(错误信息)，全部线程失败时丢弃队列中的帧并停止接收。
+    """
+    resultReady = Signal(object)
+    frameFinished = Signal(object, float)
+    frameDropped = Signal(object)
+    workerReady = Signal(int)
+    workerFailed = Signal(str)
+
+    def __init__(self, task_factory, workers: int = INFER_WORKERS, queue_size: int = INFER_QUEUE_SIZE,
+                 drop_policy: str = INFER_DROP_OLDEST, max_batch: int = INFER_MAX_BATCH,
+                 max_wait_ms: int = INFER_MAX_WAIT_MS, backlog_size: int = INFER_PREREADY_BACKLOG, parent=None):
+        super().__init__(parent)
+        self.task_factory = task_factory
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        # 队列至少能容纳一个完整批量
+        self.queue_size = max(queue_size, self.max_batch)
+        self.backlog_size = max(backlog_size, self.queue_size)
+        self.drop_policy = drop_policy
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.dropped_count = 0
+        # 模型就绪前因超出 backlog_size 丢弃的帧数
+        self.backlog_dropped_count = 0
+        self.worker_count = workers
+        self.ready_count = 0
+        self.failed_count = 0
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.worker_loop, name=f"infer-{i}", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def submit(self, frame, w: int, h: int, img_type: int):
+        """界面线程调用：入队一帧，队列满（模型就绪前为 backlog_size）时按丢帧策略丢弃一帧"""
+        dropped = None
+        with self.condition:
+            loading = self.ready_count == 0
+            if not self.running:
+                dropped = frame
+            elif len(self.jobs) >= (self.backlog_size if loading else self.queue_size):
+                if loading:
+                    self.backlog_dropped_count += 1
+                    if self.backlog_dropped_count == 1:
+                        print(f"[推理] 模型加载中，待推理帧超过 {self.backlog_size} 帧，开始丢帧")
+                if self.drop_policy == INFER_DROP_NEWEST:
+                    dropped = frame
+                else:
+                    dropped = self.jobs.popleft()[0]
+                    self.jobs.append((frame, w, h, img_type))
+            else:
+                self.jobs.append((frame, w, h, img_type))
+                self.condition.notify()
+        if dropped is not None:
+            self.drop(dropped)
+
+    def drop(self, frame):
+        device = frame.device
+        frame.release()
+        self.dropped_count += 1
+        self.frameDropped.emit(device)
+
+    def worker_loop(self):
+        try:
+            task = self.task_factory()
+        except Exception as e:
+            print(f"[推理] 推理线程初始化失败: {e}")
+            with self.condition:
+                self.failed_count += 1
+                jobs = []
+                if self.failed_count == self.worker_count:
+                    self.running = False
+                    jobs = list(self.jobs)
+                    self.jobs.clear()
+            for frame, _, _, _ in jobs:
+                self.drop(frame)
+            self.workerFailed.emit(str(e))
+            return
+        with self.condition:
+            self.ready_count += 1
+            ready_count = self.ready_count
+        self.workerReady.emit(ready_count)
+        while True:
+            jobs = self.take_batch()
+            if jobs is None:
+                return
+            for frame, _, _, _ in jobs:
+                frame.trace.mark(STAGE_QUEUE)
+            start = time.perf_counter()
+            try:
+                results = task.process_batch(jobs)
+            except Exception as e:
+                print(f"[YOLO] 图像推理出错: {e}")
+                results = [None] * len(jobs)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for (frame, _, _, _), result in zip(jobs, results):
+                device = frame.device
+                timestamp = frame.timestamp
+                frame.release()
+                if result is not None:
+                    result.infer_ms = elapsed_ms
+                    result.batch_size = len(jobs)
+                    self.resultReady.emit(result)
+                self.frameFinished.emit(device, timestamp)
+
+    def take_batch(self):
+        """阻塞取出一批帧：取到第一帧后最多等待 max_wait 凑满 max_batch 帧；停止时返回 None"""
+        with self.condition:
+            while self.running and not self.jobs:
+                self.condition.wait()
+            if not self.running:
+                return None
+            jobs = [self.jobs.popleft()]
+            deadline = time.monotonic() + self.max_wait
+            while len(jobs) < self.max_batch:
+                if self.jobs:
+                    jobs.append(self.jobs.popleft())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+                if not self.running:
+                    for frame, _, _, _ in jobs:
+                        frame.release()
+                    return None
+            return jobs
+
+    def is_ready(self) -> bool:
+        """至少一个推理线程已加载完模型"""
+        with self.condition:
+            return self.ready_count > 0
+
+    def pending_count(self) -> int:
+        with self.condition:
+            return len(self.jobs)
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            jobs = list(self.jobs)
+            self.jobs.clear()
+            self.condition.notify_all()
+        for frame, _, _, _ in jobs:
+            frame.release()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
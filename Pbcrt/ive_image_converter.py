@@ -6,6 +6,21 @@ import numpy as np
 from numpy import ndarray, dtype
 
 
+# YUV 色度排列：False 为 UV 顺序（NV12/I420/YUYV），True 为 VU 顺序（NV21/YV12/YVYU，Hi3516 VPSS 的 YVU 输出）
+YUV_CHROMA_VU_ORDER = False
+# 非 8 位无符号类型（梯度、积分图、热成像等）的显示归一化：
+# 在步长为 IVE_NORMALIZE_SAMPLE_STEP 的抽样网格上取 IVE_NORMALIZE_PERCENTILE 百分位作为映射到 0~255 的范围
+IVE_NORMALIZE_PERCENTILE = (1.0, 99.0)
+IVE_NORMALIZE_SAMPLE_STEP = 8
+
+# 宽位宽类型对应的 numpy 数据类型
+IVE_WIDE_DTYPES = {
+    8: np.int16, 9: np.uint16,
+    12: np.int32, 13: np.uint32,
+    14: np.int64, 15: np.uint64,
+}
+
+
 class IVEImageType:
     U8C1 = 0
     S8C1 = 1
@@ -38,84 +53,219 @@ class IVEImageTypeConvert:
             raise ValueError("不支持的图像格式")
 
     @staticmethod
-    def convert(data: bytes, width: int, height: int, img_type: int) -> np.ndarray:
+    def convert(data: bytes, width: int, height: int, img_type: int, dst: np.ndarray = None,
+                value_range: tuple = None) -> np.ndarray:
         """
         将原始图像数据根据图像类型转换为 OpenCV BGR 格式的 np.ndarray。
-        支持灰度、打包 RGB/YUV、分离 YUV 等格式。
+        支持灰度、打包 RGB/YUV、分离 YUV、双通道 S8 及 16/32/64 位单通道等格式。
+        dst 为调用方提供的 (height, width, 3) uint8 输出数组，缺省时新分配；
+        U8C3_PACKAGE 未提供 dst 时直接返回原数据的视图。
+        value_range 为 S8C2 及宽位宽类型映射到 0~255 的固定范围 (低, 高)，缺省时按抽样百分位自动计算。
         """
-        total_size = len(data)
-        array = np.frombuffer(data, dtype=np.uint8)
+        return IVEImageTypeConvert._convert(data, width, height, img_type, dst, {}, value_range)
+
+    @staticmethod
+    def _scratch(scratch: dict, name: str, shape: tuple, dtype) -> np.ndarray:
+        """取出或创建转换用的中间数组"""
+        array = scratch.get(name)
+        if array is None:
+            array = np.empty(shape, dtype=dtype)
+            scratch[name] = array
+        return array
 
-        if img_type == IVEImageType.U8C1:
-            expected = width * height
-            if total_size < expected:
-                raise ValueError("U8C1 数据不足")
-            gray = array[:expected].reshape((height, width))
-            return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    @staticmethod
+    def sample_range(values: np.ndarray, percentile: tuple = IVE_NORMALIZE_PERCENTILE,
+                     step: int = IVE_NORMALIZE_SAMPLE_STEP) -> tuple:
+        """在抽样网格上计算显示范围 (低, 高)，values 为二维或三维（末维为通道）数组"""
+        sample = values[::step, ::step]
+        low, high = np.percentile(sample, percentile)
+        if high <= low:
+            high = low + 1
+        return float(low), float(high)
 
-        elif img_type == IVEImageType.S8C1:
-            expected = width * height
-            if total_size < expected:
-                raise ValueError("S8C1 数据不足")
-            gray = np.frombuffer(data, dtype=np.int8)[:expected].reshape((height, width)).astype(np.uint8)
-            return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    @staticmethod
+    def _convert(data, width: int, height: int, img_type: int, dst, scratch: dict,
+                 value_range: tuple = None) -> np.ndarray:
+        """scratch 为按名称缓存的中间数组（如 422 格式转打包 YUYV 所用的数组），调用方可跨帧复用"""
+        array = np.frombuffer(data, dtype=np.uint8)
+        pixels = width * height
+        expected = IVEImageTypeConvert.frame_size(width, height, img_type)
+        if array.size < expected:
+            raise ValueError(f"{IVEImageTypeConvert.ive_type_to_string(img_type)} 数据不足")
+        if img_type == IVEImageType.U8C3_PACKAGE:
+            bgr = array[:expected].reshape((height, width, 3))  # 默认 BGR
+            if dst is None:
+                return bgr
+            np.copyto(dst, bgr)
+            return dst
+        if dst is None:
+            dst = np.empty((height, width, 3), dtype=np.uint8)
 
-        elif img_type == IVEImageType.U8C3_PACKAGE:
-            expected = width * height * 3
-            if total_size < expected:
-                raise ValueError("U8C3_PACKAGE 数据不足")
-            return array[:expected].reshape((height, width, 3))  # 默认 BGR
+        if img_type in (IVEImageType.U8C1, IVEImageType.S8C1):
+            # S8C1 按位解释为 uint8，与原先 astype(np.uint8) 的回绕结果一致
+            return cv2.cvtColor(array[:pixels].reshape((height, width)), cv2.COLOR_GRAY2BGR, dst=dst)
 
         elif img_type == IVEImageType.U8C3_PLANAR:
-            expected = width * height * 3
-            if total_size < expected:
-                raise ValueError("U8C3_PLANAR 数据不足")
-            y = array[0:width * height].reshape((height, width))
-            u = array[width * height:2 * width * height].reshape((height, width))
-            v = array[2 * width * height:expected].reshape((height, width))
-            return cv2.merge([v, u, y])  # YUV 转 BGR 可加一步转 cv2.COLOR_YCrCb2BGR
+            planes = array[:expected].reshape((3, height, width))
+            return cv2.merge((planes[2], planes[1], planes[0]), dst)
 
         elif img_type == IVEImageType.YUV420SP:
-            expected = width * height * 3 // 2
-            if total_size < expected:
-                raise ValueError("YUV420SP 数据不足")
-            yuv = array[:expected].reshape((height * 3 // 2, width))
-            return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_NV12)
-
-        elif img_type == IVEImageType.YUV422SP:
-            expected = width * height * 2
-            if total_size < expected:
-                raise ValueError("YUV422SP 数据不足")
-            yuv = array[:expected].reshape((height, width * 2))
-            return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_YUY2)
+            code = cv2.COLOR_YUV2BGR_NV21 if YUV_CHROMA_VU_ORDER else cv2.COLOR_YUV2BGR_NV12
+            return cv2.cvtColor(array[:expected].reshape((height * 3 // 2, width)), code, dst=dst)
 
         elif img_type == IVEImageType.YUV420P:
-            expected = width * height * 3 // 2
-            if total_size < expected:
-                raise ValueError("YUV420P 数据不足")
-            y = array[0:width * height].reshape((height, width))
-            u = array[width * height:width * height + (width // 2) * (height // 2)].reshape((height // 2, width // 2))
-            v = array[width * height + (width // 2) * (height // 2):expected].reshape((height // 2, width // 2))
-            u_up = cv2.resize(u, (width, height), interpolation=cv2.INTER_LINEAR)
-            v_up = cv2.resize(v, (width, height), interpolation=cv2.INTER_LINEAR)
-            yuv = cv2.merge([y, u_up, v_up])
-            return cv2.cvtColor(yuv, cv2.COLOR_YCrCb2BGR)
-
-        elif img_type == IVEImageType.YUV422P:
-            expected = width * height * 2
-            if total_size < expected:
-                raise ValueError("YUV422P 数据不足")
-            y = array[0:width * height].reshape((height, width))
-            u = array[width * height:width * height + (width // 2) * height].reshape((height, width // 2))
-            v = array[width * height + (width // 2) * height:expected].reshape((height, width // 2))
-            u_up = cv2.resize(u, (width, height), interpolation=cv2.INTER_LINEAR)
-            v_up = cv2.resize(v, (width, height), interpolation=cv2.INTER_LINEAR)
-            yuv = cv2.merge([y, u_up, v_up])
-            return cv2.cvtColor(yuv, cv2.COLOR_YCrCb2BGR)
+            code = cv2.COLOR_YUV2BGR_YV12 if YUV_CHROMA_VU_ORDER else cv2.COLOR_YUV2BGR_I420
+            return cv2.cvtColor(array[:expected].reshape((height * 3 // 2, width)), code, dst=dst)
+
+        elif img_type in (IVEImageType.YUV422SP, IVEImageType.YUV422P):
+            # OpenCV 没有 422 半平面/平面格式的直接转换，先交织为打包 YUYV（Y0 U0 Y1 V0）再一次转换
+            yuyv = IVEImageTypeConvert._scratch(scratch, "yuyv", (height, width, 2), np.uint8)
+            yuyv[:, :, 0] = array[:pixels].reshape((height, width))
+            if img_type == IVEImageType.YUV422SP:
+                # 交错色度平面每行为 U0 V0 U1 V1 ...，恰好是 YUYV 的色度排列
+                yuyv[:, :, 1] = array[pixels:expected].reshape((height, width))
+            else:
+                chroma = array[pixels:expected].reshape((2, height, width // 2))
+                yuyv[:, 0::2, 1] = chroma[0]
+                yuyv[:, 1::2, 1] = chroma[1]
+            code = cv2.COLOR_YUV2BGR_YVYU if YUV_CHROMA_VU_ORDER else cv2.COLOR_YUV2BGR_YUY2
+            return cv2.cvtColor(yuyv, code, dst=dst)
+
+        elif img_type in (IVEImageType.S8C2_PACKAGE, IVEImageType.S8C2_PLANAR):
+            # 双通道有符号 8 位（如 x/y 梯度）：两通道经同一查找表映射后分别放入 R、G 通道，B 通道为 0
+            signed = np.frombuffer(data, dtype=np.int8, count=expected)
+            if value_range is None:
+                if img_type == IVEImageType.S8C2_PACKAGE:
+                    value_range = IVEImageTypeConvert.sample_range(signed.reshape((height, width, 2)))
+                else:
+                    value_range = IVEImageTypeConvert.sample_range(signed.reshape((height * 2, width)))
+            low, high = value_range
+            # 查找表以 uint8 表示为下标，下标 128~255 对应 int8 的 -128~-1
+            values = np.arange(256, dtype=np.float32)
+            values[128:] -= 256
+            lut = np.clip((values - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+            mapped = IVEImageTypeConvert._scratch(scratch, "mapped", (expected // width, width), np.uint8)
+            cv2.LUT(array[:expected].reshape((-1, width)), lut, dst=mapped)
+            zeros = IVEImageTypeConvert._scratch(scratch, "zeros", (height, width), np.uint8)
+            zeros.fill(0)
+            if img_type == IVEImageType.S8C2_PACKAGE:
+                cv2.mixChannels([mapped.reshape((height, width, 2)), zeros], [dst], [0, 2, 1, 1, 2, 0])
+                return dst
+            return cv2.merge((zeros, mapped[height:], mapped[:height]), dst)
+
+        elif img_type in IVE_WIDE_DTYPES:
+            return IVEImageTypeConvert._convert_wide(data, width, height, img_type, dst, scratch, value_range)
 
         else:
             raise ValueError(f"不支持的图像类型: {img_type}")
 
+    @staticmethod
+    def _convert_wide(data, width: int, height: int, img_type: int, dst, scratch: dict,
+                      value_range: tuple = None) -> np.ndarray:
+        """
+        16/32/64 位单通道 → BGR 灰度图：先以 cv2.max 截断下限，再由 cv2.convertScaleAbs 一次完成
+        缩放、取整与饱和到 uint8（上限自然饱和）。OpenCV 不支持的 uint32/int64/uint64 先截断并右移到 int32 范围。
+        """
+        dtype = IVE_WIDE_DTYPES[img_type]
+        values = np.frombuffer(data, dtype=dtype, count=width * height).reshape((height, width))
+        if value_range is None:
+            value_range = IVEImageTypeConvert.sample_range(values)
+        low, high = value_range
+        if dtype in (np.int16, np.uint16, np.int32):
+            # 截断下限，避免低于下限的值经 convertScaleAbs 取绝对值后翻折为亮值
+            clipped = IVEImageTypeConvert._scratch(scratch, "clipped", (height, width), dtype)
+            cv2.max(values, low, dst=clipped)
+        else:
+            # OpenCV 不支持的类型：在原类型中截断到 [低, 高] 并减去下限，再右移到 int32 范围
+            low, high = int(np.floor(low)), int(np.ceil(high))
+            bounded = IVEImageTypeConvert._scratch(scratch, "bounded", (height, width), dtype)
+            np.clip(values, dtype(low), dtype(high), out=bounded)
+            np.subtract(bounded, dtype(low), out=bounded)
+            shift = max(0, (high - low).bit_length() - 31)
+            clipped = IVEImageTypeConvert._scratch(scratch, "clipped", (height, width), np.int32)
+            np.right_shift(bounded, shift, out=clipped, casting='unsafe')
+            low, high = 0, (high - low) >> shift
+        gray = IVEImageTypeConvert._scratch(scratch, "gray", (height, width), np.uint8)
+        alpha = 255.0 / max(high - low, 1)
+        cv2.convertScaleAbs(clipped, dst=gray, alpha=alpha, beta=-low * alpha)
+        if dst is None:
+            dst = np.empty((height, width, 3), dtype=np.uint8)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=dst)
+
+    @staticmethod
+    def from_bgr(bgr: np.ndarray, img_type: int) -> bytes:
+        """
+        将 OpenCV BGR 图像编码为指定 IVE 类型的原始数据，数据排布与 convert() 的解析方式一致，
+        用于模拟设备发送真实图像。非 8 位类型由灰度值按位宽缩放得到。
+        """
+        height, width = bgr.shape[:2]
+        if img_type in (IVEImageType.U8C1, IVEImageType.S8C1):
+            return cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY).tobytes()
+
+        elif img_type == IVEImageType.U8C3_PACKAGE:
+            return np.ascontiguousarray(bgr).tobytes()
+
+        elif img_type == IVEImageType.U8C3_PLANAR:
+            b, g, r = cv2.split(bgr)
+            return r.tobytes() + g.tobytes() + b.tobytes()
+
+        elif img_type in (IVEImageType.YUV420SP, IVEImageType.YUV420P,
+                          IVEImageType.YUV422SP, IVEImageType.YUV422P):
+            # 统一经 I420 得到 Y 与 1/4 尺寸色度，422 格式色度按行复制，与 convert() 使用相同的色彩矩阵
+            i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+            y = i420[:height]
+            u = i420[height:height + height // 4].reshape(height // 2, width // 2)
+            v = i420[height + height // 4:].reshape(height // 2, width // 2)
+            if img_type in (IVEImageType.YUV422SP, IVEImageType.YUV422P):
+                u = np.repeat(u, 2, axis=0)
+                v = np.repeat(v, 2, axis=0)
+            first, second = (v, u) if YUV_CHROMA_VU_ORDER else (u, v)
+            if img_type in (IVEImageType.YUV420P, IVEImageType.YUV422P):
+                return y.tobytes() + first.tobytes() + second.tobytes()
+            return y.tobytes() + np.dstack((first, second)).tobytes()
+
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        if img_type in (IVEImageType.S8C2_PACKAGE, IVEImageType.S8C2_PLANAR):
+            signed = (gray.astype(np.int16) - 128).astype(np.int8)
+            if img_type == IVEImageType.S8C2_PACKAGE:
+                return np.dstack((signed, signed)).tobytes()
+            return signed.tobytes() + signed.tobytes()
+
+        dtypes = {
+            IVEImageType.S16C1: np.int16, IVEImageType.U16C1: np.uint16,
+            IVEImageType.S32C1: np.int32, IVEImageType.U32C1: np.uint32,
+            IVEImageType.S64C1: np.int64, IVEImageType.U64C1: np.uint64,
+        }
+        dtype = dtypes.get(img_type)
+        if dtype is None:
+            raise ValueError(f"不支持的图像类型: {img_type}")
+        shift = np.dtype(dtype).itemsize * 8 - 8
+        if np.issubdtype(dtype, np.signedinteger):
+            return ((gray.astype(np.int64) - 128) << (shift - 1)).astype(dtype).tobytes()
+        return (gray.astype(np.uint64) << np.uint64(shift)).astype(dtype).tobytes()
+
+    @staticmethod
+    def frame_size(width: int, height: int, img_type: int) -> int:
+        """根据 IVE 图像类型计算一帧原始数据的字节数"""
+        pixels = width * height
+        if img_type in (IVEImageType.U8C1, IVEImageType.S8C1):
+            return pixels
+        elif img_type in (IVEImageType.YUV420SP, IVEImageType.YUV420P):
+            return pixels * 3 // 2
+        elif img_type in (IVEImageType.YUV422SP, IVEImageType.YUV422P,
+                          IVEImageType.S8C2_PACKAGE, IVEImageType.S8C2_PLANAR,
+                          IVEImageType.S16C1, IVEImageType.U16C1):
+            return pixels * 2
+        elif img_type in (IVEImageType.U8C3_PACKAGE, IVEImageType.U8C3_PLANAR):
+            return pixels * 3
+        elif img_type in (IVEImageType.S32C1, IVEImageType.U32C1):
+            return pixels * 4
+        elif img_type in (IVEImageType.S64C1, IVEImageType.U64C1):
+            return pixels * 8
+        else:
+            # 未知类型按原协议的 YUV420SP 大小处理
+            return pixels * 3 // 2
+
     @staticmethod
     def ive_type_to_string(img_type: int) -> str:
         """将 IVE 图像类型整数转换为字符串表示"""
@@ -147,3 +297,32 @@ class IVEImageTypeConvert:
             raise ValueError(f"Invalid IVEImageType value: {value}")
         return value
 
+
+
+class IVEFrameConverter:
+    """
+    带缓存的 IVE → BGR 转换器：按 (图像类型, 宽, 高) 缓存输出数组与转换用的中间数组，
+    稳定出图时每帧只创建 numpy 视图，不再分配图像大小的内存。
+    返回的数组在下一次转换同尺寸同类型的帧时会被覆盖，需要保留时调用方自行拷贝；
+    U8C3_PACKAGE 直接返回原数据的视图，在帧缓冲归还前有效。
+    value_ranges 可按图像类型指定 S8C2 及宽位宽类型的固定显示范围 {img_type: (低, 高)}，未指定的类型按抽样百分位归一化。
+    """
+
+    def __init__(self, value_ranges: dict = None):
+        self.buffers = {}
+        self.value_ranges = dict(value_ranges) if value_ranges else {}
+
+    def convert(self, data, width: int, height: int, img_type: int) -> np.ndarray:
+        if img_type == IVEImageType.U8C3_PACKAGE:
+            return IVEImageTypeConvert._convert(data, width, height, img_type, None, {})
+        key = (img_type, width, height)
+        buffers = self.buffers.get(key)
+        if buffers is None:
+            buffers = (np.empty((height, width, 3), dtype=np.uint8), {})
+            self.buffers[key] = buffers
+        dst, scratch = buffers
+        return IVEImageTypeConvert._convert(data, width, height, img_type, dst, scratch,
+                                            self.value_ranges.get(img_type))
+
+    def clear(self):
+        self.buffers.clear()
@@ -0,0 +1,95 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 标签字体：首选黑体，找不到时依次尝试后备字体，都不可用时退回 PIL 内置字体（不支持中文）
+LABEL_FONT_PATH = "simhei.ttf"
+LABEL_FONT_FALLBACKS = ("msyh.ttc", "simsun.ttc", "NotoSansCJK-Regular.ttc", "wqy-microhei.ttc", "DejaVuSans.ttf")
+LABEL_FONT_SIZE = 20
+# 预先栅格化的单字符：置信度数字与常用标点
+LABEL_PRELOAD_CHARS = "0123456789.:%-() "
+
+
+class LabelRenderer:
+    """
+    中文标签绘制：类别名与数字、标点预先栅格化为带透明度的字形图块（字形图集，按文本缓存），
+    绘制时将标签拼接为一条透明度图块，只在标签所在的小区域内按透明度混合颜色，不再整帧转换为 PIL 图像。
+    字体在首次使用时加载。每个推理线程各有一份，不做加锁。
+    """
+
+    def __init__(self, font_path: str = LABEL_FONT_PATH, font_size: int = LABEL_FONT_SIZE):
+        self.font_path = font_path
+        self.font_size = font_size
+        self._font = None
+        self.line_height = 0
+        self.glyphs = {}  # 文本 -> 透明度图块 (line_height, 宽) uint8
+        self.names = []  # 整体栅格化的类别名，按长度从长到短匹配
+
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = self.load_font()
+            ascent, descent = self._font.getmetrics()
+            self.line_height = ascent + descent
+        return self._font
+
+    def load_font(self):
+        for path in (self.font_path,) + LABEL_FONT_FALLBACKS:
+            try:
+                font = ImageFont.truetype(path, self.font_size)
+            except OSError:
+                continue
+            if path != self.font_path:
+                print(f"[标签] 未找到字体 {self.font_path}，使用 {path}")
+            return font
+        print(f"[标签] 未找到可用的中文字体，使用内置字体，中文可能无法显示")
+        return ImageFont.load_default(self.font_size)
+
+    def preload(self, names: list):
+        """栅格化类别名与常用字符，由 load_classes 调用"""
+        self.names = sorted(set(names), key=len, reverse=True)
+        for text in self.names:
+            self.glyph(text)
+        for char in LABEL_PRELOAD_CHARS:
+            self.glyph(char)
+
+    def glyph(self, text: str) -> np.ndarray:
+        """返回文本的透明度图块，未缓存时栅格化（与 ImageDraw.text 的默认锚点一致，顶部为字体上沿）"""
+        alpha = self.glyphs.get(text)
+        if alpha is None:
+            font = self.font
+            width = max(1, int(np.ceil(font.getlength(text))))
+            image = Image.new("L", (width, self.line_height), 0)
+            ImageDraw.Draw(image).text((0, 0), text, font=font, fill=255)
+            alpha = np.asarray(image)
+            self.glyphs[text] = alpha
+        return alpha
+
+    def layout(self, text: str) -> np.ndarray:
+        """将标签拆为已缓存的类别名与单字符，拼接为整条透明度图块"""
+        pieces = []
+        position = 0
+        while position < len(text):
+            name = next((name for name in self.names if text.startswith(name, position)), None)
+            piece = name if name else text[position]
+            pieces.append(self.glyph(piece))
+            position += len(piece)
+        if len(pieces) == 1:
+            return pieces[0]
+        return np.hstack(pieces)
+
+    def draw(self, image: np.ndarray, text: str, position: tuple, color: tuple):
+        """在 BGR 图像上原地绘制标签，position 为左上角 (x, y)，color 为 BGR，超出图像的部分被裁掉"""
+        if not text:
+            return
+        alpha = self.layout(text)
+        x, y = int(position[0]), int(position[1])
+        height, width = image.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + alpha.shape[1], width), min(y + alpha.shape[0], height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        a = alpha[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.uint16)
+        roi = image[y0:y1, x0:x1]
+        # roi + (color - roi) * a / 255，整数运算并四舍五入
+        blended = roi * (255 - a) + np.array(color, dtype=np.uint16) * a + 127
+        roi[:] = (blended // 255).astype(np.uint8)
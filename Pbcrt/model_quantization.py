@@ -0,0 +1,268 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from frame_preprocess import FramePreprocessor
+
+# INT8 训练后静态量化：校准图像取自保存的原图目录，每 INT8_HOLDOUT_EVERY 张留出一张用于精度对比
+INT8_HOLDOUT_EVERY = 5
+INT8_CALIB_MAX_IMAGES = 200
+INT8_CALIB_MIN_IMAGES = 20
+INT8_EVAL_MAX_IMAGES = 100
+# 精度对比：以 FP32 结果为参考，框 IoU 达到该阈值且类别相同视为匹配
+INT8_MATCH_IOU = 0.5
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# 校准清单：首次量化时冻结的校准集、留出集（文件名）与校准集哈希，写在量化模型旁；
+# 此后原图目录继续增加图像也按清单复用已量化的模型，只有 --force 时重新切分并量化
+INT8_MANIFEST_SUFFIX = "-int8.calibration.json"
+
+
+def list_images(image_dir: str) -> list:
+    if not os.path.isdir(image_dir):
+        return []
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(image_dir, name) for name in names]
+
+
+def split_images(image_dir: str):
+    """按文件名排序后切分为 (校准集, 留出集)"""
+    images = list_images(image_dir)
+    holdout = images[::INT8_HOLDOUT_EVERY][:INT8_EVAL_MAX_IMAGES]
+    calibration = [path for i, path in enumerate(images) if i % INT8_HOLDOUT_EVERY][:INT8_CALIB_MAX_IMAGES]
+    return calibration, holdout
+
+
+def calibration_hash(paths: list) -> str:
+    """校准集的哈希（文件名与大小），校准图像变化时重新量化"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(str(os.path.getsize(path)).encode("ascii"))
+    return digest.hexdigest()[:8]
+
+
+def read_manifest(path: str):
+    """读取校准清单，不存在或格式错误时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("hash"), str) and isinstance(manifest.get("calibration"), list) \
+                and isinstance(manifest.get("holdout"), list):
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def make_manifest(calibration: list, holdout: list) -> dict:
+    return {
+        "hash": calibration_hash(calibration),
+        "calibration": [os.path.basename(path) for path in calibration],
+        "holdout": [os.path.basename(path) for path in holdout],
+    }
+
+
+def write_manifest(manifest: dict, path: str):
+    """先写临时文件再改名，并发读取的进程不会读到写了一半的清单"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def manifest_images(manifest: dict, image_dir: str):
+    """清单中的 (校准集, 留出集) 完整路径，已被删除的图像不再使用"""
+    def existing(names):
+        paths = [os.path.join(image_dir or "", name) for name in names]
+        return [path for path in paths if os.path.exists(path)]
+    return existing(manifest["calibration"]), existing(manifest["holdout"])
+
+
+def load_tensors(paths: list, preprocessor: FramePreprocessor):
+    """逐张读取图像并预处理为模型输入张量（拷贝，预处理缓冲会被下一张覆盖）"""
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"[量化] 图像读取失败: {path}")
+            continue
+        yield path, preprocessor.prepare_image(image).tensor.copy()
+
+
+class YoloCalibrationReader:
+    """onnxruntime.quantization 的校准数据读取器，输入为与推理完全一致的预处理张量"""
+
+    def __init__(self, input_name: str, paths: list, input_size: int):
+        self.input_name = input_name
+        self.tensors = load_tensors(paths, FramePreprocessor(input_size=input_size, square=True))
+
+    def get_next(self):
+        item = next(self.tensors, None)
+        return None if item is None else {self.input_name: item[1]}
+
+
+def quantize_onnx_int8(fp32_path: str, int8_path: str, calibration: list, input_size: int):
+    """ONNX 模型训练后静态量化（QDQ 格式，权重按通道对称 INT8，激活 UINT8）"""
+    import onnxruntime
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if len(calibration) < INT8_CALIB_MIN_IMAGES:
+        raise RuntimeError(f"校准图像不足: {len(calibration)} 张，至少需要 {INT8_CALIB_MIN_IMAGES} 张")
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    prepared_path = int8_path + ".prep.onnx"
+    print(f"[量化] 使用 {len(calibration)} 张图像校准: {int8_path}")
+    start = time.perf_counter()
+    quant_pre_process(fp32_path, prepared_path)
+    try:
+        quantize_static(prepared_path, int8_path,
+                        YoloCalibrationReader(input_name, calibration, input_size),
+                        quant_format=QuantFormat.QDQ,
+                        per_channel=True,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax)
+    finally:
+        if os.path.exists(prepared_path):
+            os.remove(prepared_path)
+    # 保留 ultralytics 写入的元数据（任务类型、类别、步长等），加载时据此识别模型
+    import onnx
+    source = onnx.load(fp32_path)
+    target = onnx.load(int8_path)
+    del target.metadata_props[:]
+    target.metadata_props.extend(source.metadata_props)
+    onnx.save(target, int8_path)
+    print(f"[量化] 量化完成，耗时 {time.perf_counter() - start:.1f} s")
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 4) 与 (M, 4) 的两两 IoU"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def average_precision(matched: list, scores: list, reference_count: int) -> float:
+    """全点插值 AP：matched 为各预测是否命中参考框"""
+    if reference_count == 0:
+        return float("nan")
+    if not scores:
+        return 0.0
+    order = np.argsort(-np.asarray(scores))
+    hits = np.asarray(matched, dtype=np.float64)[order]
+    true_positive = np.cumsum(hits)
+    precision = true_positive / np.arange(1, len(hits) + 1)
+    recall = true_positive / reference_count
+    # 精度包络后按召回率积分
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    recall = np.concatenate(([0.0], recall))
+    return float(np.sum((recall[1:] - recall[:-1]) * precision))
+
+
+def compare_models(reference, candidate, holdout: list, input_size: int) -> dict:
+    """
+    以 FP32 模型（reference）的结果为参考标注，统计 INT8 模型（candidate）在留出集上的：
+    mAP50（按类别平均）、匹配目标的平均掩码 IoU、平均单帧推理耗时。模型均为 ultralytics YOLO。
+    """
+    import torch
+    preprocessor = FramePreprocessor(input_size=input_size, square=True)
+    per_class = {}
+    mask_ious = []
+    timings = {"fp32": [], "int8": []}
+    image_count = 0
+    for _, tensor in load_tensors(holdout, preprocessor):
+        image_count += 1
+        outputs = {}
+        for key, model in (("fp32", reference), ("int8", candidate)):
+            start = time.perf_counter()
+            outputs[key] = model(torch.from_numpy(tensor), conf=0.25, iou=0.45, verbose=False)[0]
+            timings[key].append((time.perf_counter() - start) * 1000)
+        ref_boxes = outputs["fp32"].boxes.data.cpu().numpy()
+        cand_boxes = outputs["int8"].boxes.data.cpu().numpy()
+        ref_masks = outputs["fp32"].masks.data.cpu().numpy() > 0.5 if outputs["fp32"].masks is not None else None
+        cand_masks = outputs["int8"].masks.data.cpu().numpy() > 0.5 if outputs["int8"].masks is not None else None
+        for cls_id in np.unique(np.concatenate((ref_boxes[:, 5], cand_boxes[:, 5]))):
+            stats = per_class.setdefault(int(cls_id), {"matched": [], "scores": [], "reference": 0})
+            ref_index = np.flatnonzero(ref_boxes[:, 5] == cls_id)
+            cand_index = np.flatnonzero(cand_boxes[:, 5] == cls_id)
+            stats["reference"] += len(ref_index)
+            used = set()
+            ious = box_iou(cand_boxes[cand_index, :4], ref_boxes[ref_index, :4]) if len(ref_index) else None
+            # 按置信度从高到低贪心匹配
+            for order in np.argsort(-cand_boxes[cand_index, 4]):
+                candidate_row = cand_index[order]
+                hit = False
+                if ious is not None:
+                    for ref_order in np.argsort(-ious[order]):
+                        if ious[order, ref_order] < INT8_MATCH_IOU:
+                            break
+                        if ref_order in used:
+                            continue
+                        used.add(ref_order)
+                        hit = True
+                        if ref_masks is not None and cand_masks is not None:
+                            a = cand_masks[candidate_row]
+                            b = ref_masks[ref_index[ref_order]]
+                            union = np.logical_or(a, b).sum()
+                            mask_ious.append(float(np.logical_and(a, b).sum() / union) if union else 1.0)
+                        break
+                stats["matched"].append(hit)
+                stats["scores"].append(float(cand_boxes[candidate_row, 4]))
+
+    class_ap = {cls_id: average_precision(s["matched"], s["scores"], s["reference"]) for cls_id, s in per_class.items()}
+    valid_ap = [ap for ap in class_ap.values() if not np.isnan(ap)]
+    fp32_ms = float(np.mean(timings["fp32"])) if timings["fp32"] else 0.0
+    int8_ms = float(np.mean(timings["int8"])) if timings["int8"] else 0.0
+    return {
+        "images": image_count,
+        "map50": float(np.mean(valid_ap)) if valid_ap else float("nan"),
+        "class_ap50": {str(cls_id): ap for cls_id, ap in class_ap.items()},
+        "mask_iou": float(np.mean(mask_ious)) if mask_ious else float("nan"),
+        "fp32_ms": fp32_ms,
+        "int8_ms": int8_ms,
+        "speedup": fp32_ms / int8_ms if int8_ms else 0.0,
+    }
+
+
+def print_report(report: dict):
+    print(f"[量化] INT8 精度对比（{report['images']} 张留出图像，以 FP32 结果为参考）：")
+    print(f"  mAP50 = {report['map50']:.3f}，掩码 IoU = {report['mask_iou']:.3f}")
+    for cls_id, ap in report["class_ap50"].items():
+        print(f"  类别 {cls_id}: AP50 = {ap:.3f}")
+    print(f"  单帧耗时 FP32 {report['fp32_ms']:.1f} ms，INT8 {report['int8_ms']:.1f} ms，加速 {report['speedup']:.2f}x")
+
+
+def write_report(report: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    from inference_backend import OnnxInt8YoloBackend
+
+    parser = argparse.ArgumentParser(description="YOLO 模型 INT8 量化与精度对比")
+    parser.add_argument("--model", required=True, help=".pt 权重路径")
+    parser.add_argument("--images", required=True, help="校准与留出图像目录（如 images/src）")
+    parser.add_argument("--force", action="store_true", help="忽略校准清单与缓存，按当前图像目录重新切分并量化")
+    args = parser.parse_args()
+
+    backend = OnnxInt8YoloBackend(args.model, calibration_dir=args.images, force=args.force)
+    cached = os.path.exists(backend.artifact_path())
+    if args.force and cached:
+        os.remove(backend.artifact_path())
+        cached = False
+    # 新量化时 load 内已完成精度对比
+    backend.load()
+    if cached:
+        backend.evaluate()
+
+
+if __name__ == "__main__":
+    main()
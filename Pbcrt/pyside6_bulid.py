@@ -9,6 +9,10 @@ def main():
         '--distpath', type=str, default='output',
         help='指定可执行文件输出目录 (默认: output)'
     )
+    parser.add_argument(
+        '--onedir', action='store_true',
+        help='打包为目录而非单个可执行文件，免去单文件模式每次启动时的解包耗时'
+    )
     args = parser.parse_args()
 
     # 确保输出目录存在
@@ -21,7 +25,7 @@ def main():
         '--name=PvSegApp',
         '--windowed',
         '--noconfirm',
-        '--onefile',
+        '--onedir' if args.onedir else '--onefile',
         '--icon=cache/pv_icon.png',
         '--add-data=images;images',
         '--add-data=model;model',
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# 近重复帧结果缓存：帧签名为模型输入张量各通道按 FRAME_CACHE_CELL_SIZE 见方的小块求均值得到的缩略图，
+# 与缓存帧签名逐块比较，最大绝对差（0~1）低于 FRAME_CACHE_THRESHOLD 时才复用其推理结果，
+# 任一小块出现明显变化（如新出现的小缺陷）即不命中。
+# 缓存默认关闭（界面配置 USER_FRAME_CACHE_SIZE 为 0），只建议用于静止画面
+FRAME_CACHE_SIZE = 32
+FRAME_CACHE_THRESHOLD = 0.03
+FRAME_CACHE_CELL_SIZE = 8
+# 单条缓存的最长复用时间与最多命中次数，超过后重新推理，避免长期沿用旧结果
+FRAME_CACHE_MAX_AGE_S = 2.0
+FRAME_CACHE_MAX_HITS = 30
+
+
+class CacheEntry:
+    __slots__ = ("shape", "signature", "result", "created", "hits")
+
+    def __init__(self, shape: tuple, signature: np.ndarray, result):
+        self.shape = shape
+        self.signature = signature
+        self.result = result
+        self.created = time.monotonic()
+        self.hits = 0
+
+
+class FrameResultCache:
+    """
+    推理结果的 LRU 缓存，按帧签名的相似度命中，可由多个推理线程共享。
+    缓存内容为张量坐标系下的推理结果，命中帧与缓存帧的张量尺寸相同，可直接按命中帧的 letterbox 参数绘制。
+    """
+
+    def __init__(self, max_entries: int = FRAME_CACHE_SIZE, threshold: float = FRAME_CACHE_THRESHOLD,
+                 max_age_s: float = FRAME_CACHE_MAX_AGE_S, max_hits: int = FRAME_CACHE_MAX_HITS):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_age_s = max_age_s
+        self.max_hits = max_hits
+        self.entries = OrderedDict()  # 序号 -> CacheEntry
+        self.next_key = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(tensor: np.ndarray) -> np.ndarray:
+        """tensor 为单帧 3xHxW 输入张量，返回 3x(H/块)x(W/块) 的 float32 签名"""
+        height, width = tensor.shape[1:]
+        size = (max(1, width // FRAME_CACHE_CELL_SIZE), max(1, height // FRAME_CACHE_CELL_SIZE))
+        return np.stack([cv2.resize(channel, size, interpolation=cv2.INTER_AREA) for channel in tensor])
+
+    def lookup(self, shape: tuple, signature: np.ndarray):
+        """返回最相似且各小块差异均低于阈值的缓存结果，未命中返回 None；超龄或命中次数用尽的条目被移除"""
+        now = time.monotonic()
+        with self.lock:
+            best_key = None
+            best_diff = self.threshold
+            for key, entry in list(self.entries.items()):
+                if now - entry.created > self.max_age_s or entry.hits >= self.max_hits:
+                    del self.entries[key]
+                    continue
+                if entry.shape != shape:
+                    continue
+                diff = float(np.abs(signature - entry.signature).max())
+                if diff < best_diff:
+                    best_key, best_diff = key, diff
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = self.entries[best_key]
+            entry.hits += 1
+            self.entries.move_to_end(best_key)
+            return entry.result
+
+    def store(self, shape: tuple, signature: np.ndarray, result):
+        with self.lock:
+            self.entries[self.next_key] = CacheEntry(shape, signature, result)
+            self.next_key += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        with self.lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0.0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,65 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+
+# 启动计时起点：由 MainWindow_Back 最先导入本模块，各阶段以相对该时刻的毫秒数记录
+STARTUP_T0 = time.perf_counter()
+STARTUP_WALL_T0 = time.time()
+
+
+class StartupTimer:
+    """
+    启动阶段计时：界面线程与推理线程均可调用 mark 记录阶段完成时刻，全部就绪后 report 打印并追加到报告文件，
+    便于对比各版本的启动耗时。单个模块的导入耗时可用 python -X importtime MainWindow_Back.py 查看。
+    """
+
+    def __init__(self):
+        self.marks = []  # [(阶段, 线程名, 相对起点 ms)]
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def mark(self, stage: str):
+        elapsed_ms = (time.perf_counter() - STARTUP_T0) * 1000
+        with self.lock:
+            self.marks.append((stage, threading.current_thread().name, elapsed_ms))
+
+    @staticmethod
+    def process_age_ms():
+        """起点之前进程已运行的时间（解释器启动、PyInstaller 单文件解包），需要 psutil，未安装时为 None"""
+        if importlib.util.find_spec("psutil") is None:
+            return None
+        import psutil
+        return max(0.0, (STARTUP_WALL_T0 - psutil.Process().create_time()) * 1000)
+
+    def report(self, path: str = None):
+        """打印各阶段耗时；path 不为空时以 JSON 行追加到报告文件。只报告一次"""
+        with self.lock:
+            if self.reported:
+                return
+            self.reported = True
+            marks = sorted(self.marks, key=lambda item: item[2])
+        pre_start_ms = self.process_age_ms()
+        print("[启动] 启动耗时（相对主模块开始导入）：")
+        if pre_start_ms is not None:
+            print(f"  进程启动到主模块导入（含解包）: {pre_start_ms:.0f} ms")
+        for stage, thread_name, elapsed_ms in marks:
+            print(f"  {elapsed_ms:8.0f} ms  [{thread_name}] {stage}")
+        if not path:
+            return
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(STARTUP_WALL_T0)),
+            "pre_start_ms": pre_start_ms,
+            "stages": [{"stage": stage, "thread": thread_name, "ms": round(elapsed_ms, 1)}
+                       for stage, thread_name, elapsed_ms in marks],
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[启动] 启动耗时报告写入失败: {e}")
+
+
+startup_timer = StartupTimer()
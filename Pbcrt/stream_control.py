@@ -0,0 +1,161 @@
+import time
+from collections import deque
+
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+
+# 连续采集时设备最多可超前发送的帧数（信用窗口）
+STREAM_CREDIT_WINDOW = 3
+# 统计刷新周期
+STREAM_STATS_INTERVAL_MS = 1000
+# 信用重同步：推流中某设备超过该时间没有任何帧到达、且上位机没有该设备的待处理帧时，
+# 认为信用已在传输中丢失（信用包或整帧丢失），重新发送推流开始包将设备信用重置为完整窗口
+STREAM_CREDIT_RESYNC_MS = 2000
+
+
+class FrameStreamController(QObject):
+    """
+    连续采集的流控：
+    - 信用窗口：设备每发送一帧消耗一个信用，上位机每处理或丢弃一帧归还一个信用；
+    - 最新帧优先：推理跟不上时每个设备只保留最新到达的一帧，旧帧直接归还缓冲并计入丢帧；
+    - 实时统计帧率与延迟（从首包到达至处理完成）；
+    - 信用重同步：设备长时间无帧且上位机未持有其帧时，经 credit_resync 回调把设备信用重置为完整窗口。
+    非连续模式下帧直接转发，不做流控。
+    丢帧分两类：到达流控之前丢弃的帧调用 on_frame_dropped，已由流控发出后在下游丢弃的帧调用 frame_dropped。
+    """
+    frameReady = Signal(object, int, int, int)
+    statsUpdated = Signal(float, float, int)  # 帧率, 平均延迟 ms, 累计丢帧数
+
+    def __init__(self, credit_window: int = STREAM_CREDIT_WINDOW, parent=None):
+        super().__init__(parent)
+        self.credit_window = credit_window
+        # 归还信用的回调，参数为 (设备标识, 信用数量)，由界面按当前网络模式设置
+        self.credit_sender = None
+        # 重置设备信用的回调，参数为 (设备标识, 信用数量)，设备以该值覆盖当前信用
+        self.credit_resync = None
+        self.resync_ms = STREAM_CREDIT_RESYNC_MS
+        # 为 True 时帧发出后不立即视为处理完成，由下游处理结束后调用 frame_done（丢弃时调用 frame_dropped）
+        self.deferred_done = False
+        self.streaming = False
+        # 各设备待处理的最新帧
+        self.pending = {}
+        # 各设备已发出、尚未处理完成的帧数，以及最近一次有帧到达、丢弃或处理完成的时间
+        self.in_process = {}
+        self.last_seen = {}
+        self.dispatch_scheduled = False
+        self.done_times = deque()
+        self.latency_sum_ms = 0.0
+        self.latency_count = 0
+        self.dropped_count = 0
+
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.report_stats)
+
+    def start(self, devices=()):
+        """devices 为推流设备标识，尚未收到任何帧的设备同样参与信用重同步"""
+        self.streaming = True
+        self.in_process.clear()
+        now = time.monotonic()
+        self.last_seen = dict.fromkeys(devices, now)
+        self.done_times.clear()
+        self.latency_sum_ms = 0.0
+        self.latency_count = 0
+        self.dropped_count = 0
+        self.stats_timer.start(STREAM_STATS_INTERVAL_MS)
+
+    def stop(self):
+        self.streaming = False
+        self.stats_timer.stop()
+        for frame, _, _, _ in self.pending.values():
+            frame.release()
+        self.pending.clear()
+
+    @Slot(object, int, int, int)
+    def on_frame(self, frame, w: int, h: int, img_type: int):
+        if not self.streaming:
+            self.frameReady.emit(frame, w, h, img_type)
+            return
+        self.last_seen[frame.device] = time.monotonic()
+        previous = self.pending.get(frame.device)
+        if previous is not None:
+            # 最新帧优先：同一设备未处理的旧帧直接丢弃
+            previous[0].release()
+            self.dropped_count += 1
+            self.return_credit(frame.device)
+        self.pending[frame.device] = (frame, w, h, img_type)
+        if not self.dispatch_scheduled:
+            self.dispatch_scheduled = True
+            # 排在已投递的帧信号之后执行，积压的帧只会处理最后一个
+            QTimer.singleShot(0, self.dispatch_pending)
+
+    @Slot(object)
+    def on_frame_dropped(self, device):
+        """上游（如解码）丢弃的帧不会到达流控，同样计入丢帧并归还信用"""
+        if self.streaming:
+            self.last_seen[device] = time.monotonic()
+            self.dropped_count += 1
+            self.return_credit(device)
+
+    @Slot(object)
+    def frame_dropped(self, device):
+        """已发出的帧在下游（推理队列、残缺帧过滤）被丢弃"""
+        if self.streaming:
+            self.finish_in_process(device)
+            self.dropped_count += 1
+            self.return_credit(device)
+
+    def finish_in_process(self, device):
+        # 处理结束也视为设备活动，避免推理耗时较长时误触发重同步
+        self.last_seen[device] = time.monotonic()
+        count = self.in_process.get(device, 0)
+        if count > 0:
+            self.in_process[device] = count - 1
+
+    def dispatch_pending(self):
+        self.dispatch_scheduled = False
+        # 依次处理各设备的最新帧
+        while self.pending:
+            device, (frame, w, h, img_type) = next(iter(self.pending.items()))
+            del self.pending[device]
+            timestamp = frame.timestamp
+            if self.deferred_done:
+                self.in_process[device] = self.in_process.get(device, 0) + 1
+            self.frameReady.emit(frame, w, h, img_type)
+            if not self.deferred_done:
+                self.frame_done(device, timestamp)
+
+    @Slot(object, float)
+    def frame_done(self, device, timestamp: float):
+        now = time.monotonic()
+        self.done_times.append(now)
+        self.latency_sum_ms += (now - timestamp) * 1000
+        self.latency_count += 1
+        if self.streaming:
+            self.finish_in_process(device)
+            self.return_credit(device)
+
+    def return_credit(self, device, count: int = 1):
+        if self.credit_sender is not None:
+            self.credit_sender(device, count)
+
+    def report_stats(self):
+        now = time.monotonic()
+        while self.done_times and now - self.done_times[0] > 1.0:
+            self.done_times.popleft()
+        fps = float(len(self.done_times))
+        latency = self.latency_sum_ms / self.latency_count if self.latency_count else 0.0
+        self.latency_sum_ms = 0.0
+        self.latency_count = 0
+        self.statsUpdated.emit(fps, latency, self.dropped_count)
+        self.resync_credits(now)
+
+    def resync_credits(self, now: float):
+        if self.credit_resync is None or not self.streaming:
+            return
+        for device, seen in self.last_seen.items():
+            if device in self.pending or self.in_process.get(device, 0) > 0:
+                continue
+            if (now - seen) * 1000 < self.resync_ms:
+                continue
+            print(f"[流控] 设备 {device} 超过 {self.resync_ms} ms 无帧，重置信用为 {self.credit_window}")
+            self.last_seen[device] = now
+            self.credit_resync(device, self.credit_window)
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# 各模块以 Pbcrt 目录为导入根（与 MainWindow_Back.py 相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PySide6.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
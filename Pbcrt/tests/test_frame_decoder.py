@@ -0,0 +1,60 @@
+from fractions import Fraction
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+av = pytest.importorskip("av")
+
+from frame_decoder import FrameDecoder, H264StreamDecoder, h264_frame_info  # noqa: E402
+
+SIZE = 64
+GOP = 4
+
+
+@pytest.fixture(scope="module")
+def access_units():
+    """每帧灰度不同的 H.264 码流，每个访问单元一个数据包"""
+    encoder = av.CodecContext.create("libx264", "w")
+    encoder.width = encoder.height = SIZE
+    encoder.pix_fmt = "yuv420p"
+    encoder.time_base = Fraction(1, 25)
+    encoder.gop_size = GOP
+    encoder.options = {"tune": "zerolatency", "bframes": "0", "keyint_min": str(GOP)}
+    packets = []
+    for i in range(8):
+        image = np.full((SIZE, SIZE, 3), 20 + i * 25, dtype=np.uint8)
+        frame = av.VideoFrame.from_ndarray(image, format="bgr24")
+        frame.pts = i
+        packets.extend(bytes(packet) for packet in encoder.encode(frame))
+    packets.extend(bytes(packet) for packet in encoder.encode(None))
+    assert len(packets) == 8
+    return packets
+
+
+def test_frame_info_finds_idr(access_units):
+    assert [h264_frame_info(unit)[0] for unit in access_units] == [i % GOP == 0 for i in range(8)]
+
+
+def test_outputs_are_paired_with_their_input(access_units):
+    decoder = H264StreamDecoder()
+    decoded = []
+    for i, unit in enumerate(access_units):
+        decoded.extend(decoder.decode(unit, i))
+    assert [info for info, _ in decoded] == list(range(8))
+    for info, image in decoded:
+        assert abs(float(image.mean()) - (20 + info * 25)) < 8
+    assert decoder.take_stale(0) == []
+
+
+def test_backlog_skips_to_next_idr(qapp, access_units):
+    decoder = FrameDecoder(max_pending=1)
+    device = "dev"
+    frames = [SimpleNamespace(device=device, view=unit) for unit in access_units]
+    assert decoder.admit_h264(frames[0])
+    # 积压已满：丢弃并等待下一个 IDR
+    assert not decoder.admit_h264(frames[1])
+    decoder.h264_pending[device] = 0
+    assert not decoder.admit_h264(frames[2])
+    assert decoder.admit_h264(frames[GOP])
+    decoder.close()
@@ -0,0 +1,24 @@
+from frame_pool import FrameBufferPool
+
+
+def test_pinned_buffer_returns_after_unpin():
+    pool = FrameBufferPool()
+    lease = pool.acquire_size(16)
+    buffer = lease.buffer
+    lease.pin()
+    lease.release()
+    lease.release()
+    assert lease.buffer is buffer and not pool.free_map.get(16)
+    lease.unpin()
+    lease.unpin()
+    assert pool.free_map[16] == [buffer] and lease.buffer is None
+
+
+def test_unpin_before_release():
+    pool = FrameBufferPool()
+    lease = pool.acquire_size(16)
+    lease.pin()
+    lease.unpin()
+    assert not pool.free_map.get(16)
+    lease.release()
+    assert len(pool.free_map[16]) == 1
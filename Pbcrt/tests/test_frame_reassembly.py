@@ -0,0 +1,109 @@
+from frame_pool import FrameBufferPool
+from frame_reassembly import ReassemblyWindow, PACK_DATA_SIZE
+from ive_image_converter import IVEImageType
+
+# 64x32 灰度图，每帧 2 个包
+W, H = 64, 32
+IMG_TYPE = IVEImageType.U8C1
+COUNT = 2
+
+
+def payload(value: int) -> bytes:
+    return bytes([value]) * PACK_DATA_SIZE
+
+
+def add(window: ReassemblyWindow, frame_id, index: int, value: int):
+    return window.add_packet(frame_id, index, COUNT, W, H, IMG_TYPE, payload(value), PACK_DATA_SIZE)
+
+
+def test_out_of_order_frames_complete():
+    window = ReassemblyWindow(FrameBufferPool(), max_frames=4)
+    assert add(window, 1, 0, 0x01) is None
+    assert add(window, 2, 0, 0x02) is None
+    buf = add(window, 2, 1, 0x02)
+    assert buf.frame_id == 2 and bytes(buf.data) == bytes([0x02]) * (W * H)
+    buf = add(window, 1, 1, 0x01)
+    assert buf.frame_id == 1 and bytes(buf.data) == bytes([0x01]) * (W * H)
+    assert window.completed_count == 2 and not window.frames
+
+
+def test_late_packet_does_not_reopen_frame():
+    window = ReassemblyWindow(FrameBufferPool())
+    add(window, 1, 0, 0x01)
+    assert add(window, 1, 1, 0x01) is not None
+    assert add(window, 1, 1, 0x01) is None
+    assert window.late_packet_count == 1 and not window.frames
+
+
+def test_evicted_frame_is_reported_as_dropped():
+    window = ReassemblyWindow(FrameBufferPool(), max_frames=2)
+    add(window, 1, 0, 0x01)
+    add(window, 2, 0, 0x02)
+    assert window.take_dropped() == []
+    add(window, 3, 0, 0x03)
+    dropped = window.take_dropped()
+    assert [buf.frame_id for buf in dropped] == [1]
+    assert dropped[0].lease is None
+    assert window.take_dropped() == []
+    assert list(window.frames) == [2, 3]
+
+
+def test_expire_returns_stale_frames():
+    window = ReassemblyWindow(FrameBufferPool(), timeout_ms=100)
+    add(window, 1, 0, 0x01)
+    opened = window.frames[1].last_update
+    assert window.expire(opened + 0.05) == []
+    expired = window.expire(opened + 0.2)
+    assert [buf.frame_id for buf in expired] == [1]
+    assert not window.frames
+
+
+def add_legacy(window: ReassemblyWindow, index: int, value: int):
+    frame_id = window.legacy_frame_id(index, COUNT, W, H, IMG_TYPE)
+    if frame_id is None:
+        return None
+    return add(window, frame_id, index, value)
+
+
+def test_legacy_reordered_packet_is_not_mixed_into_next_frame():
+    window = ReassemblyWindow(FrameBufferPool())
+    assert add_legacy(window, 0, 0x0A) is None
+    # B0 开始新的一帧，未收齐的 A 被丢弃
+    assert add_legacy(window, 0, 0x0B) is None
+    assert len(window.take_dropped()) == 1
+    # 迟到的 A1 无法判断归属，丢弃
+    assert add_legacy(window, 1, 0x0A) is None
+    assert window.ambiguous_packet_count == 1
+    assert len(window.frames) == 1
+    buf = next(iter(window.frames.values()))
+    assert buf.missing_packets() == [1]
+    assert bytes(buf.data[:PACK_DATA_SIZE]) == payload(0x0B)
+
+
+def test_legacy_in_order_frames_complete():
+    window = ReassemblyWindow(FrameBufferPool())
+    for value in (0x01, 0x02):
+        assert add_legacy(window, 0, value) is None
+        buf = add_legacy(window, 1, value)
+        assert bytes(buf.data) == bytes([value]) * (W * H)
+    assert window.take_dropped() == [] and window.ambiguous_packet_count == 0
+
+
+def test_partial_frame_concealed_from_previous_delivered_frame():
+    from device_session import DeviceSession
+    pool = FrameBufferPool()
+    session = DeviceSession("dev", ("127.0.0.1", 0), pool)
+    window = session.reassembly
+    add(window, 1, 0, 0x01)
+    previous = add(window, 1, 1, 0x02)
+    session.remember_frame(previous.lease)
+    # 下游处理完归还，缓冲区仍由会话保留
+    previous.lease.release()
+    add(window, 2, 0, 0x03)
+    buf, = window.take_partial(0, 1.0)
+    buf.conceal(session.last_frame())
+    assert bytes(buf.data) == payload(0x03) + payload(0x02)
+    session.remember_frame(buf.lease)
+    assert previous.lease.buffer is None
+    session.forget_frame()
+    assert session.last_lease is None
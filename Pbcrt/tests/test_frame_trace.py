@@ -0,0 +1,14 @@
+from frame_trace import FrameTrace, FrameTracer, STAGE_DECODE, EVENT_FRAME_RECEIVED
+
+
+def test_event_counts_in_metrics():
+    tracer = FrameTracer(window=10)
+    tracer.count(EVENT_FRAME_RECEIVED)
+    tracer.count(EVENT_FRAME_RECEIVED, 2)
+    trace = FrameTrace()
+    trace.mark(STAGE_DECODE)
+    tracer.record(trace)
+    assert tracer.event_counts() == {EVENT_FRAME_RECEIVED: 3}
+    text = tracer.prometheus_text()
+    assert f'pbcrt_frame_events_total{{event="{EVENT_FRAME_RECEIVED}"}} 3' in text
+    assert 'pbcrt_frame_stage_latency_ms_count{stage="decode"} 1' in text
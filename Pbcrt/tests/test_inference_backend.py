@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import inference_backend
+from inference_backend import OnnxInt8YoloBackend, export_lock
+from model_quantization import write_manifest
+
+
+def test_export_lock_serialises_builders(tmp_path):
+    artifact = str(tmp_path / "cache" / "model.onnx")
+    builds = []
+
+    def load():
+        if not os.path.exists(artifact):
+            with export_lock(artifact):
+                if not os.path.exists(artifact):
+                    builds.append(threading.current_thread().name)
+                    time.sleep(0.05)
+                    with open(artifact, "wb") as f:
+                        f.write(b"model")
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert not os.path.exists(artifact + ".lock")
+
+
+def test_export_lock_removes_stale_lock_file(tmp_path, monkeypatch):
+    artifact = str(tmp_path / "model.onnx")
+    open(artifact + ".lock", "w").close()
+    monkeypatch.setattr(inference_backend, "EXPORT_LOCK_STALE_S", -1)
+    with export_lock(artifact):
+        assert os.path.exists(artifact + ".lock")
+    assert not os.path.exists(artifact + ".lock")
+
+
+def add_images(image_dir, start, count):
+    image_dir.mkdir(exist_ok=True)
+    for i in range(start, start + count):
+        (image_dir / f"img{i:04d}.jpg").write_bytes(b"x" * (i + 1))
+
+
+def make_int8_backend(tmp_path, force=False):
+    model_path = tmp_path / "model.pt"
+    if not model_path.exists():
+        model_path.write_bytes(b"weights")
+    return OnnxInt8YoloBackend(str(model_path), calibration_dir=str(tmp_path / "src"), force=force)
+
+
+def test_int8_calibration_frozen_by_manifest(tmp_path):
+    add_images(tmp_path / "src", 0, 30)
+    first = make_int8_backend(tmp_path)
+    artifact = first.artifact_path()
+    os.makedirs(os.path.dirname(artifact))
+    write_manifest(first.manifest, first.manifest_path())
+
+    # 原图目录继续增长，清单不变则量化模型路径不变
+    add_images(tmp_path / "src", 30, 10)
+    restarted = make_int8_backend(tmp_path)
+    assert restarted.artifact_path() == artifact
+    assert restarted.calibration == first.calibration and restarted.holdout == first.holdout
+
+    forced = make_int8_backend(tmp_path, force=True)
+    assert forced.artifact_path() != artifact
+    assert len(forced.calibration) > len(first.calibration)
+
+
+def test_int8_remove_superseded_keeps_current(tmp_path):
+    add_images(tmp_path / "src", 0, 30)
+    backend = make_int8_backend(tmp_path)
+    artifact = backend.artifact_path()
+    cache_dir = os.path.dirname(artifact)
+    os.makedirs(cache_dir)
+    prefix = backend.fp32.artifact_path()[:-len(".onnx")]
+    stale = [prefix + "-int8-deadbeef.onnx", prefix + "-int8-deadbeef.onnx.report.json"]
+    kept = [artifact, artifact + ".report.json", backend.fp32.artifact_path(), backend.manifest_path()]
+    for path in stale + kept:
+        open(path, "w").close()
+    backend.remove_superseded(artifact)
+    assert not any(os.path.exists(path) for path in stale)
+    assert all(os.path.exists(path) for path in kept)
@@ -0,0 +1,35 @@
+import threading
+from types import SimpleNamespace
+
+from frame_trace import FrameTrace
+from inference_worker import InferencePool
+
+
+def make_frame(name):
+    frame = SimpleNamespace(device=name, timestamp=0.0, trace=FrameTrace(), released=False)
+    frame.release = lambda: setattr(frame, "released", True)
+    return frame
+
+
+def test_frames_before_model_ready_use_backlog_bound(qapp):
+    loaded = threading.Event()
+
+    def task_factory():
+        loaded.wait(5)
+        raise RuntimeError("no model")
+
+    pool = InferencePool(task_factory, workers=1, queue_size=2, max_batch=1, backlog_size=5)
+    dropped = []
+    pool.frameDropped.connect(dropped.append)
+    try:
+        frames = [make_frame(f"f{i}") for i in range(7)]
+        for frame in frames:
+            pool.submit(frame, 1, 1, 0)
+        # 加载期间保留 backlog_size 帧，超出部分按丢弃最旧策略丢弃并单独计数
+        assert pool.pending_count() == 5
+        assert pool.backlog_dropped_count == 2 and pool.dropped_count == 2
+        assert [frame.released for frame in frames] == [True, True] + [False] * 5
+        assert dropped == ["f0", "f1"]
+    finally:
+        loaded.set()
+        pool.close()
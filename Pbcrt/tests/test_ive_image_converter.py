@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from ive_image_converter import IVEImageType, IVEImageTypeConvert
+
+W, H = 32, 16
+
+
+@pytest.fixture
+def bgr():
+    # 平滑渐变，YUV 色度下采样后误差较小
+    x = np.linspace(0, 255, W, dtype=np.float32)
+    y = np.linspace(0, 255, H, dtype=np.float32)[:, None]
+    return np.dstack([np.broadcast_to(x, (H, W)), np.broadcast_to(y, (H, W)),
+                      np.full((H, W), 96, np.float32)]).astype(np.uint8)
+
+
+@pytest.mark.parametrize("img_type", [IVEImageType.U8C3_PACKAGE, IVEImageType.U8C3_PLANAR])
+def test_color_roundtrip_is_exact(bgr, img_type):
+    data = IVEImageTypeConvert.from_bgr(bgr, img_type)
+    assert np.array_equal(IVEImageTypeConvert.convert(data, W, H, img_type), bgr)
+
+
+def test_gray_roundtrip(bgr):
+    data = IVEImageTypeConvert.from_bgr(bgr, IVEImageType.U8C1)
+    out = IVEImageTypeConvert.convert(data, W, H, IVEImageType.U8C1)
+    gray = np.frombuffer(data, dtype=np.uint8).reshape(H, W)
+    assert out.shape == (H, W, 3) and all(np.array_equal(out[:, :, c], gray) for c in range(3))
+
+
+@pytest.mark.parametrize("img_type", [IVEImageType.YUV420SP, IVEImageType.YUV420P,
+                                      IVEImageType.YUV422SP, IVEImageType.YUV422P])
+def test_yuv_roundtrip_is_close(bgr, img_type):
+    data = IVEImageTypeConvert.from_bgr(bgr, img_type)
+    assert len(data) == IVEImageTypeConvert.frame_size(W, H, img_type)
+    out = IVEImageTypeConvert.convert(data, W, H, img_type)
+    assert np.abs(out.astype(np.int16) - bgr).max() <= 12
+
+
+@pytest.mark.parametrize("img_type", [IVEImageType.S16C1, IVEImageType.U16C1, IVEImageType.S32C1,
+                                      IVEImageType.U32C1, IVEImageType.S64C1, IVEImageType.U64C1])
+def test_wide_types_keep_gray_order(bgr, img_type):
+    data = IVEImageTypeConvert.from_bgr(bgr, img_type)
+    out = IVEImageTypeConvert.convert(data, W, H, img_type)[:, :, 0].astype(np.int16)
+    # 按抽样百分位拉伸后仍保持灰度单调：左上最暗、右下最亮
+    assert out[0, 0] < out[H // 2, W // 2] < out[-1, -1]
+
+
+def test_dst_is_reused(bgr):
+    dst = np.empty((H, W, 3), dtype=np.uint8)
+    data = IVEImageTypeConvert.from_bgr(bgr, IVEImageType.U8C3_PLANAR)
+    assert IVEImageTypeConvert.convert(data, W, H, IVEImageType.U8C3_PLANAR, dst) is dst
+
+
+def test_unsupported_type_raises():
+    with pytest.raises(ValueError):
+        IVEImageTypeConvert.convert(bytes(W * H * 3), W, H, IVEImageType.BUTT)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from result_cache import FrameResultCache
+
+SHAPE = (3, 384, 640)
+
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(0).random(SHAPE, dtype=np.float32)
+
+
+def store(cache: FrameResultCache, tensor: np.ndarray, result="cached"):
+    cache.store(tensor.shape, cache.signature(tensor), result)
+
+
+def lookup(cache: FrameResultCache, tensor: np.ndarray):
+    return cache.lookup(tensor.shape, cache.signature(tensor))
+
+
+def test_same_frame_hits(frame):
+    cache = FrameResultCache()
+    store(cache, frame)
+    noisy = frame + np.random.default_rng(1).normal(0, 0.005, SHAPE).astype(np.float32)
+    assert lookup(cache, noisy) == "cached"
+
+
+@pytest.mark.parametrize("size", [16, 32, 64])
+def test_local_change_misses(frame, size):
+    cache = FrameResultCache()
+    store(cache, frame)
+    changed = frame.copy()
+    changed[:, 203:203 + size, 301:301 + size] = 1.0
+    assert lookup(cache, changed) is None
+
+
+def test_entry_expires_after_max_hits(frame):
+    cache = FrameResultCache(max_hits=2)
+    store(cache, frame)
+    assert lookup(cache, frame) == "cached"
+    assert lookup(cache, frame) == "cached"
+    assert lookup(cache, frame) is None
+    assert not cache.entries
+
+
+def test_entry_expires_after_max_age(frame):
+    cache = FrameResultCache(max_age_s=0.0)
+    store(cache, frame)
+    assert lookup(cache, frame) is None
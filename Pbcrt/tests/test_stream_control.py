@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from stream_control import FrameStreamController
+
+
+def make_frame(device, timestamp=0.0):
+    return SimpleNamespace(device=device, timestamp=timestamp, release=lambda: None)
+
+
+@pytest.fixture
+def controller(qapp):
+    controller = FrameStreamController(3)
+    controller.deferred_done = True
+    controller.credits = []
+    controller.resyncs = []
+    controller.credit_sender = lambda device, count: controller.credits.append((device, count))
+    controller.credit_resync = lambda device, count: controller.resyncs.append((device, count))
+    yield controller
+    controller.stop()
+
+
+def test_every_frame_returns_one_credit(controller):
+    controller.start(["a"])
+    dispatched = []
+    controller.frameReady.connect(lambda frame, w, h, img_type: dispatched.append(frame))
+    # 两帧同时待处理：旧帧被最新帧替换并归还信用
+    controller.on_frame(make_frame("a"), 1, 1, 0)
+    controller.on_frame(make_frame("a"), 1, 1, 0)
+    assert controller.credits == [("a", 1)]
+    controller.dispatch_pending()
+    assert len(dispatched) == 1 and controller.in_process["a"] == 1
+    controller.frame_done("a", 0.0)
+    # 接收端丢弃的帧
+    controller.on_frame_dropped("a")
+    assert controller.credits == [("a", 1)] * 3
+    assert controller.in_process["a"] == 0 and controller.dropped_count == 2
+
+
+def test_downstream_drop_finishes_frame(controller):
+    controller.start(["a"])
+    controller.on_frame(make_frame("a"), 1, 1, 0)
+    controller.dispatch_pending()
+    controller.frame_dropped("a")
+    assert controller.in_process["a"] == 0 and controller.credits == [("a", 1)]
+
+
+def test_idle_device_credit_resync(controller):
+    controller.start(["a", "b"])
+    controller.on_frame(make_frame("b"), 1, 1, 0)
+    controller.dispatch_pending()
+    now = controller.last_seen["a"] + controller.resync_ms / 1000 + 0.1
+    controller.resync_credits(now)
+    # b 仍有帧在处理，不重置
+    assert controller.resyncs == [("a", 3)]
+    controller.resync_credits(now + 0.1)
+    assert controller.resyncs == [("a", 3)]
+
+
+def test_no_credit_when_not_streaming(controller):
+    controller.on_frame_dropped("a")
+    controller.frame_done("a", 0.0)
+    controller.resync_credits(1e9)
+    assert controller.credits == [] and controller.resyncs == []
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from TcpClient import BoundedFrameQueue, TcpClientWorker, GAIN_IMAG_ACK
+from ive_image_converter import IVEImageType
+
+
+def make_item(device):
+    lease = SimpleNamespace(device=device, released=False)
+    lease.release = lambda: setattr(lease, "released", True)
+    return (lease, 1, 1, 0)
+
+
+def test_full_queue_reports_dropped_frame():
+    dropped = []
+    queue = BoundedFrameQueue(2, dropped.append)
+    items = [make_item(f"dev{i}") for i in range(3)]
+    assert queue.put(items[0]) is True
+    assert queue.put(items[1]) is False
+    queue.put(items[2])
+    assert dropped == ["dev0"] and items[0][0].released
+    assert queue.dropped_count == 1
+    assert queue.get() is items[1] and queue.get() is items[2] and queue.get() is None
+
+
+class RecordingTransport:
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def is_closing(self):
+        return False
+
+
+def make_worker():
+    worker = TcpClientWorker("127.0.0.1", 0, "127.0.0.1", 0, pipeline_depth=2)
+    worker.transport = RecordingTransport()
+    return worker
+
+
+def complete_frame(worker):
+    lease = worker.frame_pool.acquire(4, 4, IVEImageType.U8C1)
+    worker.on_frame_complete(SimpleNamespace(lease=lease, width=4, height=4, type=IVEImageType.U8C1))
+
+
+def requests_sent(worker):
+    return worker.transport.written.count(worker._make_ack_packet(GAIN_IMAG_ACK))
+
+
+def test_requested_frames_retire_pipeline_slots(qapp):
+    worker = make_worker()
+    worker._queue_requests(3)
+    assert requests_sent(worker) == 2 and len(worker.in_flight) == 2
+    complete_frame(worker)
+    assert requests_sent(worker) == 3 and len(worker.in_flight) == 2
+    complete_frame(worker)
+    complete_frame(worker)
+    assert len(worker.in_flight) == 0 and worker.pending_requests == 0
+
+
+def test_streamed_frames_do_not_retire_requests(qapp):
+    worker = make_worker()
+    worker._queue_requests(3)
+    worker.stream_credits = 4
+    for _ in range(3):
+        complete_frame(worker)
+    assert requests_sent(worker) == 2 and len(worker.in_flight) == 2 and worker.pending_requests == 1
+
+
+def test_unrequested_frame_sends_no_request(qapp):
+    worker = make_worker()
+    complete_frame(worker)
+    assert worker.transport.written == [] and worker.frame_count == 1
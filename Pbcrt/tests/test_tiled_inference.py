@@ -0,0 +1,100 @@
+import numpy as np
+
+from tiled_inference import FULL_FRAME_SOURCE, merge_detections, union_masks, tile_grid
+
+WIDTH, HEIGHT = 1000, 640
+# 两块：左块 0~640，右块 360~1000，内部接缝为 x=640（左块右边界）与 x=360（右块左边界）
+TILES = tile_grid(WIDTH, HEIGHT, tile_size=640, overlap=0.2)
+
+
+def region(x, y, w, h):
+    return x, y, np.ones((h, w), dtype=bool)
+
+
+def box_region_of(box):
+    x0, y0, x1, y1 = (int(v) for v in box[:4])
+    return region(x0, y0, x1 - x0, y1 - y0)
+
+
+def merge(rows, sources):
+    boxes = np.array(rows, dtype=np.float32)
+    masks = [box_region_of(box) for box in boxes]
+    return merge_detections(boxes, masks, np.array(sources), TILES, WIDTH, HEIGHT)
+
+
+def test_union_masks_covers_all_regions():
+    x0, y0, union = union_masks([region(10, 10, 4, 4), region(12, 20, 2, 3)])
+    assert (x0, y0, union.shape) == (10, 10, (13, 4))
+    assert union.sum() == 16 + 6
+    assert not union[5:10].any()
+
+
+def test_union_single_region_is_unchanged():
+    item = region(1, 2, 3, 4)
+    assert union_masks([item]) is item
+
+
+def test_separate_defects_inside_full_frame_box_stay_separate():
+    merged, masks = merge([
+        [100, 100, 600, 600, 0.9, 0],  # 整图检测的大框
+        [150, 150, 200, 200, 0.8, 0],
+        [400, 400, 450, 450, 0.7, 0],
+    ], [FULL_FRAME_SOURCE, 0, 0])
+    assert len(merged) == 3
+    assert merged[1, :4].tolist() == [150, 150, 200, 200]
+    assert merged[2, :4].tolist() == [400, 400, 450, 450]
+    assert [mask[2].sum() for mask in masks] == [500 * 500, 50 * 50, 50 * 50]
+
+
+def test_object_cut_by_seams_is_stitched():
+    merged, masks = merge([
+        [200, 300, 640, 340, 0.8, 0],  # 左块中被 x=640 截断
+        [360, 302, 900, 338, 0.7, 0],  # 右块中被 x=360 截断
+    ], [0, 1])
+    assert len(merged) == 1
+    assert merged[0].tolist() == [200, 300, 900, 340, np.float32(0.8), 0]
+    x0, y0, union = masks[0]
+    assert (x0, y0, union.shape) == (200, 300, (40, 700))
+
+
+def test_neighbours_at_seam_are_not_stitched_within_one_tile_or_across_classes():
+    merged, _ = merge([
+        [600, 100, 640, 140, 0.8, 0],  # 左块中贴近接缝
+        [600, 110, 660, 150, 0.7, 1],  # 右块中不同类别
+        [500, 300, 640, 340, 0.6, 0],
+        [620, 300, 640, 340, 0.5, 0],  # 同一块内不拼接
+    ], [0, 1, 0, 0])
+    assert len(merged) == 4
+
+
+def test_duplicates_from_overlap_and_full_frame_are_suppressed():
+    merged, masks = merge([
+        [400, 100, 500, 200, 0.6, 0],  # 重叠区两块各检出一次
+        [401, 101, 500, 200, 0.8, 0],
+        [402, 100, 500, 199, 0.7, 0],  # 整图检出一次
+        [400, 100, 500, 200, 0.5, 1],  # 不同类别保留
+    ], [0, 1, FULL_FRAME_SOURCE, 1])
+    assert merged[:, 4].tolist() == [np.float32(0.8), np.float32(0.5)]
+    # 保留者使用自己的掩码
+    assert masks[0][:2] == (401, 101)
+
+
+def test_merge_keeps_separate_objects_without_masks():
+    boxes = np.array([[0, 0, 4, 4, 0.5, 0], [10, 10, 14, 14, 0.9, 0]], dtype=np.float32)
+    merged, masks = merge_detections(boxes, None, np.array([0, 0]), TILES, WIDTH, HEIGHT)
+    assert masks is None
+    # 按置信度从高到低输出
+    assert merged[:, 4].tolist() == [np.float32(0.9), np.float32(0.5)]
+
+
+def test_merge_empty():
+    boxes = np.zeros((0, 6), dtype=np.float32)
+    merged, masks = merge_detections(boxes, [], np.zeros(0, dtype=int), TILES, WIDTH, HEIGHT)
+    assert len(merged) == 0 and masks == []
+
+
+def test_tile_grid_covers_image():
+    tiles = tile_grid(1000, 700, tile_size=640, overlap=0.2)
+    assert tiles[0][:2] == (0, 0)
+    assert max(x1 for _, _, x1, _ in tiles) == 1000 and max(y1 for _, _, _, y1 in tiles) == 700
+    assert all(x1 - x0 == 640 and y1 - y0 == 640 for x0, y0, x1, y1 in tiles)
@@ -0,0 +1,92 @@
+import struct
+
+import pytest
+
+from frame_pool import FrameBufferPool
+from frame_reassembly import ImageBuffer
+from udp_server import UDP_RECV_BACKEND_SOCKET, UdpSender, UdpServerWorker, parse_nack_packet
+
+
+@pytest.fixture
+def sender(qapp):
+    return UdpSender()
+
+
+def missing_roundtrip(sender, packet_count: int, missing: list):
+    buf = ImageBuffer(FrameBufferPool().acquire_size(packet_count * 1024), 7, packet_count=packet_count)
+    for index in range(packet_count):
+        if index not in missing:
+            buf.mark_packet(index)
+    base_index, bitmap = buf.missing_bitmap()
+    return parse_nack_packet(sender._make_nack_packet(7, base_index, bitmap))
+
+
+@pytest.mark.parametrize("packet_count, missing", [
+    (10, [3]),
+    (20, [0, 1, 19]),
+    (64, [8, 9, 10, 40]),
+    (13, [12]),
+])
+def test_nack_bitmap_roundtrip(sender, packet_count, missing):
+    assert missing_roundtrip(sender, packet_count, missing) == (7, missing)
+
+
+def test_complete_frame_has_empty_bitmap(sender):
+    assert missing_roundtrip(sender, 9, []) == (7, [])
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda data: data[:-1],  # 长度与位图长度不符
+    lambda data: data[:-2] + struct.pack("<H", 0x1234),  # 包尾错误
+    lambda data: struct.pack("<H", 0x1234) + data[2:],  # 包头错误
+    lambda data: data[:8],  # 过短
+])
+def test_malformed_nack_rejected(sender, mutate):
+    data = sender._make_nack_packet(1, 0, b"\x05")
+    assert parse_nack_packet(data) == (1, [0, 2])
+    assert parse_nack_packet(mutate(data)) is None
+
+
+class ScriptedSocket:
+    """按脚本依次返回数据报或抛出异常的 recvfrom_into 替身"""
+
+    def __init__(self, script):
+        self.script = list(script)
+
+    def recvfrom_into(self, slot):
+        item = self.script.pop(0) if self.script else BlockingIOError()
+        if isinstance(item, BaseException):
+            raise item
+        slot[:len(item)] = item
+        return len(item), ("127.0.0.1", 9000)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def socket_worker(qapp):
+    worker = UdpServerWorker("127.0.0.1", 0, backend=UDP_RECV_BACKEND_SOCKET)
+    worker.raw_socket.close()
+    handled = []
+    worker.handle_datagram = lambda session, view, size: handled.append(bytes(view[:size]))
+    yield worker, handled
+    worker.close()
+
+
+def test_socket_backend_drains_past_icmp_errors(socket_worker):
+    worker, handled = socket_worker
+    worker.raw_socket = ScriptedSocket([b"a", ConnectionResetError(), b"b", ConnectionRefusedError(), b"c"])
+    errors = []
+    worker.socketError.connect(errors.append)
+    worker.on_socket_ready()
+    assert handled == [b"a", b"b", b"c"] and errors == []
+
+
+def test_socket_backend_processes_read_datagrams_before_error(socket_worker):
+    worker, handled = socket_worker
+    worker.raw_socket = ScriptedSocket([b"a", b"b", OSError("boom"), b"c"])
+    errors = []
+    worker.socketError.connect(errors.append)
+    worker.on_socket_ready()
+    assert handled == [b"a", b"b"] and len(errors) == 1
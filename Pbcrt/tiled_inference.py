@@ -0,0 +1,224 @@
+import math
+
+import cv2
+import numpy as np
+
+from frame_preprocess import MODEL_INPUT_SIZE, LETTERBOX_PAD_VALUE, PreparedFrame
+
+# 分块推理：原分辨率图像切为 TILE_SIZE 见方、相邻重叠 TILE_OVERLAP 的块，小目标不再随整图缩小而丢失
+TILE_SIZE = MODEL_INPUT_SIZE
+TILE_OVERLAP = 0.2
+# 每次前向计算的最大块数
+TILE_MAX_BATCH = 8
+# 是否同时做一次整图推理，保证跨越多个块的大目标完整
+TILE_INCLUDE_FULL_FRAME = True
+# 跨块接缝拼接：框边距所在块的内部边界不超过 TILE_SEAM_EPS 像素视为被接缝截断；
+# 另一块中同类别的检测跨过该接缝、且两者沿接缝方向的重叠占较短一段的比例不低于 TILE_MERGE_THRESHOLD 时拼为同一目标
+TILE_MERGE_THRESHOLD = 0.5
+TILE_SEAM_EPS = 2.0
+# 拼接后按类别做 NMS：IoU 不低于该值的重复检测（重叠区两块各检出一次、整图与分块各检出一次）只保留置信度最高者
+TILE_NMS_IOU = 0.5
+# 整图检测的来源编号
+FULL_FRAME_SOURCE = -1
+
+
+def tile_grid(width: int, height: int, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP) -> list:
+    """返回覆盖整幅图像的块 [(x0, y0, x1, y1), ...]，末块贴齐右/下边缘"""
+    step = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length: int) -> list:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def box_region(box, width: int, height: int):
+    """浮点框 → 图像内的整数区域 (x0, y0, x1, y1)"""
+    x0 = min(max(int(math.floor(box[0])), 0), width)
+    y0 = min(max(int(math.floor(box[1])), 0), height)
+    x1 = min(max(int(math.ceil(box[2])), x0), width)
+    y1 = min(max(int(math.ceil(box[3])), y0), height)
+    return x0, y0, x1, y1
+
+
+def seam_cuts(box, tile, width: int, height: int, eps: float = TILE_SEAM_EPS) -> list:
+    """框被所在块的内部边界（非图像边缘）截断的位置 [(坐标轴 0=x/1=y, 接缝坐标)]"""
+    cuts = []
+    for axis, size in ((0, width), (1, height)):
+        low, high = tile[axis], tile[axis + 2]
+        if low > 0 and box[axis] - low <= eps:
+            cuts.append((axis, low))
+        if high < size and high - box[axis + 2] <= eps:
+            cuts.append((axis, high))
+    return cuts
+
+
+def straddles(a, cuts: list, b, threshold: float) -> bool:
+    """b 跨过 a 的某条截断接缝，且两框在接缝方向上的重叠占较短一段的比例不低于阈值"""
+    for axis, seam in cuts:
+        if not b[axis] < seam < b[axis + 2]:
+            continue
+        other = 1 - axis
+        overlap = min(a[other + 2], b[other + 2]) - max(a[other], b[other])
+        shorter = min(a[other + 2] - a[other], b[other + 2] - b[other])
+        if shorter > 0 and overlap / shorter >= threshold:
+            return True
+    return False
+
+
+def merge_detections(boxes: np.ndarray, masks: list, sources: np.ndarray, tiles: list, width: int, height: int,
+                     threshold: float = TILE_MERGE_THRESHOLD, nms_iou: float = TILE_NMS_IOU):
+    """
+    跨块合并，分两步：
+    1. 接缝拼接：只拼接不同块中、被块内部边界截断且跨过同一接缝的同类别检测（目标被切成几段），
+       框取并集、掩码区域 (x0, y0, bool 数组) 按位或；整图检测不参与拼接，互相分开的小目标不会并为一个框；
+    2. 按类别 NMS：IoU 不低于 nms_iou 的重复检测只保留置信度最高者（含其掩码）。
+    sources 为各检测所在块在 tiles 中的序号，整图检测为 FULL_FRAME_SOURCE。masks 为 None 时只处理框。
+    结果按置信度从高到低排列。
+    """
+    if len(boxes) == 0:
+        return boxes, masks
+    count = len(boxes)
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    cuts = [seam_cuts(boxes[i], tiles[sources[i]], width, height) if sources[i] != FULL_FRAME_SOURCE else []
+            for i in range(count)]
+    for i in range(count):
+        for j in range(i + 1, count):
+            if (sources[i] == FULL_FRAME_SOURCE or sources[j] == FULL_FRAME_SOURCE or sources[i] == sources[j]
+                    or boxes[i, 5] != boxes[j, 5]):
+                continue
+            if straddles(boxes[i], cuts[i], boxes[j], threshold) or straddles(boxes[j], cuts[j], boxes[i], threshold):
+                parent[find(j)] = find(i)
+
+    groups = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    stitched_boxes = []
+    stitched_masks = [] if masks is not None else None
+    for members in groups.values():
+        box = boxes[max(members, key=lambda k: boxes[k, 4])].copy()
+        box[:2] = boxes[members, :2].min(axis=0)
+        box[2:4] = boxes[members, 2:4].max(axis=0)
+        stitched_boxes.append(box)
+        if masks is not None:
+            stitched_masks.append(union_masks([masks[k] for k in members]))
+    boxes = np.stack(stitched_boxes)
+
+    order = np.argsort(-boxes[:, 4], kind="stable")
+    boxes = boxes[order]
+    top_left = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:4], boxes[None, :, 2:4])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area = np.prod(boxes[:, 2:4] - boxes[:, :2], axis=1)
+    iou = inter / (area[:, None] + area[None, :] - inter + 1e-9)
+    duplicate = (boxes[:, None, 5] == boxes[None, :, 5]) & (iou >= nms_iou)
+    keep = np.ones(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if keep[i]:
+            keep[i + 1:] &= ~duplicate[i, i + 1:]
+    kept = np.flatnonzero(keep)
+    if masks is not None:
+        stitched_masks = [stitched_masks[order[i]] for i in kept]
+    return boxes[kept], stitched_masks
+
+
+def union_masks(regions: list):
+    """多个掩码区域按位或，返回覆盖全部区域的 (x0, y0, bool 数组)"""
+    if len(regions) == 1:
+        return regions[0]
+    x0 = min(x for x, _, _ in regions)
+    y0 = min(y for _, y, _ in regions)
+    x1 = max(x + region.shape[1] for x, _, region in regions)
+    y1 = max(y + region.shape[0] for _, y, region in regions)
+    union = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+    for x, y, region in regions:
+        union[y - y0:y - y0 + region.shape[0], x - x0:x - x0 + region.shape[1]] |= region
+    return x0, y0, union
+
+
+class TiledInference:
+    """
+    单帧分块推理：从帧的原分辨率 BGR 切块（不缩放），所有块组成批量送入模型，
+    结果平移回整图坐标后与整图推理结果一起做跨块合并。
+    框为整图坐标 (N, 6)，掩码为各检测框内的区域 (x0, y0, bool 数组)，不生成整图大小的掩码。
+    """
+
+    def __init__(self, model, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP,
+                 max_batch: int = TILE_MAX_BATCH, include_full_frame: bool = TILE_INCLUDE_FULL_FRAME,
+                 merge_threshold: float = TILE_MERGE_THRESHOLD):
+        self.model = model
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_batch = max_batch
+        self.include_full_frame = include_full_frame
+        self.merge_threshold = merge_threshold
+        self.canvas = np.empty((tile_size, tile_size, 3), dtype=np.uint8)
+        self.batch = np.empty((max_batch, 3, tile_size, tile_size), dtype=np.float32)
+
+    def infer(self, frame: PreparedFrame, with_masks: bool = True):
+        """返回 (boxes, masks)；with_masks 为 False 或模型无掩码输出时 masks 为 None"""
+        # 与 inference_backend 相同，torch 在推理线程中才导入，合并等纯 numpy 部分不依赖 torch
+        import torch
+        all_boxes = []
+        sources = []
+        all_masks = [] if with_masks else None
+        tiles = tile_grid(frame.width, frame.height, self.tile_size, self.overlap)
+        bgr = frame.bgr
+        for start in range(0, len(tiles), self.max_batch):
+            chunk = tiles[start:start + self.max_batch]
+            for i, (x0, y0, x1, y1) in enumerate(chunk):
+                # 块小于模型输入（图像本身较小）时右/下侧填充
+                if x1 - x0 < self.tile_size or y1 - y0 < self.tile_size:
+                    self.canvas.fill(LETTERBOX_PAD_VALUE)
+                cv2.cvtColor(bgr[y0:y1, x0:x1], cv2.COLOR_BGR2RGB, dst=self.canvas[:y1 - y0, :x1 - x0])
+                np.multiply(self.canvas.transpose(2, 0, 1), np.float32(1.0 / 255.0), out=self.batch[i])
+            results = self.model.backend(torch.from_numpy(self.batch[:len(chunk)]), conf=0.25, iou=0.45)
+            for tile_index, ((x0, y0, x1, y1), result) in enumerate(zip(chunk, results), start):
+                boxes = result.boxes.data.cpu().numpy().astype(np.float32)
+                if len(boxes) == 0:
+                    continue
+                tile_masks = result.masks.data.cpu().numpy() if result.masks is not None else None
+                if with_masks and tile_masks is None:
+                    all_masks = None
+                    with_masks = False
+                for box_index, box in enumerate(boxes):
+                    # 块坐标 → 整图坐标
+                    box[[0, 2]] = np.clip(box[[0, 2]], 0, x1 - x0) + x0
+                    box[[1, 3]] = np.clip(box[[1, 3]], 0, y1 - y0) + y0
+                    if with_masks:
+                        rx0, ry0, rx1, ry1 = box_region(box, frame.width, frame.height)
+                        region = tile_masks[box_index][ry0 - y0:ry1 - y0, rx0 - x0:rx1 - x0] > 0.5
+                        all_masks.append((rx0, ry0, region))
+                all_boxes.append(boxes)
+                sources.append(np.full(len(boxes), tile_index))
+
+        if self.include_full_frame:
+            result = self.model.infer_batch(frame.tensor)[0]
+            boxes = frame.scale_boxes(result.boxes.data.cpu().numpy())
+            if len(boxes):
+                if with_masks:
+                    if result.masks is None:
+                        all_masks = None
+                        with_masks = False
+                    else:
+                        full_masks = result.masks.data.cpu().numpy()
+                        all_masks.extend(frame.scale_mask_region(full_masks[i], box) for i, box in enumerate(boxes))
+                all_boxes.append(boxes)
+                sources.append(np.full(len(boxes), FULL_FRAME_SOURCE))
+
+        if not all_boxes:
+            return np.zeros((0, 6), dtype=np.float32), ([] if with_masks else None)
+        return merge_detections(np.concatenate(all_boxes), all_masks, np.concatenate(sources), tiles,
+                                frame.width, frame.height, self.merge_threshold)
@@ -1,9 +1,21 @@
-from PySide6.QtCore import QObject, QThread, QDateTime, Signal, QMutex, QMutexLocker, QTimer
-from PySide6.QtNetwork import QUdpSocket, QHostAddress
+from PySide6.QtCore import QObject, QThread, Signal, QMutex, QMutexLocker, QTimer, QSocketNotifier
+from PySide6.QtNetwork import QAbstractSocket, QUdpSocket, QHostAddress
+import socket
 import struct
+import time
+
+from frame_pool import FrameBufferPool
+from frame_trace import STAGE_REASSEMBLY
+from frame_reassembly import REASSEMBLY_WINDOW_FRAMES, REASSEMBLY_TIMEOUT_MS
+from frame_decoder import is_compressed_type
+from device_session import DeviceSession, device_key
 
 # === 协议参数 ===
 UDP_PACKET_SIZE = 1050
+# 带帧序号的扩展包：在旧格式包尾之后追加 uint32 frame_seq
+# 多帧并行重组（容忍帧间乱序）与选择性重传只对扩展包生效；旧格式包同几何参数同时只重组一帧，
+# 乱序到达、无法判断归属帧的包直接丢弃（见 ReassemblyWindow.legacy_frame_id）
+UDP_PACKET_SIZE_SEQ = 1054
 PACK_DATA_SIZE = 1024
 PACK_HEAD = 0x5AA5
 PACK_TAIL = 0x6BB6
@@ -14,30 +26,106 @@ ACK_PACK_TAIL = 0x7BB7
 HOST_CONN_ACK = 0x0000
 HOST_DISC_ACK = 0x0002
 GAIN_IMAG_ACK = 0x0004
+# 选择性重传请求：ACK 包头 + 帧序号 + 起始包序号 + 缺包位图 + ACK 包尾
+RESD_PACK_ACK = 0x0006
+
+NACK_PACK_HEAD_STRUCT = struct.Struct('<HHIIH')
+
+# 连续采集控制：ACK 包头 + 类型 + uint32 参数 + ACK 包尾
+STRM_STAR_ACK = 0x0008  # 开始推流，参数为初始信用数
+STRM_STOP_ACK = 0x000A  # 停止推流
+STRM_CRED_ACK = 0x000C  # 追加信用，参数为信用数
+PARAM_ACK_STRUCT = struct.Struct('<HHIH')
+NACK_BITMAP_MAX_BYTES = 1024
+# 帧停滞多久后发起重传请求、最多重传次数
+NACK_DELAY_MS = 40
+NACK_MAX_RETRIES = 3
+# 残缺帧交付：帧打开后超过该时间仍未收齐则掩盖缺失部分后交付（需大于重传耗时），丢包比例超过上限的帧不交付
+PARTIAL_FRAME_DEADLINE_MS = 200
+PARTIAL_FRAME_MAX_LOSS = 0.2
+# 接收缓冲区大小，需容纳至少一整帧的突发数据包
+UDP_RECV_BUFFER_SIZE = 8 * 1024 * 1024
+
+# 图像包头部/尾部格式（负载部分通过 memoryview 直接拷贝，不参与解包）
+PACK_HEADER_STRUCT = struct.Struct('<HHIIIIHH')
+PACK_TAIL_STRUCT = struct.Struct('<H')
+PACK_SEQ_STRUCT = struct.Struct('<I')
+PACK_HEADER_SIZE = PACK_HEADER_STRUCT.size
+PACK_TAIL_OFFSET = PACK_HEADER_SIZE + PACK_DATA_SIZE
+PACK_SEQ_OFFSET = PACK_TAIL_OFFSET + PACK_TAIL_STRUCT.size
+ACK_PACK_STRUCT = struct.Struct('<HHH')
+
+# 接收后端选择：Qt 的 QUdpSocket，或非阻塞原生 socket 批量读取
+UDP_RECV_BACKEND_QT = "qt"
+UDP_RECV_BACKEND_SOCKET = "socket"
+# socket 后端每批最多读取的数据报数量与单个槽位大小
+UDP_RECV_BATCH = 256
+UDP_RECV_SLOT_SIZE = 2048
 
-class ImageBuffer:
-    def __init__(self, w=0, h=0, img_type=0, packet_count=0):
-        self.data = bytearray(w * h * 3 // 2)
-        self.width = w
-        self.height = h
-        self.type = img_type
-        self.packet_count = packet_count
-        self.received_flags = set()
-        self.received_count = 0
-        self.last_update = QDateTime.currentDateTime()
 
 class UdpServerWorker(QObject):
-    frameReceived = Signal(bytes, int, int, int)
+    # 完整帧以 FrameLease 形式发出，接收方处理完毕后需调用 release() 归还缓冲池
+    # FrameLease.device 为来源设备标识 "ip:port"，FrameLease.loss_ratio 为残缺帧的丢包比例
+    frameReceived = Signal(object, int, int, int)
+    # 未能交付的帧（重组窗口淘汰或超时）以来源设备标识发出，流控据此归还信用
+    frameDropped = Signal(object)
     udpAckDataPackArrival = Signal(int)
+    deviceAckArrival = Signal(str, int)
+    deviceStateChanged = Signal(str, str)
+    deviceStatsUpdated = Signal(dict)
     socketError = Signal(str)
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, window_frames: int = REASSEMBLY_WINDOW_FRAMES,
+                 frame_timeout_ms: int = REASSEMBLY_TIMEOUT_MS, devices: list = None,
+                 nack_enable: bool = False, backend: str = UDP_RECV_BACKEND_QT,
+                 partial_deadline_ms: int = 0, partial_max_loss: float = PARTIAL_FRAME_MAX_LOSS):
         super().__init__()
-        self.udp_socket = QUdpSocket()
-        self.buffer_map = {}
+        self.backend = backend
+        self.udp_socket = None
+        self.raw_socket = None
+        self.socket_notifier = None
         self.buf_lock = QMutex()
+        self.window_frames = window_frames
+        self.frame_timeout_ms = frame_timeout_ms
+        self.frame_pool = FrameBufferPool(max_free=window_frames + 2)
+        # 每个设备一个会话：sessions 以设备标识为键，source_map 缓存数据源地址到会话的映射
+        self.sessions = {}
+        self.sessions_by_ip = {}
+        self.source_map = {}
+        for ip, device_port in devices or []:
+            self.register_device(ip, device_port)
 
         # socket绑定
+        if backend == UDP_RECV_BACKEND_SOCKET:
+            self.bind_raw_socket(host, port)
+        else:
+            self.bind_qt_socket(host, port)
+
+        # 启动定时清理
+        self.cleanup_timer = QTimer(self)
+        self.cleanup_timer.timeout.connect(self.cleanup_stale_buffers)
+        self.cleanup_timer.start(1000)
+        self.last_stats_time = time.monotonic()
+
+        # 选择性重传：向各设备的控制地址发送缺包位图
+        self.nack_timer = None
+        if nack_enable:
+            self.udp_sender = UdpSender()
+            self.nack_timer = QTimer(self)
+            self.nack_timer.timeout.connect(self.request_missing_packets)
+            self.nack_timer.start(NACK_DELAY_MS // 2)
+
+        # 残缺帧交付：partial_deadline_ms 为 0 时关闭，不完整的帧仍按超时丢弃
+        self.partial_deadline_ms = partial_deadline_ms
+        self.partial_max_loss = partial_max_loss
+        self.partial_timer = None
+        if partial_deadline_ms > 0:
+            self.partial_timer = QTimer(self)
+            self.partial_timer.timeout.connect(self.deliver_partial_frames)
+            self.partial_timer.start(max(10, partial_deadline_ms // 4))
+
+    def bind_qt_socket(self, host: str, port: int):
+        self.udp_socket = QUdpSocket()
         hostAddress = QHostAddress(host)
         if not self.udp_socket.bind(hostAddress, port):
             err = self.udp_socket.errorString()
@@ -45,93 +133,246 @@ class UdpServerWorker(QObject):
             self.socketError.emit(f"UDP绑定失败: {err}")
         else:
             print(f"[UDP] 成功绑定端口 {port}，等待接收数据")
+            self.udp_socket.setSocketOption(QAbstractSocket.SocketOption.ReceiveBufferSizeSocketOption,
+                                            UDP_RECV_BUFFER_SIZE)
             self.udp_socket.readyRead.connect(self.on_ready_read)
 
-        # 启动定时清理
-        self.cleanup_timer = QTimer(self)
-        self.cleanup_timer.timeout.connect(self.cleanup_stale_buffers)
-        self.cleanup_timer.start(1000)
+    def bind_raw_socket(self, host: str, port: int):
+        # 预分配接收区，按槽位切分为 memoryview，读取时不产生新对象
+        self.arena = bytearray(UDP_RECV_BATCH * UDP_RECV_SLOT_SIZE)
+        arena_view = memoryview(self.arena)
+        self.arena_slots = [arena_view[i * UDP_RECV_SLOT_SIZE:(i + 1) * UDP_RECV_SLOT_SIZE]
+                            for i in range(UDP_RECV_BATCH)]
+        self.arena_sizes = [0] * UDP_RECV_BATCH
+        self.arena_addrs = [None] * UDP_RECV_BATCH
+        try:
+            self.raw_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.raw_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECV_BUFFER_SIZE)
+            self.raw_socket.bind((host, port))
+            self.raw_socket.setblocking(False)
+        except OSError as e:
+            print(f"[UDP错误] 绑定端口失败: {e}")
+            self.socketError.emit(f"UDP绑定失败: {e}")
+            if self.raw_socket:
+                self.raw_socket.close()
+                self.raw_socket = None
+            return
+        print(f"[UDP] 成功绑定端口 {port}（socket 批量接收），等待接收数据")
+        self.socket_notifier = QSocketNotifier(self.raw_socket.fileno(), QSocketNotifier.Type.Read, self)
+        self.socket_notifier.activated.connect(self.on_socket_ready)
+
+    def register_device(self, ip: str, port: int) -> DeviceSession:
+        """登记一个设备，来自该 IP 的数据都归入此会话"""
+        key = device_key(ip, port)
+        session = self.sessions.get(key)
+        if session is None:
+            session = DeviceSession(key, (ip, port), self.frame_pool, self.window_frames,
+                                    self.frame_timeout_ms, registered=True)
+            self.sessions[key] = session
+            self.sessions_by_ip[ip] = session
+            self.frame_pool.max_free = (self.window_frames + 2) * len(self.sessions)
+            self.source_map.clear()
+        return session
+
+    def session_for(self, source, ip: str, port: int) -> DeviceSession:
+        """按数据源地址查找会话，未登记的设备自动创建会话"""
+        session = self.sessions.get(device_key(ip, port)) or self.sessions_by_ip.get(ip)
+        if session is None:
+            session = DeviceSession(device_key(ip, port), (ip, port), self.frame_pool, self.window_frames,
+                                    self.frame_timeout_ms)
+            self.sessions[session.key] = session
+            self.frame_pool.max_free = (self.window_frames + 2) * len(self.sessions)
+            print(f"[UDP] 发现未登记设备 {session.key}")
+        self.source_map[source] = session
+        return session
 
     def on_ready_read(self):
-        now = QDateTime.currentDateTime()
-        while self.udp_socket.hasPendingDatagrams():
-            datagram, _, _ = self.udp_socket.readDatagram(self.udp_socket.pendingDatagramSize())
-            if len(datagram) == UDP_PACKET_SIZE:
-                pkt = struct.unpack('<HHIIIIHH{}sH'.format(PACK_DATA_SIZE), datagram)
-                head, frame_len, index, count, w, h, img_type, valid_len, payload, tail = pkt
-                if head != PACK_HEAD or tail != PACK_TAIL:
-                    print(f"[UDP] 图像帧头/尾校验失败")
-                    continue
-
-                image_id = (w << 32) | count
-                with QMutexLocker(self.buf_lock):
-                    # 收到第一包，清除旧缓存
-                    if image_id not in self.buffer_map and index == 0:
-                        self.buffer_map.clear()
-
-                    if image_id not in self.buffer_map:
-                        self.buffer_map[image_id] = ImageBuffer(w, h, img_type, count)
-
-                    buf = self.buffer_map[image_id]
-                    offset = index * PACK_DATA_SIZE
-                    if index < count and offset + valid_len <= len(buf.data):
-                        if index not in buf.received_flags:
-                            buf.data[offset:offset + valid_len] = payload[:valid_len]
-                            buf.received_flags.add(index)
-                            buf.received_count += 1
-                            buf.last_update = now
-
-                    if buf.received_count == buf.packet_count:
-                        print("[UDP] 图像接收完成")
-                        self.frameReceived.emit(bytes(buf.data), buf.width, buf.height, buf.type)
-                        del self.buffer_map[image_id]
-
-            elif len(datagram) == 6:
-                head, ack_type, tail = struct.unpack('<HHH', datagram)
-                if head == ACK_PACK_HEAD and tail == ACK_PACK_TAIL:
-                    print("[UDP] ACK应答触发")
-                    self.udpAckDataPackArrival.emit(ack_type)
+        with QMutexLocker(self.buf_lock):
+            while self.udp_socket.hasPendingDatagrams():
+                datagram, host, port = self.udp_socket.readDatagram(self.udp_socket.pendingDatagramSize())
+                source = (host.toIPv4Address(), port)
+                session = self.source_map.get(source)
+                if session is None:
+                    session = self.session_for(source, host.toString(), port)
+                self.handle_datagram(session, memoryview(datagram), len(datagram))
+
+    def on_socket_ready(self):
+        """socket 后端：一次唤醒批量读空内核队列，数据包写入预分配的接收区后再逐个解析"""
+        with QMutexLocker(self.buf_lock):
+            while True:
+                count = 0
+                drained = False
+                failed = False
+                try:
+                    while count < UDP_RECV_BATCH:
+                        self.arena_sizes[count], self.arena_addrs[count] = \
+                            self.raw_socket.recvfrom_into(self.arena_slots[count])
+                        count += 1
+                except (BlockingIOError, InterruptedError):
+                    drained = True
+                except (ConnectionRefusedError, ConnectionResetError):
+                    # 之前发往设备的数据报触发的 ICMP 端口不可达（Windows 上为 WSAECONNRESET），与接收队列无关，继续读取
+                    pass
+                except OSError as e:
+                    self.socketError.emit(f"UDP接收失败: {e}")
+                    failed = True
+                # 出错前已读入接收区的数据报照常处理
+                for i in range(count):
+                    source = self.arena_addrs[i]
+                    session = self.source_map.get(source)
+                    if session is None:
+                        session = self.session_for(source, source[0], source[1])
+                    self.handle_datagram(session, self.arena_slots[i], self.arena_sizes[i])
+                if drained or failed:
+                    break
+
+    def handle_datagram(self, session: DeviceSession, datagram_view: memoryview, size: int):
+        """解析单个数据报并写入所属设备会话，调用方需持有 buf_lock"""
+        if size == UDP_PACKET_SIZE or size == UDP_PACKET_SIZE_SEQ:
+            head, frame_len, index, count, w, h, img_type, valid_len = PACK_HEADER_STRUCT.unpack_from(datagram_view)
+            tail, = PACK_TAIL_STRUCT.unpack_from(datagram_view, PACK_TAIL_OFFSET)
+            if head != PACK_HEAD or tail != PACK_TAIL:
+                session.stats.bad_packets += 1
+                print(f"[UDP] 图像帧头/尾校验失败: {session.key}")
+                return
+
+            if session.on_packet(size):
+                self.deviceStateChanged.emit(session.key, session.state)
+            reassembly = session.reassembly
+            if size == UDP_PACKET_SIZE_SEQ:
+                frame_id, = PACK_SEQ_STRUCT.unpack_from(datagram_view, PACK_SEQ_OFFSET)
             else:
-                print(f"[UDP] 未知包类型: {len(datagram)} 字节")
+                frame_id = reassembly.legacy_frame_id(index, count, w, h, img_type)
+            buf = None
+            if frame_id is not None:
+                buf = reassembly.add_packet(frame_id, index, count, w, h, img_type,
+                                            datagram_view[PACK_HEADER_SIZE:PACK_TAIL_OFFSET], valid_len)
+            if reassembly.dropped:
+                for _ in reassembly.take_dropped():
+                    session.stats.evicted += 1
+                    self.frameDropped.emit(session.key)
+            if buf is not None:
+                session.stats.frames += 1
+                if self.partial_timer is not None and not is_compressed_type(buf.type):
+                    session.remember_frame(buf.lease)
+                # 租约交给下游，由接收方归还
+                buf.lease.device = session.key
+                buf.lease.trace.mark(STAGE_REASSEMBLY)
+                self.frameReceived.emit(buf.lease, buf.width, buf.height, buf.type)
+
+        elif size == 6:
+            head, ack_type, tail = ACK_PACK_STRUCT.unpack_from(datagram_view)
+            if head == ACK_PACK_HEAD and tail == ACK_PACK_TAIL:
+                session.stats.acks += 1
+                if session.on_ack(ack_type):
+                    self.deviceStateChanged.emit(session.key, session.state)
+                self.deviceAckArrival.emit(session.key, ack_type)
+                self.udpAckDataPackArrival.emit(ack_type)
+        else:
+            session.stats.bad_packets += 1
+            print(f"[UDP] 未知包类型: {size} 字节")
 
     def cleanup_stale_buffers(self):
-        now = QDateTime.currentDateTime()
-        timeout_ms = 3000
+        now = time.monotonic()
+        expired = []
+        changed = []
+        with QMutexLocker(self.buf_lock):
+            for session in self.sessions.values():
+                session_expired = session.reassembly.expire(now)
+                session.stats.expired += len(session_expired)
+                expired.extend((session.key, buf) for buf in session_expired)
+                if session.check_timeout(now):
+                    changed.append((session.key, session.state))
+                session.update_rate(now - self.last_stats_time)
+            summary = {key: session.summary() for key, session in self.sessions.items()}
+        self.last_stats_time = now
+        for key, buf in expired:
+            print(f"[UDP清理] 图像超时: {key} frame_id={buf.frame_id}, 已接收 {buf.received_count}/{buf.packet_count}")
+            self.frameDropped.emit(key)
+        for key, state in changed:
+            self.deviceStateChanged.emit(key, state)
+        self.deviceStatsUpdated.emit(summary)
+
+    def deliver_partial_frames(self):
+        """超过交付时限的残缺帧：用同设备上一帧掩盖缺失部分，标记丢包比例后交付"""
+        now = time.monotonic()
+        frames = []
         with QMutexLocker(self.buf_lock):
-            for image_id in list(self.buffer_map.keys()):
-                buf = self.buffer_map[image_id]
-                if buf.last_update.msecsTo(now) > timeout_ms:
-                    print(f"[UDP清理] 图像超时: image_id={image_id}, 已接收 {buf.received_count}/{buf.packet_count}")
-                    expected_indexes = set(range(buf.packet_count))
-                    missing = sorted(expected_indexes - buf.received_flags)
-                    if missing:
-                        print(f"[UDP清理] 丢包 index 列表: {missing}")
-                    del self.buffer_map[image_id]
+            for session in self.sessions.values():
+                for buf in session.reassembly.take_partial(self.partial_deadline_ms, self.partial_max_loss, now):
+                    buf.conceal(session.last_frame())
+                    session.remember_frame(buf.lease)
+                    session.stats.frames += 1
+                    session.stats.partial += 1
+                    buf.lease.device = session.key
+                    buf.lease.loss_ratio = buf.loss_ratio()
+                    frames.append(buf)
+        for buf in frames:
+            buf.lease.trace.mark(STAGE_REASSEMBLY)
+            self.frameReceived.emit(buf.lease, buf.width, buf.height, buf.type)
+
+    def request_missing_packets(self):
+        """对停滞的带序号帧发送缺包位图，旧协议帧没有帧序号，仍按超时丢弃"""
+        now = time.monotonic()
+        requests = []
+        with QMutexLocker(self.buf_lock):
+            for session in self.sessions.values():
+                for frame_id, buf in session.reassembly.frames.items():
+                    if not isinstance(frame_id, int) or buf.nack_count >= NACK_MAX_RETRIES:
+                        continue
+                    if (now - buf.last_update) * 1000 < NACK_DELAY_MS or (now - buf.last_nack) * 1000 < NACK_DELAY_MS:
+                        continue
+                    base_index, bitmap = buf.missing_bitmap()
+                    if bitmap:
+                        buf.nack_count += 1
+                        buf.last_nack = now
+                        session.stats.nacks += 1
+                        requests.append((session.control_addr, frame_id, base_index, bitmap))
+        for (ip, port), frame_id, base_index, bitmap in requests:
+            self.udp_sender.send_nack_request(ip, port, frame_id, base_index, bitmap)
 
     def close(self):
         if self.udp_socket:
             self.udp_socket.close()
             self.udp_socket.deleteLater()
+        if self.socket_notifier:
+            self.socket_notifier.setEnabled(False)
+        if self.raw_socket:
+            self.raw_socket.close()
+            self.raw_socket = None
         if self.cleanup_timer:
             self.cleanup_timer.stop()
-        self.buffer_map.clear()
+        if self.nack_timer:
+            self.nack_timer.stop()
+        if self.partial_timer:
+            self.partial_timer.stop()
+        for session in self.sessions.values():
+            session.reassembly.clear()
+            session.forget_frame()
+        self.frame_pool.clear()
 
 
 class UdpSender:
     def __init__(self):
         self.socket = QUdpSocket()
+        # 信用与重传请求每帧都会发送，只计数，发送失败时才打印
+        self.sent_count = 0
+        self.sent_bytes = 0
+        self.failed_count = 0
 
     def send_to_target(self, target_ip: str, target_port: int, data: bytes) -> bool:
         address = QHostAddress(target_ip)
         bytes_sent = self.socket.writeDatagram(data, address, target_port)
         if bytes_sent == -1:
-            print(f"[UDP发送失败] {self.socket.errorString()}")
+            self.failed_count += 1
+            print(f"[UDP发送失败] {target_ip}:{target_port} {self.socket.errorString()}")
             return False
-        print(f"[UDP发送成功] 字节数={bytes_sent}, IP={target_ip}, 端口={target_port}")
+        self.sent_count += 1
+        self.sent_bytes += bytes_sent
         return True
 
     def _make_ack_packet(self, ack_type: int) -> bytes:
-        return struct.pack('<HHH', ACK_PACK_HEAD, ack_type, ACK_PACK_TAIL)
+        return ACK_PACK_STRUCT.pack(ACK_PACK_HEAD, ack_type, ACK_PACK_TAIL)
 
     def send_conn_request(self, ip: str, port: int) -> bool:
         print("发送 UDP 连接请求")
@@ -145,26 +386,79 @@ class UdpSender:
         print("发送 UDP 获取图像请求")
         return self.send_to_target(ip, port, self._make_ack_packet(GAIN_IMAG_ACK))
 
+    def _make_param_ack_packet(self, ack_type: int, value: int) -> bytes:
+        return PARAM_ACK_STRUCT.pack(ACK_PACK_HEAD, ack_type, value, ACK_PACK_TAIL)
+
+    def send_stream_start(self, ip: str, port: int, credits: int) -> bool:
+        print(f"发送 UDP 开始推流请求, 信用窗口={credits}")
+        return self.send_to_target(ip, port, self._make_param_ack_packet(STRM_STAR_ACK, credits))
+
+    def send_stream_stop(self, ip: str, port: int) -> bool:
+        print("发送 UDP 停止推流请求")
+        return self.send_to_target(ip, port, self._make_param_ack_packet(STRM_STOP_ACK, 0))
+
+    def send_stream_credit(self, ip: str, port: int, credits: int) -> bool:
+        return self.send_to_target(ip, port, self._make_param_ack_packet(STRM_CRED_ACK, credits))
+
+    def _make_nack_packet(self, frame_seq: int, base_index: int, bitmap: bytes) -> bytes:
+        bitmap = bitmap[:NACK_BITMAP_MAX_BYTES]
+        return (NACK_PACK_HEAD_STRUCT.pack(ACK_PACK_HEAD, RESD_PACK_ACK, frame_seq, base_index, len(bitmap))
+                + bitmap + struct.pack('<H', ACK_PACK_TAIL))
+
+    def send_nack_request(self, ip: str, port: int, frame_seq: int, base_index: int, bitmap: bytes) -> bool:
+        return self.send_to_target(ip, port, self._make_nack_packet(frame_seq, base_index, bitmap))
+
+
+def parse_nack_packet(data: bytes):
+    """解析重传请求包，返回 (frame_seq, 缺失包序号列表)，格式错误时返回 None"""
+    if len(data) < NACK_PACK_HEAD_STRUCT.size + 2:
+        return None
+    head, ack_type, frame_seq, base_index, bitmap_len = NACK_PACK_HEAD_STRUCT.unpack_from(data)
+    if head != ACK_PACK_HEAD or ack_type != RESD_PACK_ACK:
+        return None
+    if len(data) != NACK_PACK_HEAD_STRUCT.size + bitmap_len + 2:
+        return None
+    tail, = struct.unpack_from('<H', data, NACK_PACK_HEAD_STRUCT.size + bitmap_len)
+    if tail != ACK_PACK_TAIL:
+        return None
+    bitmap = data[NACK_PACK_HEAD_STRUCT.size:NACK_PACK_HEAD_STRUCT.size + bitmap_len]
+    missing = [base_index + (i << 3) + bit
+               for i, byte in enumerate(bitmap) if byte
+               for bit in range(8) if byte & (1 << bit)]
+    return frame_seq, missing
+
 
 class UdpServerThread(QThread):
     worker_ready = Signal(QObject)
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, window_frames: int = REASSEMBLY_WINDOW_FRAMES,
+                 frame_timeout_ms: int = REASSEMBLY_TIMEOUT_MS, devices: list = None,
+                 nack_enable: bool = False, backend: str = UDP_RECV_BACKEND_QT,
+                 partial_deadline_ms: int = 0, partial_max_loss: float = PARTIAL_FRAME_MAX_LOSS):
         super().__init__()
         self.host = host
         self.port = port
+        self.window_frames = window_frames
+        self.frame_timeout_ms = frame_timeout_ms
+        self.devices = devices
+        self.nack_enable = nack_enable
+        self.backend = backend
+        self.partial_deadline_ms = partial_deadline_ms
+        self.partial_max_loss = partial_max_loss
         self.worker = None
 
     def run(self):
-        self.worker = UdpServerWorker(self.host, self.port)
+        self.worker = UdpServerWorker(self.host, self.port, self.window_frames, self.frame_timeout_ms,
+                                      self.devices, self.nack_enable, self.backend,
+                                      self.partial_deadline_ms, self.partial_max_loss)
         self.worker.moveToThread(self)
         self.worker_ready.emit(self.worker)
         self.exec()
+        # 事件循环退出后在本线程内关闭 socket 与定时器，避免跨线程操作
+        self.worker.close()
+        self.worker.deleteLater()
 
     def stop(self):
-        if self.worker:
-            self.worker.close()
-            self.worker.deleteLater()
         self.quit()
         self.wait()
         print("[UDP] worker 停止成功")